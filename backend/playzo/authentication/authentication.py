@@ -1,7 +1,13 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.authentication import CSRFCheck
 from rest_framework import exceptions
 
+from .tokens import USER_VERSION_CLAIM, fast_path_enabled
+from .user_cache import user_cache
+
 
 def enforce_csrf(request):
     """
@@ -42,3 +48,20 @@ class BaseAuthentication(JWTAuthentication):
         #     enforce_csrf(request)
 
         return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        """
+        The token's user, from the process user cache when the token carries a user version.
+        A token whose version is not the user's current one (issued before a password change)
+        is rejected.
+        """
+        if not fast_path_enabled() or USER_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user = user_cache.get(validated_token.get(api_settings.USER_ID_CLAIM), validated_token[USER_VERSION_CLAIM])
+        if user is None:
+            user = super().get_user(validated_token)
+            if user.token_version != validated_token[USER_VERSION_CLAIM]:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+            user_cache.set(user)
+        return user
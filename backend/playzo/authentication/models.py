@@ -1,3 +1,24 @@
+from django.conf import settings
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class TokenFamily(models.Model):
+    """
+    One login's chain of rotated refresh tokens (`AUTH_REFRESH_TOKEN_MODE = "family"`).
+    Only the refresh token carrying the current `generation` is valid; refreshing bumps it,
+    presenting an older one revokes the family. See authentication.tokens.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="token_families", verbose_name=_("User")
+    )
+    generation = models.PositiveIntegerField(default=0, verbose_name=_("Generation"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("Expires At"))
+
+    class Meta:
+        verbose_name = _("Token Family")
+        verbose_name_plural = _("Token Families")
+
+    def __str__(self):
+        return f"{self.user_id}#{self.pk} (generation {self.generation})"
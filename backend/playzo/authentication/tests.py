@@ -1,3 +1,132 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users.models import User
+from .models import TokenFamily
+from .tokens import FAMILY_CLAIM, GENERATION_CLAIM, FamilyRefreshToken, IdentityRefreshToken
+from .user_cache import user_cache
+
+
+def login(client, username, password="secret"):
+    response = client.post("/api/auth/login/", {"username": username, "password": password}, format="json")
+    return response.json()
+
+
+class TokenVersionTests(TestCase):
+    url = "/api/auth/authenticated-user/"
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user("ahmed", "secret")
+        self.client = APIClient()
+
+    def authenticate(self, access):
+        return self.client.post(self.url, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_password_change_rejects_older_access_tokens(self):
+        access = login(self.client, "ahmed")["access"]
+        self.assertEqual(self.authenticate(access).status_code, 200)
+
+        self.user.set_password("changed")
+        self.user.save()
+        # Also the case in any other process, whose cache never saw the old entry
+        user_cache.clear()
+        response = self.authenticate(access)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "password_changed")
+
+        self.assertEqual(self.authenticate(login(self.client, "ahmed", "changed")["access"]).status_code, 200)
+
+
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("mona", "secret")
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post("/api/auth/refresh/", {"refresh": token}, format="json")
+
+    def verify(self, token):
+        return self.client.post("/api/auth/verify/", {"token": token}, format="json").status_code
+
+    def test_blacklist_rotation_retires_the_old_token(self):
+        first = login(self.client, "mona")["refresh"]
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(response.json()["refresh"]).status_code, 200)
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertEqual(self.refresh("not a token").status_code, 401)
+
+    @override_settings(AUTH_REFRESH_TOKEN_MODE="family")
+    def test_family_rotation_moves_the_generation(self):
+        first = login(self.client, "mona")["refresh"]
+        family = FamilyRefreshToken(first)[FAMILY_CLAIM]
+
+        second = self.refresh(first).json()["refresh"]
+        self.assertEqual(FamilyRefreshToken(second)[GENERATION_CLAIM], 1)
+        self.assertEqual(TokenFamily.objects.get(pk=family).generation, 1)
+        self.assertEqual((self.verify(first), self.verify(second)), (401, 200))
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    @override_settings(AUTH_REFRESH_TOKEN_MODE="family")
+    def test_replayed_token_revokes_the_family(self):
+        first = login(self.client, "mona")["refresh"]
+        family = FamilyRefreshToken(first)[FAMILY_CLAIM]
+        second = self.refresh(first).json()["refresh"]
+
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertFalse(TokenFamily.objects.filter(pk=family).exists())
+        # The legitimate holder's current token went with it
+        self.assertEqual(self.refresh(second).status_code, 401)
+
+    def test_blacklist_token_is_exchanged_for_a_family(self):
+        legacy = login(self.client, "mona")["refresh"]
+        with override_settings(AUTH_REFRESH_TOKEN_MODE="family"):
+            response = self.refresh(legacy)
+            self.assertEqual(response.status_code, 200)
+            family = FamilyRefreshToken(response.json()["refresh"])
+            self.assertEqual(TokenFamily.objects.get(pk=family[FAMILY_CLAIM]).user, self.user)
+            self.assertEqual(self.refresh(legacy).status_code, 401)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=IdentityRefreshToken(
+            legacy, verify=False
+        )["jti"]).exists())
+
+    def test_password_change_rejects_older_refresh_tokens(self):
+        for mode in ["blacklist", "family"]:
+            with self.subTest(mode=mode), override_settings(AUTH_REFRESH_TOKEN_MODE=mode):
+                refresh = login(self.client, "mona")["refresh"]
+                self.user.set_password("changed")
+                self.user.save()
+                self.assertEqual(self.refresh(refresh).status_code, 401)
+                self.user.set_password("secret")
+                self.user.save()
+
+    def test_login_loads_the_player_once(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertIn("access", login(self.client, "mona"))
+        player_queries = [query for query in context.captured_queries if "players_player" in query["sql"]]
+        self.assertEqual(len(player_queries), 1)
+
+    def test_purge_deletes_only_expired_rows(self):
+        now = timezone.now()
+        for index, expires_at in enumerate([now - timedelta(days=1), now + timedelta(days=1)]):
+            token = OutstandingToken.objects.create(
+                user=self.user, jti=f"jti-{index}", token="token", expires_at=expires_at
+            )
+            BlacklistedToken.objects.create(token=token)
+            TokenFamily.objects.create(user=self.user, expires_at=expires_at)
+
+        call_command("purge_expired_tokens", "--batch-size", "1", stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list("expires_at", flat=True)), [now + timedelta(days=1)])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+        self.assertEqual(list(TokenFamily.objects.values_list("expires_at", flat=True)), [now + timedelta(days=1)])
@@ -0,0 +1,132 @@
+"""
+Refresh tokens.
+
+With `AUTH_FAST_PATH` on, refresh tokens (and the access tokens made from them)
+also carry the user's `player_id`, `is_staff`, `is_superuser` and `user_version`
+(`User.token_version`, bumped on password change). `BaseAuthentication` keys its
+user cache on the id and version, and views read the player id from the token
+instead of joining through the user. The claims are re-read on every refresh, and a
+refresh token whose `user_version` is out of date is rejected.
+
+`AUTH_REFRESH_TOKEN_MODE` picks how rotated refresh tokens are revoked:
+
+- "blacklist": simplejwt's `OutstandingToken` / `BlacklistedToken`, one row per
+  token issued; `manage.py purge_expired_tokens` deletes the expired ones.
+- "family": one `TokenFamily` row per login holding a generation counter. A refresh
+  token is valid only while its `generation` claim matches, so a refresh is a single
+  UPDATE by primary key and rotation writes no rows.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+PLAYER_ID_CLAIM = "player_id"
+USER_VERSION_CLAIM = "user_version"
+FAMILY_CLAIM = "family"
+GENERATION_CLAIM = "generation"
+
+
+def fast_path_enabled():
+    return getattr(settings, "AUTH_FAST_PATH", False)
+
+
+def refresh_token_mode():
+    return getattr(settings, "AUTH_REFRESH_TOKEN_MODE", "blacklist")
+
+
+def add_identity_claims(token, user):
+    from players.models import Player
+
+    token[PLAYER_ID_CLAIM] = Player.objects.filter(user=user).values_list("pk", flat=True).first()
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+    token[USER_VERSION_CLAIM] = user.token_version
+
+
+class IdentityClaimsMixin:
+    # The token's user when the caller already loaded it, saves the lookup on refresh
+    identity_user = None
+    # Whether the identity claims were just stamped (by for_user), so the access token can copy them as is
+    claims_current = False
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        if fast_path_enabled():
+            add_identity_claims(token, user)
+            token.claims_current = True
+        return token
+
+    def check_user_version(self, user):
+        """Reject a token issued before the user's latest password change"""
+        if USER_VERSION_CLAIM in self.payload and self[USER_VERSION_CLAIM] != user.token_version:
+            raise TokenError(_("The user's password has been changed."))
+
+    @property
+    def access_token(self):
+        # Refreshing restamps the claims, so the new pair (and a rotated refresh token) is current
+        if fast_path_enabled() and not self.claims_current:
+            from users.models import User
+
+            user = self.identity_user or User.objects.filter(
+                **{api_settings.USER_ID_FIELD: self.payload.get(api_settings.USER_ID_CLAIM)}
+            ).first()
+            if user is not None:
+                self.check_user_version(user)
+                add_identity_claims(self, user)
+                self.claims_current = True
+        return super().access_token
+
+
+class IdentityRefreshToken(IdentityClaimsMixin, RefreshToken):
+    pass
+
+
+class GenerationRefreshToken(Token):
+    """A refresh token outside simplejwt's blacklist app: issuing and verifying it touch no token rows"""
+    token_type = "refresh"
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = RefreshToken.no_copy_claims + (FAMILY_CLAIM, GENERATION_CLAIM)
+    access_token_class = AccessToken
+    access_token = RefreshToken.access_token
+
+
+class FamilyRefreshToken(IdentityClaimsMixin, GenerationRefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        """A refresh token opening a new family"""
+        from .models import TokenFamily
+
+        token = super().for_user(user)
+        family = TokenFamily.objects.create(user=user, expires_at=datetime_from_epoch(token["exp"]))
+        token[FAMILY_CLAIM] = family.pk
+        token[GENERATION_CLAIM] = family.generation
+        return token
+
+    def rotate(self):
+        """
+        Move this token and its family to the next generation. If this token is not the
+        family's current one (a replayed or stolen refresh token), the whole family is
+        revoked and False returned.
+        """
+        from .models import TokenFamily
+
+        self.set_jti()
+        self.set_exp()
+        self.set_iat()
+        rotated = TokenFamily.objects.filter(
+            pk=self.get(FAMILY_CLAIM), generation=self.get(GENERATION_CLAIM)
+        ).update(generation=F("generation") + 1, expires_at=datetime_from_epoch(self["exp"]))
+        if not rotated:
+            TokenFamily.objects.filter(pk=self.get(FAMILY_CLAIM)).delete()
+            return False
+        self[GENERATION_CLAIM] += 1
+        return True
+
+
+def get_refresh_token_class():
+    return FamilyRefreshToken if refresh_token_mode() == "family" else IdentityRefreshToken
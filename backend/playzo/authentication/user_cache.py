@@ -0,0 +1,64 @@
+"""
+Process-local cache of authenticated users.
+
+A bounded LRU with a TTL, keyed by (user id, `User.token_version`), lets
+`BaseAuthentication` resolve most requests without a `User` query. Entries are
+dropped when the user is saved or deleted in this process (`users.signals`);
+changes made by other processes are picked up once the TTL runs out, and tokens
+issued after a password change never match an entry made before it.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class UserCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (pk, version) -> (expires at, user)
+
+    @property
+    def max_size(self):
+        return getattr(settings, "AUTH_USER_CACHE_SIZE", 1024)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "AUTH_USER_CACHE_TTL", 60)
+
+    def get(self, pk, version):
+        """A private copy of the cached user, or None"""
+        key = (pk, version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # Requests may annotate or modify their user; never hand out the shared instance
+        return copy.copy(user)
+
+    def set(self, user):
+        entry = (time.monotonic() + self.ttl, copy.copy(user))
+        with self.lock:
+            self.entries[(user.pk, user.token_version)] = entry
+            self.entries.move_to_end((user.pk, user.token_version))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == pk]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
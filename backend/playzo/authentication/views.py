@@ -4,15 +4,28 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
 
 from users.serializers import UserSerializer
+from django.apps import apps
 from django.contrib.auth import authenticate
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from users.models import User
+from .models import TokenFamily
+from .tokens import (
+    FAMILY_CLAIM, GENERATION_CLAIM, PLAYER_ID_CLAIM, FamilyRefreshToken, IdentityRefreshToken,
+    get_refresh_token_class, refresh_token_mode
+)
 from django.utils.translation import gettext_lazy as _
 
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+
+# What validating a refresh / verify request raises for a bad, expired, revoked or missing token
+# (simplejwt's AuthenticationFailed and InvalidToken are DRF AuthenticationFailed subclasses)
+TOKEN_ERRORS = (TokenError, exceptions.AuthenticationFailed, serializers.ValidationError)
 
 
 class LoginSerializer(serializers.Serializer):
@@ -36,12 +49,17 @@ class LoginSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         user = validated_data["user"]
-        refresh = RefreshToken.for_user(user)
+        refresh = get_refresh_token_class().for_user(user)
+
+        if PLAYER_ID_CLAIM in refresh.payload:
+            player_id = refresh[PLAYER_ID_CLAIM]
+        else:
+            player_id = user.player.id if hasattr(user, "player") else None
 
         return {
             "refresh": str(refresh),
             "access": str(refresh.access_token),
-            "player_id": user.player.id if hasattr(user, "player") else None,
+            "player_id": player_id,
             "username": user.username,
         }
 
@@ -50,12 +68,13 @@ class LoginView(APIView):
     serializer_class = LoginSerializer
     authentication_classes = []
     permission_classes = []
+    throttle_scope = 'auth'
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
-        except Exception as e:
+        except serializers.ValidationError:
             return Response({"error": _("Invalid username or password")}, status=status.HTTP_400_BAD_REQUEST)
 
         tokens = serializer.save()
@@ -63,18 +82,72 @@ class LoginView(APIView):
         return Response(tokens, status=status.HTTP_200_OK)
 
 
+class IdentityTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = IdentityRefreshToken
+
+
+class FamilyTokenRefreshSerializer(TokenRefreshSerializer):
+    """Rotates token-family refresh tokens (see authentication.tokens); always returns a new refresh token"""
+    token_class = FamilyRefreshToken
+
+    def validate(self, attrs):
+        refresh = UntypedToken(attrs["refresh"])
+        if refresh.get(api_settings.TOKEN_TYPE_CLAIM) != self.token_class.token_type:
+            raise InvalidToken(_("Token has wrong type"))
+
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        if FAMILY_CLAIM not in refresh.payload:
+            # Issued in "blacklist" mode: check and retire it there, then start a family
+            legacy = IdentityRefreshToken(attrs["refresh"])
+            legacy.check_user_version(user)
+            # Without the blacklist app, simplejwt's tokens have no blacklist() to retire it with
+            if apps.is_installed("rest_framework_simplejwt.token_blacklist"):
+                legacy.blacklist()
+            refresh = self.token_class.for_user(user)
+        else:
+            refresh = self.token_class(attrs["refresh"])
+            refresh.check_user_version(user)
+            if not refresh.rotate():
+                raise InvalidToken(_("Token is invalid or expired"))
+            refresh.identity_user = user
+
+        return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+
+class FamilyTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        token = UntypedToken(attrs["token"])
+        if FAMILY_CLAIM in token.payload and not TokenFamily.objects.filter(
+                pk=token[FAMILY_CLAIM], generation=token.get(GENERATION_CLAIM)
+        ).exists():
+            raise InvalidToken(_("Token is invalid or expired"))
+        return data
+
+
 class CustomTokenRefreshView(TokenRefreshView):
     """
     Accepts a refresh token and returns a new access token.
     """
     permission_classes = [AllowAny]
-    serializer_class = TokenRefreshSerializer
+    serializer_class = IdentityTokenRefreshSerializer
+    throttle_scope = 'auth'
+
+    def get_serializer_class(self):
+        if refresh_token_mode() == "family":
+            return FamilyTokenRefreshSerializer
+        return self.serializer_class
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
-        except Exception as e:
+        except TOKEN_ERRORS:
             return Response({"detail": "Invalid or expired refresh token."}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
@@ -84,13 +157,13 @@ class CustomTokenVerifyView(TokenVerifyView):
     Accepts a token and verifies if it is valid.
     """
     permission_classes = [AllowAny]
-    serializer_class = TokenVerifySerializer
+    serializer_class = FamilyTokenVerifySerializer
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
-        except Exception as e:
+        except TOKEN_ERRORS:
             return Response({"detail": "Token is invalid or expired."}, status=status.HTTP_401_UNAUTHORIZED)
         return Response({"detail": "Token is valid"}, status=status.HTTP_200_OK)
 
@@ -1,16 +1,35 @@
 # offers/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
+from .bulk import OPERATIONS
 from .models import Offer
 
 
+def bulk_admin_action(operation):
+    """OfferAdmin action running `operation` on the selected offers as one UPDATE"""
+    def run(modeladmin, request, queryset):
+        updated, failed = operation.run(queryset)
+        modeladmin.message_user(request, f"{updated} offer(s) updated.", messages.SUCCESS)
+        if failed:
+            details = "; ".join(f"#{pk}: {error}" for pk, error in sorted(failed.items()))
+            modeladmin.message_user(request, f"{len(failed)} offer(s) skipped. {details}", messages.WARNING)
+
+    run.__name__ = f"bulk_{operation.name}"
+    run.short_description = operation.label
+    return run
+
+
 @admin.register(Offer)
 class OfferAdmin(admin.ModelAdmin):
-    list_display = ['title', 'offer_type', 'status', 'is_featured', 'is_active_display', 'start_date', 'end_date']
+    list_display = [
+        'title', 'offer_type', 'status', 'is_featured', 'is_active_display', 'start_date', 'end_date',
+        'impressions', 'clicks',
+    ]
     list_filter = ['status', 'offer_type', 'is_featured', 'is_exclusive', 'created_at']
     search_fields = ['title', 'description']
-    readonly_fields = ['created_at', 'updated_at', 'is_active_display']
+    readonly_fields = ['created_at', 'updated_at', 'is_active_display', 'impressions', 'clicks']
     list_editable = ['is_featured', 'status']
     date_hierarchy = 'created_at'
+    actions = [bulk_admin_action(operation) for operation in OPERATIONS.values()]
 
     fieldsets = (
         ('Basic Information', {
@@ -22,6 +41,9 @@ class OfferAdmin(admin.ModelAdmin):
         ('Validity & Status', {
             'fields': ('start_date', 'end_date', 'status', 'is_featured', 'is_exclusive')
         }),
+        ('Engagement', {
+            'fields': ('impressions', 'clicks')
+        }),
         ('Metadata', {
             'fields': ('created_by', 'created_at', 'updated_at', 'is_active_display')
         }),
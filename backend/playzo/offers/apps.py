@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OffersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'offers'
+
+    def ready(self):
+        # Import signals
+        import offers.signals  # noqa
@@ -0,0 +1,79 @@
+"""
+Bulk offer operations.
+
+Each operation changes a selection of offers (an id list or any queryset) with a
+single `UPDATE`, after setting aside the offers it must not touch, e.g. activating
+an offer that already ended. Used by `OfferViewSet.bulk`, `OfferViewSet.activate`
+and the `OfferAdmin` actions. `update()` sends no signals, so the home feed is invalidated here; the
+search index is unaffected since titles and descriptions never change.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+
+from .feed import invalidate_home_feed
+from .models import Offer
+
+
+class BulkOperation:
+    def __init__(self, name, label, values, rejections=lambda now: []):
+        self.name = name
+        self.label = label
+        self.values = values  # now -> update() keyword arguments
+        self.rejections = rejections  # now -> [(condition, error)] of offers left alone
+
+    def run(self, queryset, ids=None, now=None):
+        """
+        Apply the operation to `queryset` (narrowed to `ids` if given).
+        Returns (number of offers updated, {id: error} of offers left alone).
+        """
+        now = now or datetime.now(settings.CAIRO_TZ)
+        failed = {}
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+            found = set(queryset.values_list('pk', flat=True))
+            failed = {pk: "Offer not found" for pk in ids if pk not in found}
+
+        for condition, error in self.rejections(now):
+            for pk in queryset.filter(condition).values_list('pk', flat=True):
+                failed.setdefault(pk, error)
+            queryset = queryset.exclude(condition)
+
+        with transaction.atomic():
+            updated = queryset.update(**self.values(now), updated_at=now)
+            if updated:
+                transaction.on_commit(invalidate_home_feed)
+        return updated, failed
+
+
+def activated_status(now):
+    # What Offer.save() would settle on for an offer set to ACTIVE (see Offer.sync_status)
+    return Case(
+        When(start_date__gt=now, then=Value(Offer.Status.UPCOMING)),
+        default=Value(Offer.Status.ACTIVE),
+    )
+
+
+OPERATIONS = {operation.name: operation for operation in [
+    BulkOperation(
+        'activate', "Activate selected offers",
+        lambda now: {'status': activated_status(now)},
+        lambda now: [
+            (Q(status=Offer.Status.ACTIVE), "Offer is already active"),
+            (Q(end_date__lt=now), "Offer has already ended"),
+            # Already scheduled; the offer scheduler activates it at its start date
+            (Q(status=Offer.Status.UPCOMING, start_date__gt=now), "Offer has not started yet"),
+        ],
+    ),
+    BulkOperation(
+        'deactivate', "Deactivate selected offers",
+        lambda now: {'status': Offer.Status.EXPIRED},
+        lambda now: [(~Q(status=Offer.Status.ACTIVE), "Offer is not active")],
+    ),
+    BulkOperation('feature', "Mark selected offers as featured", lambda now: {'is_featured': True}),
+    BulkOperation('unfeature', "Unmark selected offers as featured", lambda now: {'is_featured': False}),
+    BulkOperation('mark_exclusive', "Mark selected offers as exclusive", lambda now: {'is_exclusive': True}),
+    BulkOperation('unmark_exclusive', "Unmark selected offers as exclusive", lambda now: {'is_exclusive': False}),
+]}
@@ -0,0 +1,141 @@
+"""
+Buffered offer impression and click counters.
+
+`POST /api/offers/offers/track/` only adds to per-process in-memory counts, so
+showing an offer never waits for the SQLite write lock. The counts are written
+with one grouped `UPDATE ... SET impressions = impressions + CASE id ...` by a
+daemon timer `OFFERS_ENGAGEMENT_FLUSH_INTERVAL` seconds after the first buffered
+event (right away once `OFFERS_ENGAGEMENT_MAX_PENDING` events are buffered), and at
+process exit; never by the request that records them. A crash loses at most that much; a failed flush keeps its counts
+for the next one. Increments are relative, so several processes can flush
+independently.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, F, Value, When
+
+from .models import ENGAGEMENT_COUNTERS as COUNTERS, Offer
+
+logger = logging.getLogger(__name__)
+
+# Offers per UPDATE statement, keeps the CASE expression and its parameters bounded
+FLUSH_BATCH_SIZE = 500
+
+
+class EngagementBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counts = {counter: Counter() for counter in COUNTERS}
+        self.pending = 0
+        self.timer = None  # pending timed flush, started by the first event after a flush
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "OFFERS_ENGAGEMENT_FLUSH_INTERVAL", 10)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, "OFFERS_ENGAGEMENT_MAX_PENDING", 1000)
+
+    def record(self, impressions=(), clicks=()):
+        """Count one event per offer id listed (ids may repeat); the flush is left to the timer"""
+        with self.lock:
+            self.counts["impressions"].update(impressions)
+            self.counts["clicks"].update(clicks)
+            self.pending += len(impressions) + len(clicks)
+            self.schedule(now=self.pending >= self.max_pending)
+
+    def schedule(self, now=False):
+        """
+        Start the timed flush if counts are buffered and none is pending, `now` brings a
+        pending one forward; call with `lock` held
+        """
+        if not self.pending:
+            return
+        if now and self.timer is not None and self.timer.interval > 0:
+            self.timer.cancel()
+            self.timer = None
+        if self.timer is None:
+            self.timer = threading.Timer(0 if now else self.flush_interval, self.flush_on_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_on_timer(self):
+        with self.lock:
+            # Unless a timer brought forward already replaced this one
+            if self.timer is threading.current_thread():
+                self.timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Timed flush of offer engagement counts failed")
+        finally:
+            # The timer thread's own connection, opened by the flush
+            connection.close()
+            # Counts kept by a failed flush, or recorded while it ran
+            with self.lock:
+                self.schedule()
+
+    def take(self):
+        with self.lock:
+            counts = self.counts
+            self.counts = {counter: Counter() for counter in COUNTERS}
+            self.pending = 0
+        return counts
+
+    def restore(self, counts):
+        with self.lock:
+            for counter, values in counts.items():
+                self.counts[counter].update(values)
+                self.pending += sum(values.values())
+
+    def flush(self):
+        """Write the buffered counts, returns the number of offers updated"""
+        with self.flush_lock:
+            counts = self.take()
+            pks = sorted(set().union(*counts.values()))
+            updated = 0
+            for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+                batch = pks[start:start + FLUSH_BATCH_SIZE]
+                try:
+                    updated += Offer.objects.filter(pk__in=batch).update(**{
+                        counter: F(counter) + Case(
+                            *[When(pk=pk, then=Value(values[pk])) for pk in batch if values[pk]],
+                            default=Value(0),
+                        )
+                        for counter, values in counts.items()
+                    })
+                except DatabaseError:
+                    logger.warning("Flushing offer engagement counts failed, keeping them for the next flush",
+                                   exc_info=True)
+                    self.restore({
+                        counter: Counter({pk: values[pk] for pk in pks[start:] if values[pk]})
+                        for counter, values in counts.items()
+                    })
+                    break
+            return updated
+
+    def reset(self):
+        """Drop the buffered counts without writing them and cancel the timed flush (for tests)"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self.take()
+
+
+engagement_buffer = EngagementBuffer()
+
+
+@atexit.register
+def flush_at_exit():
+    try:
+        engagement_buffer.flush()
+    except Exception:
+        logger.exception("Flushing offer engagement counts at exit failed")
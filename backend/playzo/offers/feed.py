@@ -0,0 +1,68 @@
+"""
+Cached home feed.
+
+`OfferViewSet.for_home` is the first call every app launch makes, so the featured,
+active and upcoming offers are fetched with one query, partitioned in Python and
+kept in the shared cache. The entry is dropped whenever an offer is saved or
+deleted (see `offers.signals`) or moved by the offer scheduler, and otherwise
+expires at the next moment an offer starts or ends.
+"""
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Offer
+
+CACHE_KEY = "offers:home_feed"
+
+
+def build_home_feed(now):
+    """
+    Featured / active / upcoming offers at `now`, with the datetime at which this
+    partition stops being valid (None if no offer will change state)
+    """
+    offers = Offer.objects.filter(
+        status__in=[Offer.Status.ACTIVE, Offer.Status.UPCOMING]
+    ).order_by()
+
+    feed = {'featured': [], 'active': [], 'upcoming': []}
+    boundaries = []
+    for offer in offers:
+        if offer.status == Offer.Status.UPCOMING:
+            feed['upcoming'].append(offer)
+            boundary = offer.start_date
+        else:
+            feed['featured' if offer.is_featured else 'active'].append(offer)
+            boundary = offer.end_date
+        # An overdue offer only moves when the scheduler runs, which drops the entry itself;
+        # counting its past boundary would expire the feed on every request until then
+        if boundary > now:
+            boundaries.append(boundary)
+
+    # Sorted here rather than in SQL, an ORDER BY across two status ranges needs a temp sort
+    feed['featured'].sort(key=lambda offer: (offer.created_at, offer.pk), reverse=True)
+    feed['active'].sort(key=lambda offer: (offer.created_at, offer.pk), reverse=True)
+    feed['upcoming'].sort(key=lambda offer: (offer.start_date, offer.pk))
+    return feed, min(boundaries, default=None)
+
+
+def get_home_feed():
+    """The home feed from the shared cache, rebuilt (one query) on a miss"""
+    cache = caches['shared']
+    feed = cache.get(CACHE_KEY)
+    if feed is not None:
+        return feed
+
+    now = datetime.now(settings.CAIRO_TZ)
+    feed, expires_at = build_home_feed(now)
+    timeout = getattr(settings, "OFFERS_HOME_CACHE_MAX_AGE", 60 * 60)
+    if expires_at is not None:
+        timeout = min(timeout, max(1, math.ceil((expires_at - now).total_seconds())))
+    cache.set(CACHE_KEY, feed, timeout=timeout)
+    return feed
+
+
+def invalidate_home_feed():
+    caches['shared'].delete(CACHE_KEY)
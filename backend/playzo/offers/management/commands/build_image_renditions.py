@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from offers.models import Offer
+from players.models import Player
+from playzo import renditions
+
+# (model, image field, renditions field)
+IMAGE_FIELDS = [
+    (Offer, "image", "image_renditions"),
+    (Player, "photo", "photo_renditions"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Build missing or outdated image renditions for offer images and player photos. "
+        "Uploads normally get them in the background right after saving; this catches up on "
+        "anything missed (e.g. a restart mid-build) or rebuilds all with --force after IMAGE_RENDITIONS changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild renditions that look current")
+
+    def handle(self, *args, **options):
+        for model, field_name, renditions_field in IMAGE_FIELDS:
+            if options["force"]:
+                model.objects.update(**{renditions_field: {}})
+
+            built = failed = 0
+            rows = model.objects.order_by("pk").values_list("pk", field_name, renditions_field)
+            for pk, name, current in rows.iterator():
+                if renditions.is_current(name, current):
+                    continue
+                try:
+                    renditions.refresh(model, pk, field_name, renditions_field)
+                    built += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{pk}: {exc}")
+
+            self.stdout.write(f"{model.__name__}.{field_name}: built {built}, failed {failed}")
+
+        self.stdout.write(self.style.SUCCESS("Image renditions are up to date"))
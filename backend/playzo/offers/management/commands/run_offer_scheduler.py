@@ -0,0 +1,48 @@
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from offers.feed import invalidate_home_feed
+from offers.models import Offer
+
+
+class Command(BaseCommand):
+    help = (
+        "Move offers UPCOMING -> ACTIVE -> EXPIRED at their start/end dates. "
+        "Runs forever, sleeping until the next transition (at most --interval seconds), "
+        "or once with --once (e.g. from cron). Safe to rerun; missed transitions are caught up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Apply due transitions and exit")
+        parser.add_argument(
+            "--interval", type=float, default=60,
+            help="Longest sleep between runs in seconds, so edits made elsewhere are picked up (default: 60)"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            self.apply_transitions()
+            if options["once"]:
+                break
+            time.sleep(self.seconds_until_next_run(options["interval"]))
+
+    def apply_transitions(self):
+        now = datetime.now(settings.CAIRO_TZ)
+        moved = Offer.objects.apply_transitions(now)
+        if any(moved.values()):
+            invalidate_home_feed()
+            summary = ", ".join(f"{count} -> {status}" for status, count in moved.items() if count)
+            self.stdout.write(f"{now:%Y-%m-%d %H:%M:%S}: {summary}")
+
+    def seconds_until_next_run(self, interval):
+        next_transition = Offer.objects.next_transition()
+        if next_transition is None:
+            return interval
+        wait = (next_transition - datetime.now(settings.CAIRO_TZ)).total_seconds()
+        # end_date is inclusive, so an offer expires just after it
+        return min(interval, max(wait, 0) + 1)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 14:27
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def sync_offer_statuses(apps, schema_editor):
+    """Bring existing rows in line with their dates, status is authoritative from now on"""
+    Offer = apps.get_model('offers', 'Offer')
+    now = datetime.now(settings.CAIRO_TZ)
+    Offer.objects.filter(status__in=['UPCOMING', 'ACTIVE'], end_date__lt=now).update(status='EXPIRED')
+    Offer.objects.filter(status='UPCOMING', start_date__lte=now).update(status='ACTIVE')
+    Offer.objects.filter(status='ACTIVE', start_date__gt=now).update(status='UPCOMING')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['status', 'start_date'], name='offer_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['status', 'end_date'], name='offer_status_end_idx'),
+        ),
+        migrations.RunPython(sync_offer_statuses, migrations.RunPython.noop),
+    ]
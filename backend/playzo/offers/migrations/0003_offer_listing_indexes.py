@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0002_offer_status_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['is_featured', 'created_at'], name='offer_featured_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['status', 'is_featured', 'created_at'], name='offer_status_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['offer_type', 'is_featured', 'created_at'], name='offer_type_featured_idx'),
+        ),
+    ]
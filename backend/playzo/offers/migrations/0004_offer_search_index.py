@@ -0,0 +1,56 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Frozen copy of the normalizer as of this migration (now playzo.utils.normalize_text),
+# so the backfill does not change if the live one does
+SEARCH_TABLE = "offers_offer_search"
+ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+ARABIC_LETTERS = str.maketrans({
+    "\u0671": "\u0627",
+    "\u0649": "\u064a",
+    "\u0629": "\u0647",
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+ARABIC_ARTICLE = re.compile("^[\u0648\u0641\u0628\u0643]?\u0627\u0644(?=\\w{2})")
+WORD = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = ARABIC_MARKS.sub("", text).translate(ARABIC_LETTERS).casefold()
+    return " ".join(ARABIC_ARTICLE.sub("", word) for word in WORD.findall(text))
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Offer = apps.get_model('offers', 'Offer')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+        f"USING fts5(title, description, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    for pk, title, description in Offer.objects.values_list('pk', 'title', 'description').iterator():
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [pk, normalize_text(title), normalize_text(description)],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0003_offer_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
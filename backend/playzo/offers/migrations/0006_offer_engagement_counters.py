@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0005_offer_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='clicks',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Clicks'),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='impressions',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Impressions'),
+        ),
+    ]
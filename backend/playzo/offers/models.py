@@ -1,10 +1,52 @@
+from datetime import datetime
+
 from django.db import models
+from django.db.models import F, Min, Q
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from players.models import Player
 from users.models import User
 
 
+# Only ever changed by relative UPDATEs (see offers.engagement)
+ENGAGEMENT_COUNTERS = ("impressions", "clicks")
+
+
+class OfferQuerySet(models.QuerySet):
+    def due_transitions(self, now):
+        """
+        (status, queryset) pairs of offers whose status is behind the clock at `now`.
+        EXPIRED comes first so an offer whose whole window was missed goes straight there.
+        """
+        Status = Offer.Status
+        return [
+            (Status.EXPIRED, self.filter(status__in=[Status.UPCOMING, Status.ACTIVE], end_date__lt=now)),
+            (Status.ACTIVE, self.filter(status=Status.UPCOMING, start_date__lte=now, end_date__gte=now)),
+            (Status.UPCOMING, self.filter(status=Status.ACTIVE, start_date__gt=now)),
+        ]
+
+    def apply_transitions(self, now=None):
+        """
+        Move offers UPCOMING -> ACTIVE -> EXPIRED according to their dates.
+        Idempotent, and catches up on any transition missed while nothing ran.
+        Returns {status: number of offers moved to it}.
+        """
+        now = now or datetime.now(settings.CAIRO_TZ)
+        return {
+            status: queryset.update(status=status, updated_at=now)
+            for status, queryset in self.due_transitions(now)
+        }
+
+    def next_transition(self):
+        """Earliest start/end date at which a scheduled offer changes status, or None"""
+        Status = Offer.Status
+        dates = self.aggregate(
+            start=Min("start_date", filter=Q(status=Status.UPCOMING)),
+            end=Min("end_date", filter=Q(status=Status.ACTIVE)),
+        )
+        return min((date for date in dates.values() if date is not None), default=None)
+
+
 class Offer(models.Model):
     class Status(models.TextChoices):
         ACTIVE = "ACTIVE", _("Active")
@@ -41,6 +83,13 @@ class Offer(models.Model):
         null=True,
         help_text=_("External image URL (overrides uploaded image if provided)")
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Image Renditions"),
+        help_text=_("Resized copies of the uploaded image, built in the background")
+    )
 
     # Offer details
     offer_type = models.CharField(
@@ -70,6 +119,10 @@ class Offer(models.Model):
         verbose_name=_("Exclusive Offer")
     )
 
+    # Engagement, written in batches by offers.engagement
+    impressions = models.PositiveBigIntegerField(default=0, editable=False, verbose_name=_("Impressions"))
+    clicks = models.PositiveBigIntegerField(default=0, editable=False, verbose_name=_("Clicks"))
+
     # Metadata
     created_by = models.ForeignKey(
         User,
@@ -81,23 +134,63 @@ class Offer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = OfferQuerySet.as_manager()
+
     class Meta:
         ordering = ["-is_featured", "-created_at"]
         verbose_name = _("Offer")
         verbose_name_plural = _("Offers")
+        indexes = [
+            models.Index(fields=["is_featured", "created_at"], name="offer_featured_created_idx"),
+            models.Index(fields=["status", "is_featured", "created_at"], name="offer_status_featured_idx"),
+            models.Index(fields=["offer_type", "is_featured", "created_at"], name="offer_type_featured_idx"),
+            models.Index(fields=["status", "start_date"], name="offer_status_start_idx"),
+            models.Index(fields=["status", "end_date"], name="offer_status_end_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        status = self.status
+        self.sync_status()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.status != status:
+            kwargs["update_fields"] = {*update_fields, "status"}
+        if self._state.adding or kwargs.get("force_insert"):
+            super().save(*args, **kwargs)
+            return
+
+        # Write the counters back as themselves, so counts flushed by the engagement
+        # buffer since this instance was loaded are not overwritten
+        counters = {name: getattr(self, name) for name in ENGAGEMENT_COUNTERS}
+        for name in counters:
+            setattr(self, name, F(name))
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            for name, value in counters.items():
+                setattr(self, name, value)
+
+    def sync_status(self, now=None):
+        """
+        Apply the scheduled transitions to this instance, so an offer is saved with
+        the status its dates call for; `run_offer_scheduler` keeps it current afterwards
+        """
+        if self.status not in (self.Status.UPCOMING, self.Status.ACTIVE):
+            return
+        now = now or datetime.now(settings.CAIRO_TZ)
+        if self.end_date < now:
+            self.status = self.Status.EXPIRED
+        elif self.start_date > now:
+            self.status = self.Status.UPCOMING
+        else:
+            self.status = self.Status.ACTIVE
+
     @property
     def is_active(self):
-        """Check if offer is currently active"""
-        from datetime import datetime
-        now = datetime.now(settings.CAIRO_TZ)
-        return (
-                self.status == self.Status.ACTIVE and
-                self.start_date <= now <= self.end_date
-        )
+        """Status is kept in step with the dates by the offer scheduler"""
+        return self.status == self.Status.ACTIVE
 
     @property
     def display_image(self):
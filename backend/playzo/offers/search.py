@@ -0,0 +1,88 @@
+"""
+Full-text search for offers.
+
+Titles and descriptions are normalized (case, Latin and Arabic diacritics, alef /
+yaa / taa marbuta variants, tatweel, Arabic-Indic digits, the definite article) and
+kept in the SQLite FTS5 table `offers_offer_search`, whose rowid is the offer id.
+`offers.signals` keeps it in sync on save/delete. `OfferSearchFilter` answers
+`?search=` from that table with bm25 ranking (title weighs more) and prefix
+matching; on other databases it falls back to DRF's `SearchFilter`.
+"""
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from playzo.utils import normalize_text
+
+SEARCH_TABLE = "offers_offer_search"
+
+# Relative bm25 weights of the indexed columns
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def match_expression(search):
+    """FTS5 MATCH expression requiring every word of `search` as a prefix, or None"""
+    words = normalize_text(search).split()
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def is_available():
+    return connection.vendor == "sqlite"
+
+
+def index_offer(offer):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [offer.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [offer.pk, normalize_text(offer.title), normalize_text(offer.description)],
+        )
+
+
+def remove_offer(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [pk])
+
+
+def search_offers(queryset, search):
+    """`queryset` narrowed to offers matching `search`, annotated with `search_rank` (lower is better)"""
+    expression = match_expression(search)
+    if expression is None:
+        return queryset
+    table = queryset.model._meta.db_table
+    # Joined once, so MATCH runs a single time and bm25() reads the row being joined;
+    # the ORM has no join to a table without a model, hence extra(). The rank is a real
+    # annotation, so keyset pagination can filter on it like on any other column.
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE}.rowid = "{table}"."id"', f"{SEARCH_TABLE} MATCH %s"],
+        params=[expression],
+    ).annotate(search_rank=RawSQL(
+        f"bm25({SEARCH_TABLE}, %s, %s)", [TITLE_WEIGHT, DESCRIPTION_WEIGHT], output_field=FloatField()
+    ))
+
+
+class OfferSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backed by the FTS5 offer index. Results come best match first unless
+    the client asks for an explicit `?ordering=`, so list this backend after
+    `OrderingFilter`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_available():
+            return super().filter_queryset(request, queryset, view)
+
+        search = request.query_params.get(self.search_param, "")
+        if match_expression(search) is None:
+            return queryset
+
+        queryset = search_offers(queryset, search)
+        if filters.OrderingFilter.ordering_param not in request.query_params:
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+            queryset = queryset.order_by("search_rank", *ordering)
+        return queryset
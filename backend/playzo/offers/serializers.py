@@ -1,11 +1,15 @@
 from rest_framework import serializers
 from .models import Offer
 from django.conf import settings
+from django.core.files.storage import default_storage
+from playzo.renditions import rendition_urls
+from playzo.rest_framework_utils.sparse_fields import SparseFieldsetSerializerMixin
 
 
-class OfferSerializer(serializers.ModelSerializer):
+class OfferSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     is_active = serializers.BooleanField(read_only=True)
     display_image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
     days_remaining = serializers.SerializerMethodField()
 
     class Meta:
@@ -18,6 +22,7 @@ class OfferSerializer(serializers.ModelSerializer):
             'image',
             'image_url',
             'display_image',
+            'image_renditions',
             'offer_type',
             'start_date',
             'end_date',
@@ -33,13 +38,38 @@ class OfferSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
+        compact_fields = [
+            'id',
+            'title',
+            'color',
+            'display_image',
+            'image_renditions',
+            'offer_type',
+            'end_date',
+            'is_featured',
+            'days_remaining',
+        ]
+        sparse_field_sources = {
+            'is_active': ['status'],
+            'display_image': ['image', 'image_url', 'image_renditions'],
+            'image_renditions': ['image_renditions'],
+            'days_remaining': ['end_date'],
+        }
 
     def get_display_image(self, obj):
         request = self.context.get('request')
         if obj.image and request:
+            # Prefer the resized "full" rendition over the original upload once it is built
+            full = (rendition_urls(obj.image_renditions, request) or {}).get('full')
+            if full:
+                return full['jpeg']
             return request.build_absolute_uri(obj.image.url)
         return obj.image_url
 
+    def get_image_renditions(self, obj):
+        """{"thumbnail"|"card"|"full": {"webp": url, "jpeg": url}} of the uploaded image, null until built"""
+        return rendition_urls(obj.image_renditions, self.context.get('request'))
+
     def get_days_remaining(self, obj):
         if obj.end_date:
             from datetime import datetime
@@ -48,6 +78,30 @@ class OfferSerializer(serializers.ModelSerializer):
             return max(0, remaining.days)
         return None
 
+    # Compiled read path (playzo.rest_framework_utils.fast_read): same values from `values()` rows
+
+    def fast_is_active(self, row, context):
+        return row['status'] == Offer.Status.ACTIVE
+
+    def fast_display_image(self, row, context):
+        if row['image'] and context.request:
+            full = (self.fast_image_renditions(row, context) or {}).get('full')
+            if full:
+                return full['jpeg']
+            return context.media_url(row['image'], default_storage)
+        return row['image_url']
+
+    def fast_image_renditions(self, row, context):
+        return rendition_urls(
+            row['image_renditions'], context.request,
+            media_url=lambda path: context.media_url(path, default_storage),
+        )
+
+    def fast_days_remaining(self, row, context):
+        if row['end_date']:
+            return max(0, (row['end_date'] - context.now).days)
+        return None
+
     def validate(self, data):
         """Validate offer dates"""
         start_date = data.get('start_date', self.instance.start_date if self.instance else None)
@@ -61,6 +115,14 @@ class OfferSerializer(serializers.ModelSerializer):
         return data
 
 
+class OfferStaffSerializer(OfferSerializer):
+    """OfferSerializer with the engagement counters, for staff"""
+
+    class Meta(OfferSerializer.Meta):
+        fields = OfferSerializer.Meta.fields + ['impressions', 'clicks']
+        read_only_fields = OfferSerializer.Meta.read_only_fields + ['impressions', 'clicks']
+
+
 class OfferWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Offer
@@ -84,3 +146,33 @@ class OfferWriteSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated:
             validated_data['created_by'] = request.user
         return super().create(validated_data)
+
+
+class OfferBulkFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Offer.Status.choices, required=False)
+    type = serializers.ChoiceField(choices=Offer.OfferType.choices, required=False)
+    is_featured = serializers.BooleanField(required=False)
+    is_exclusive = serializers.BooleanField(required=False)
+
+
+class OfferBulkSerializer(serializers.Serializer):
+    """Selection for a bulk offer operation: `ids`, or a `filter`"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    filter = OfferBulkFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Provide either ids or filter")
+        if 'filter' in data and not data['filter']:
+            raise serializers.ValidationError({"filter": "Filter on at least one field"})
+        return data
+
+
+class OfferTrackSerializer(serializers.Serializer):
+    """A batch of engagement events: one offer id per impression / click, ids may repeat"""
+    impressions = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), max_length=500, required=False, default=list
+    )
+    clicks = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), max_length=500, required=False, default=list
+    )
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from playzo import renditions
+
+from . import search
+from .feed import invalidate_home_feed
+from .models import Offer
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def invalidate_offer_caches(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_home_feed)
+
+
+@receiver(post_save, sender=Offer)
+def index_saved_offer(sender, instance, update_fields=None, **kwargs):
+    if not search.is_available():
+        return
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    search.index_offer(instance)
+
+
+@receiver(post_delete, sender=Offer)
+def unindex_deleted_offer(sender, instance, **kwargs):
+    if search.is_available():
+        search.remove_offer(instance.pk)
+
+
+@receiver(post_save, sender=Offer)
+def build_offer_image_renditions(sender, instance, **kwargs):
+    renditions.schedule(instance, 'image', 'image_renditions')
@@ -1,3 +1,529 @@
-from django.test import TestCase
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+from .engagement import engagement_buffer
+from .feed import CACHE_KEY as FEED_CACHE_KEY, build_home_feed
+from .models import Offer
+from .search import search_offers
+from .views import offer_list_validator
+
+# Plan lines that mean "every row was visited" or "rows were sorted after fetching".
+# "SCAN ... USING INDEX" is fine: that walks an index in ORDER BY order and stops at LIMIT.
+TABLE_SCAN = re.compile(r"^SCAN offers_offer$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+
+class OfferQueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN for every query an OfferViewSet action sends to
+    offers_offer and fails on a full table scan or a temp B-tree sort.
+    """
+    offers = 500
+
+    public_urls = [
+        "/api/offers/offers/",
+        "/api/offers/offers/?type=EVENT",
+        "/api/offers/offers/?is_featured=true",
+        "/api/offers/offers/?is_active=true",
+        "/api/offers/offers/active/",
+        "/api/offers/offers/active/?type=EVENT&is_featured=true",
+        "/api/offers/offers/active/?page=3",
+        "/api/offers/offers/active/?pagination=cursor",
+        "/api/offers/offers/featured/",
+        "/api/offers/offers/featured/?type=EVENT",
+        "/api/offers/offers/upcoming/",
+        "/api/offers/offers/upcoming/?type=EVENT",
+        "/api/offers/offers/upcoming/?pagination=cursor",
+        "/api/offers/offers/for_home/",
+        "/api/offers/offers/{pk}/",
+    ]
+    admin_urls = [
+        "/api/offers/offers/",
+        "/api/offers/offers/?status=DRAFT",
+        "/api/offers/offers/?type=EVENT&is_featured=true",
+        "/api/offers/offers/?is_active=false",
+        "/api/offers/offers/expired/",
+        "/api/offers/offers/expired/?type=EVENT",
+        "/api/offers/offers/expired/?page=5",
+        "/api/offers/offers/expired/?pagination=cursor",
+    ]
+    # Collection actions and the status they list, for walking every cursor page
+    collections = {
+        "active": Offer.Status.ACTIVE,
+        "featured": Offer.Status.ACTIVE,
+        "upcoming": Offer.Status.UPCOMING,
+        "expired": Offer.Status.EXPIRED,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(13)
+        now = timezone.now()
+        offers = []
+        for index in range(cls.offers):
+            start_date = now + timedelta(days=rnd.randint(-60, 30))
+            offers.append(Offer(
+                title=f"Offer {index}",
+                offer_type=rnd.choice(Offer.OfferType.values),
+                status=rnd.choice(Offer.Status.values),
+                start_date=start_date,
+                end_date=start_date + timedelta(days=rnd.randint(1, 45)),
+                is_featured=rnd.random() < 0.2,
+            ))
+        Offer.objects.bulk_create(offers)
+        Offer.objects.apply_transitions()
+        cls.pk = Offer.objects.order_by("pk").values_list("pk", flat=True).first()
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+
+    @contextmanager
+    def capture_offer_queries(self):
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.startswith("SELECT") and "offers_offer" in sql:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            yield queries
+
+    def query_plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, client, url):
+        url = url.format(pk=self.pk)
+        with self.capture_offer_queries() as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertTrue(queries, f"{url} sent no offer query")
+
+        for sql, params in queries:
+            plan = self.query_plan(sql, params)
+            for line in plan:
+                self.assertIsNone(TABLE_SCAN.search(line), f"{url} scans the table: {plan}\n{sql}")
+                self.assertIsNone(TEMP_SORT.search(line), f"{url} sorts in a temp B-tree: {plan}\n{sql}")
+
+    def test_public_actions_use_indexes(self):
+        client = APIClient()
+        for url in self.public_urls:
+            with self.subTest(url=url):
+                self.assert_indexed(client, url)
+
+    def test_admin_actions_use_indexes(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for url in self.admin_urls:
+            with self.subTest(url=url):
+                self.assert_indexed(client, url)
+
+    def test_cursor_pages_cover_collections(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for name, status in self.collections.items():
+            with self.subTest(action=name):
+                expected = Offer.objects.filter(status=status)
+                if name == "featured":
+                    expected = expected.filter(is_featured=True)
+
+                seen = []
+                url = f"/api/offers/offers/{name}/?pagination=cursor&page_size=25"
+                while url:
+                    self.assert_indexed(client, url)
+                    page = client.get(url).json()
+                    self.assertLessEqual(len(page["data"]), 25)
+                    seen += [offer["id"] for offer in page["data"]]
+                    url = page["next"]
+
+                self.assertEqual(len(seen), len(set(seen)))
+                self.assertEqual(sorted(seen), sorted(expected.values_list("pk", flat=True)))
+
+
+class FastReadTests(TestCase):
+    """The compiled read path renders exactly what OfferSerializer does"""
+    urls = [
+        "/api/offers/offers/",
+        "/api/offers/offers/?page=2&page_size=3",
+        "/api/offers/offers/?pagination=cursor&page_size=4",
+        "/api/offers/offers/?fields=id,title,display_image,days_remaining",
+        "/api/offers/offers/?compact=true",
+        "/api/offers/offers/?search=offer",
+        "/api/offers/offers/active/",
+        "/api/offers/offers/featured/",
+        "/api/offers/offers/upcoming/",
+        "/api/offers/offers/expired/",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for index in range(12):
+            start_date = now + timedelta(days=index - 8, hours=index)
+            Offer.objects.create(
+                title=f"Offer {index}",
+                description="Arabic \u0639\u0631\u0636 and unicode \u00e9" if index % 2 else "",
+                color="#123456" if index % 3 else "",
+                image=f"offers/images/offer-{index}.jpg" if index % 4 == 1 else None,
+                image_url=f"https://cdn.example.com/{index}.png" if index % 4 == 2 else None,
+                image_renditions={
+                    "source": f"offers/images/offer-{index}.jpg",
+                    "full": {"webp": f"offers/images/renditions/{index}-full.webp",
+                             "jpeg": f"offers/images/renditions/{index} full.jpeg"},
+                } if index == 5 else {},
+                offer_type=Offer.OfferType.values[index % len(Offer.OfferType.values)],
+                status=Offer.Status.DRAFT if index == 11 else Offer.Status.ACTIVE,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=6, microseconds=index),
+                is_featured=index % 3 == 0,
+                is_exclusive=index % 5 == 0,
+            )
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+
+    def get(self, url, fast):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with override_settings(FAST_READ_ENABLED=fast):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content
+
+    def test_fast_output_is_byte_identical(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url, fast=True), self.get(url, fast=False))
+
+    def test_fast_path_skips_model_instances(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):  # COUNT(*) and the page
+            client.get("/api/offers/offers/")
+
+
+class HomeFeedTests(TestCase):
+    def test_overdue_offers_do_not_expire_the_feed(self):
+        now = timezone.now()
+        # Left ACTIVE / UPCOMING past their dates, as between two scheduler runs
+        Offer.objects.bulk_create([
+            Offer(title="Overdue", status=Offer.Status.ACTIVE,
+                  start_date=now - timedelta(days=2), end_date=now - timedelta(minutes=1)),
+            Offer(title="Late start", status=Offer.Status.UPCOMING,
+                  start_date=now - timedelta(minutes=1), end_date=now + timedelta(days=3)),
+            Offer(title="Running", status=Offer.Status.ACTIVE,
+                  start_date=now - timedelta(days=1), end_date=now + timedelta(days=1)),
+        ])
+
+        feed, expires_at = build_home_feed(now)
+        self.assertEqual(expires_at, now + timedelta(days=1))
+        self.assertEqual(len(feed["active"]) + len(feed["upcoming"]), 3)
+
+        Offer.objects.filter(title="Running").delete()
+        self.assertIsNone(build_home_feed(now)[1])
+
+
+def create_offer(title, status, starts_in, ends_in, **extra):
+    now = timezone.now()
+    offer = Offer(title=title, status=status, start_date=now + timedelta(days=starts_in),
+                  end_date=now + timedelta(days=ends_in), **extra)
+    # bulk_create skips Offer.save, so the status is stored as given
+    Offer.objects.bulk_create([offer])
+    return offer
+
+
+class OfferStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def activate(self, offer):
+        return self.client.post(f"/api/offers/offers/{offer.pk}/activate/")
+
+    def test_activate_applies_the_bulk_checks(self):
+        cases = [
+            ("running draft", Offer.Status.DRAFT, -1, 1, 200, Offer.Status.ACTIVE),
+            ("future draft", Offer.Status.DRAFT, 1, 2, 200, Offer.Status.UPCOMING),
+            ("ended draft", Offer.Status.DRAFT, -2, -1, 400, Offer.Status.DRAFT),
+            ("scheduled", Offer.Status.UPCOMING, 1, 2, 400, Offer.Status.UPCOMING),
+            ("active", Offer.Status.ACTIVE, -1, 1, 400, Offer.Status.ACTIVE),
+        ]
+        for title, initial, starts_in, ends_in, status_code, final in cases:
+            with self.subTest(title):
+                offer = create_offer(title, initial, starts_in, ends_in)
+                response = self.activate(offer)
+                self.assertEqual(response.status_code, status_code)
+                offer.refresh_from_db()
+                self.assertEqual(offer.status, final)
+                if status_code == 200:
+                    self.assertEqual(response.json()["status"], final)
+
+        ended = Offer.objects.get(title="ended draft")
+        self.assertEqual(self.activate(ended).json(), {"error": "Offer has already ended"})
+
+    def test_scheduler_moves_offers_by_their_dates(self):
+        create_offer("starts", Offer.Status.UPCOMING, -1, 1)
+        create_offer("ends", Offer.Status.ACTIVE, -2, -1)
+        create_offer("missed", Offer.Status.UPCOMING, -3, -2)
+        create_offer("postponed", Offer.Status.ACTIVE, 1, 2)
+        create_offer("draft", Offer.Status.DRAFT, -2, -1)
+        caches["shared"].set(FEED_CACHE_KEY, {"featured": [], "active": [], "upcoming": []})
+
+        call_command("run_offer_scheduler", "--once", stdout=StringIO())
+
+        self.assertEqual(dict(Offer.objects.values_list("title", "status")), {
+            "starts": Offer.Status.ACTIVE,
+            "ends": Offer.Status.EXPIRED,
+            "missed": Offer.Status.EXPIRED,
+            "postponed": Offer.Status.UPCOMING,
+            "draft": Offer.Status.DRAFT,
+        })
+        self.assertIsNone(caches["shared"].get(FEED_CACHE_KEY))
+
+        call_command("run_offer_scheduler", "--once", stdout=StringIO())
+        self.assertEqual(Offer.objects.filter(status=Offer.Status.ACTIVE).count(), 1)
+
+
+class ConditionalListTests(TestCase):
+    url = "/api/offers/offers/active/?type=EVENT&is_featured=false"
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Offer.objects.bulk_create([
+            Offer(title=f"Event {index}", offer_type=Offer.OfferType.EVENT, status=Offer.Status.ACTIVE,
+                  start_date=now - timedelta(days=1), end_date=now + timedelta(days=index + 1, hours=1))
+            for index in range(3)
+        ])
+
+    def test_unchanged_list_is_not_modified(self):
+        client = APIClient()
+        etag = client.get(self.url)["ETag"]
+
+        # One aggregate query answers the revalidation, whatever the parameter order
+        with self.assertNumQueries(1):
+            response = client.get("/api/offers/offers/active/?is_featured=false&type=EVENT",
+                                  HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        offer = Offer.objects.get(title="Event 1")
+        offer.title = "Event one"
+        offer.save()
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_days_remaining_changes_the_etag(self):
+        now = timezone.now()
+        offers = Offer.objects.filter(title__startswith="Event")
+        first, _ = offer_list_validator(offers)
+        self.assertEqual(first, offer_list_validator(list(offers))[0])
+        self.assertEqual(first[2], 1 + 2 + 3)
+
+        # As if a day passed for one offer: update() leaves updated_at alone
+        Offer.objects.filter(title="Event 2").update(end_date=now + timedelta(days=2, hours=1))
+        self.assertNotEqual(offer_list_validator(offers)[0], first)
+
+
+class OfferSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for title, description in [
+            ("Summer camp", "Football for the مدرسة"),
+            ("Football league", "Weekly matches"),
+            ("Padel night", "Bring a friend"),
+        ]:
+            Offer.objects.create(title=title, description=description, status=Offer.Status.ACTIVE,
+                                 start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+
+    def titles(self, search):
+        return list(search_offers(Offer.objects.all(), search).order_by("search_rank").values_list("title", flat=True))
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.titles("foot"), ["Football league", "Summer camp"])
+        self.assertEqual(self.titles("المدرسه"), ["Summer camp"])
+        self.assertEqual(self.titles("padel friend"), ["Padel night"])
+        self.assertEqual(self.titles("tennis"), [])
+
+    def test_match_runs_once(self):
+        with CaptureQueriesContext(connection) as context:
+            list(search_offers(Offer.objects.all(), "foot"))
+        self.assertEqual(context.captured_queries[0]["sql"].count("MATCH"), 1)
+
+    def test_cursor_pages_walk_every_match(self):
+        now = timezone.now()
+        # Equal ranks, so pages also break ties on the trailing ordering fields
+        for index in range(5):
+            Offer.objects.create(title="Football cup", description=f"Round {index}", status=Offer.Status.ACTIVE,
+                                 start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", is_superuser=True))
+        expected = [row["id"] for row in client.get("/api/offers/offers/?search=foot&no_pagination=true").json()]
+
+        seen = []
+        url = "/api/offers/offers/?search=foot&pagination=cursor&page_size=2"
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.json()["data"]]
+            url = response.json()["next"]
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(seen, expected)
+
+
+class BulkOperationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", is_superuser=True)
+        cls.draft = create_offer("draft", Offer.Status.DRAFT, -1, 1, offer_type=Offer.OfferType.EVENT)
+        cls.future = create_offer("future", Offer.Status.DRAFT, 1, 2, offer_type=Offer.OfferType.EVENT)
+        cls.ended = create_offer("ended", Offer.Status.DRAFT, -2, -1)
+        cls.active = create_offer("active", Offer.Status.ACTIVE, -1, 1, offer_type=Offer.OfferType.EVENT)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_activate_ids_reports_skipped_offers(self):
+        ids = [self.draft.pk, self.future.pk, self.ended.pk, self.active.pk, 9999]
+        caches["shared"].set(FEED_CACHE_KEY, {"featured": [], "active": [], "upcoming": []})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/offers/offers/bulk/activate/", {"ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"updated": 2, "failed": [
+            {"id": self.ended.pk, "error": "Offer has already ended"},
+            {"id": self.active.pk, "error": "Offer is already active"},
+            {"id": 9999, "error": "Offer not found"},
+        ]})
+        self.assertEqual(dict(Offer.objects.values_list("title", "status")), {
+            "draft": Offer.Status.ACTIVE,
+            "future": Offer.Status.UPCOMING,
+            "ended": Offer.Status.DRAFT,
+            "active": Offer.Status.ACTIVE,
+        })
+        self.assertIsNone(caches["shared"].get(FEED_CACHE_KEY))
+
+    def test_filter_selects_offers(self):
+        response = self.client.post(
+            "/api/offers/offers/bulk/feature/", {"filter": {"type": Offer.OfferType.EVENT}}, format="json"
+        )
+        self.assertEqual(response.json(), {"updated": 3, "failed": []})
+        self.assertEqual(
+            set(Offer.objects.filter(is_featured=True).values_list("title", flat=True)), {"draft", "future", "active"}
+        )
+
+    def test_invalid_requests(self):
+        url = "/api/offers/offers/bulk/{}/"
+        self.assertEqual(self.client.post(url.format("explode"), {"ids": [1]}, format="json").status_code, 404)
+        self.assertEqual(self.client.post(url.format("feature"), {}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url.format("feature"), {"filter": {}}, format="json").status_code, 400)
+
+
+class EngagementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = create_offer("first", Offer.Status.ACTIVE, -1, 1)
+        cls.second = create_offer("second", Offer.Status.ACTIVE, -1, 1)
+
+    def setUp(self):
+        engagement_buffer.reset()
+        self.addCleanup(engagement_buffer.reset)
+
+    def counts(self):
+        return dict((title, (impressions, clicks)) for title, impressions, clicks in
+                    Offer.objects.values_list("title", "impressions", "clicks"))
+
+    def test_tracked_events_are_flushed(self):
+        response = APIClient().post("/api/offers/offers/track/", {
+            "impressions": [self.first.pk, self.second.pk, self.first.pk], "clicks": [self.first.pk],
+        }, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.counts(), {"first": (0, 0), "second": (0, 0)})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(engagement_buffer.flush(), 2)
+        self.assertEqual(self.counts(), {"first": (2, 1), "second": (1, 0)})
+        self.assertEqual(engagement_buffer.flush(), 0)
+
+    def test_save_keeps_flushed_counts(self):
+        offer = Offer.objects.get(pk=self.first.pk)
+        engagement_buffer.record(impressions=[offer.pk] * 5)
+        engagement_buffer.flush()
+
+        offer.title = "renamed"
+        offer.save()
+        self.assertEqual(offer.impressions, 0)
+        self.assertEqual(self.counts()["renamed"], (5, 0))
+
+
+class ConcurrentEngagementTests(TransactionTestCase):
+    threads = 6
+    events_per_thread = 200
+
+    def setUp(self):
+        engagement_buffer.reset()
+        self.addCleanup(engagement_buffer.reset)
+        self.offer = create_offer("tracked", Offer.Status.ACTIVE, -1, 1)
+
+    @override_settings(OFFERS_ENGAGEMENT_FLUSH_INTERVAL=0.05)
+    def test_idle_buffer_is_flushed_by_the_timer(self):
+        engagement_buffer.record(impressions=[self.offer.pk], clicks=[self.offer.pk])
+        self.wait_for_clicks(1)
+        self.assertEqual((self.offer.impressions, self.offer.clicks), (1, 1))
+
+    def wait_for_clicks(self, clicks):
+        deadline = time.monotonic() + 5
+        while Offer.objects.get(pk=self.offer.pk).clicks < clicks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.offer.refresh_from_db()
+
+    @override_settings(OFFERS_ENGAGEMENT_MAX_PENDING=3)
+    def test_max_pending_brings_the_timer_forward(self):
+        # Recording never writes, not even the event that fills the buffer
+        with self.assertNumQueries(0):
+            engagement_buffer.record(impressions=[self.offer.pk] * 2)
+            engagement_buffer.record(clicks=[self.offer.pk])
+        self.wait_for_clicks(1)
+        self.assertEqual((self.offer.impressions, self.offer.clicks), (2, 1))
+
+    @override_settings(OFFERS_ENGAGEMENT_FLUSH_INTERVAL=0, OFFERS_ENGAGEMENT_MAX_PENDING=7)
+    def test_concurrent_flushes_lose_no_events(self):
+        errors = []
+
+        def track():
+            try:
+                for _ in range(self.events_per_thread):
+                    engagement_buffer.record(impressions=[self.offer.pk])
+                    engagement_buffer.flush()
+            except Exception as exc:  # pragma: no cover - surfaced below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=track) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        engagement_buffer.flush()
+
+        self.assertEqual(errors, [])
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.impressions, self.threads * self.events_per_thread)
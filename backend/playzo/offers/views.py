@@ -1,13 +1,22 @@
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
 
-from .models import Offer
-from .serializers import OfferSerializer, OfferWriteSerializer
 from django.conf import settings
+from django.db.models import Count, DateTimeField, F, Func, IntegerField, Max, QuerySet, Sum, Value
 from datetime import datetime
 
+from .bulk import OPERATIONS
+from .engagement import engagement_buffer
+from .feed import get_home_feed
+from .models import Offer
+from .search import OfferSearchFilter
+from .serializers import (
+    OfferBulkSerializer, OfferSerializer, OfferStaffSerializer, OfferTrackSerializer, OfferWriteSerializer
+)
+from playzo.rest_framework_utils.conditional import conditional_get
+from playzo.rest_framework_utils.fast_read import FastReadViewMixin
+
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiParameter,
@@ -15,6 +24,42 @@ from drf_spectacular.utils import (
     OpenApiResponse
 )
 
+
+class DaysRemaining(Func):
+    """
+    MAX(0, whole days from `now` to the offer's end), i.e. OfferSerializer.get_days_remaining
+    in SQL (SQLite's julianday(); CAST truncates, which floors the non-negative differences)
+    """
+    template = "MAX(0, CAST(julianday(%(expressions)s) AS INTEGER))"
+    arg_joiner = ") - julianday("
+    output_field = IntegerField()
+
+    def __init__(self, now):
+        super().__init__(F('end_date'), Value(now, output_field=DateTimeField()))
+
+
+def offer_list_validator(offers):
+    """
+    Conditional GET validator for an offer list (queryset or instances): its size, latest
+    updated_at and the sum of days_remaining, the only field that moves with the clock
+    (it only ever decreases, so the sum changes whenever any offer's value does).
+    A queryset is read with one aggregate query, no rows are fetched.
+    """
+    now = datetime.now(settings.CAIRO_TZ)
+    if isinstance(offers, QuerySet):
+        aggregates = offers.order_by().aggregate(
+            count=Count('pk'), updated_at=Max('updated_at'), days_remaining=Sum(DaysRemaining(now))
+        )
+        fingerprint = (aggregates['count'], aggregates['updated_at'], aggregates['days_remaining'] or 0)
+    else:
+        fingerprint = (
+            len(offers),
+            max((offer.updated_at for offer in offers), default=None),
+            sum(max(0, (offer.end_date - now).days) for offer in offers),
+        )
+    return fingerprint, fingerprint[1]
+
+
 COMMON_FILTER_PARAMS = [
     OpenApiParameter("type", OpenApiTypes.STR, description="Filter by offer type"),
     OpenApiParameter("is_featured", OpenApiTypes.BOOL, description="True/False"),
@@ -23,19 +68,28 @@ COMMON_FILTER_PARAMS = [
 ]
 
 
-class OfferViewSet(viewsets.ModelViewSet):
+class OfferViewSet(FastReadViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing offers
     """
     queryset = Offer.objects.all()
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, OfferSearchFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'start_date', 'end_date']
     ordering = ['-is_featured', '-created_at']
+    public_feed_actions = ['active', 'featured', 'for_home', 'upcoming']
+    throttle_scope = None  # set per action, see playzo.rest_framework_utils.throttling
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return OfferWriteSerializer
+        if self.action == 'bulk':
+            return OfferBulkSerializer
+        if self.action == 'track':
+            return OfferTrackSerializer
+        # Public feeds stay on one representation for everyone (they are conditional GETs)
+        if self.action not in self.public_feed_actions and self.request.user.is_staff:
+            return OfferStaffSerializer
         return OfferSerializer
 
     def get_permissions(self):
@@ -44,7 +98,7 @@ class OfferViewSet(viewsets.ModelViewSet):
         - List/retrieve: Allow any authenticated user
         - Create/update/delete: Admin only
         """
-        if self.action in ['list', 'retrieve', 'active', 'featured', 'for_home', 'upcoming']:
+        if self.action in ['list', 'retrieve', 'active', 'featured', 'for_home', 'upcoming', 'track']:
             return [permissions.AllowAny()]  # Changed to AllowAny for viewing
         return [permissions.IsAdminUser()]
 
@@ -52,7 +106,7 @@ class OfferViewSet(viewsets.ModelViewSet):
         """
         Filter queryset based on user permissions and request parameters.
         """
-        queryset = super().get_queryset()
+        queryset = self.optimize_queryset(super().get_queryset())
 
         # Get query parameters
         status_param = self.request.query_params.get('status', None)
@@ -61,12 +115,12 @@ class OfferViewSet(viewsets.ModelViewSet):
         is_exclusive = self.request.query_params.get('is_exclusive', None)
         is_active = self.request.query_params.get('is_active', None)
 
-        # For non-admin users, only show active/upcoming offers
+        # For non-admin users, only show active/upcoming offers.
+        # Written as an exclusion so SQLite walks offer_featured_created_idx in order
+        # instead of sorting the rows of two status ranges.
         if not self.request.user.is_staff:
-            now = datetime.now(settings.CAIRO_TZ)
-            queryset = queryset.filter(
-                Q(status=Offer.Status.ACTIVE) | Q(status=Offer.Status.UPCOMING),
-                end_date__gte=now
+            queryset = queryset.exclude(
+                status__in=[Offer.Status.EXPIRED, Offer.Status.DRAFT]
             ).order_by('-is_featured', '-created_at')
         else:
             # Admin users can filter by status
@@ -87,23 +141,14 @@ class OfferViewSet(viewsets.ModelViewSet):
             is_exclusive_bool = is_exclusive.lower() == 'true'
             queryset = queryset.filter(is_exclusive=is_exclusive_bool)
 
-        # Filter by active status (based on dates)
+        # Filter by active status (kept in step with the dates by the offer scheduler)
         if is_active is not None:
             is_active_bool = is_active.lower() == 'true'
-            now = datetime.now(settings.CAIRO_TZ)
 
             if is_active_bool:
-                queryset = queryset.filter(
-                    status=Offer.Status.ACTIVE,
-                    start_date__lte=now,
-                    end_date__gte=now
-                )
+                queryset = queryset.filter(status=Offer.Status.ACTIVE)
             else:
-                queryset = queryset.filter(
-                    Q(status=Offer.Status.EXPIRED) |
-                    Q(status=Offer.Status.DRAFT) |
-                    Q(end_date__lt=now)
-                )
+                queryset = queryset.exclude(status__in=[Offer.Status.ACTIVE, Offer.Status.UPCOMING])
 
         return queryset
 
@@ -114,18 +159,19 @@ class OfferViewSet(viewsets.ModelViewSet):
         ]
     )
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    @conditional_get(lambda view, request: offer_list_validator(view.get_active_offers(request)))
     def active(self, request):
         """
         Get all currently active offers.
         This endpoint is public (AllowAny).
         """
-        now = datetime.now(settings.CAIRO_TZ)
+        return self.list_response(self.get_active_offers(request))
 
+    def get_active_offers(self, request):
+        # Unique ordering (pk tie-breaker) so `?pagination=cursor` can keyset-paginate it
         active_offers = Offer.objects.filter(
-            status=Offer.Status.ACTIVE,
-            start_date__lte=now,
-            end_date__gte=now
-        ).order_by('-is_featured', '-created_at')
+            status=Offer.Status.ACTIVE
+        ).order_by('-is_featured', '-created_at', '-pk')
 
         # Apply additional filters from query params
         offer_type = request.query_params.get('type', None)
@@ -137,8 +183,7 @@ class OfferViewSet(viewsets.ModelViewSet):
             is_featured_bool = is_featured.lower() == 'true'
             active_offers = active_offers.filter(is_featured=is_featured_bool)
 
-        serializer = self.get_serializer(active_offers, many=True)
-        return Response(serializer.data)
+        return active_offers
 
     @extend_schema(
         parameters=[
@@ -146,81 +191,71 @@ class OfferViewSet(viewsets.ModelViewSet):
         ]
     )
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    @conditional_get(lambda view, request: offer_list_validator(view.get_featured_offers(request)))
     def featured(self, request):
         """
         Get featured active offers.
         This endpoint is public (AllowAny).
         """
-        now = datetime.now(settings.CAIRO_TZ)
+        return self.list_response(self.get_featured_offers(request))
 
+    def get_featured_offers(self, request):
+        # is_featured=True compiles to a bare column test; IN keeps it an index lookup
         featured_offers = Offer.objects.filter(
-            is_featured=True,
-            status=Offer.Status.ACTIVE,
-            start_date__lte=now,
-            end_date__gte=now
-        ).order_by('-created_at')
+            is_featured__in=[True],
+            status=Offer.Status.ACTIVE
+        ).order_by('-created_at', '-pk')
 
         # Filter by offer type if provided
         offer_type = request.query_params.get('type', None)
         if offer_type:
             featured_offers = featured_offers.filter(offer_type=offer_type)
 
-        serializer = self.get_serializer(featured_offers, many=True)
-        return Response(serializer.data)
+        return featured_offers
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    @conditional_get(lambda view, request: offer_list_validator(
+        [offer for offers in view.get_home_feed(request).values() for offer in offers]
+    ))
     def for_home(self, request):
         """
         Get offers for home page display.
         Returns featured offers first, then other active offers.
+        Served from the shared home feed cache (see offers.feed).
         This endpoint is public (AllowAny).
         """
-        now = datetime.now(settings.CAIRO_TZ)
-
-        # Get featured offers
-        featured_offers = Offer.objects.filter(
-            is_featured=True,
-            status=Offer.Status.ACTIVE,
-            start_date__lte=now,
-            end_date__gte=now
-        ).order_by('-created_at')
-
-        # Get other active offers (non-featured)
-        other_offers = Offer.objects.filter(
-            is_featured=False,
-            status=Offer.Status.ACTIVE,
-            start_date__lte=now,
-            end_date__gte=now
-        ).order_by('-created_at')
-
-        # Get upcoming offers
-        upcoming_offers = Offer.objects.filter(
-            status=Offer.Status.UPCOMING,
-            start_date__gt=now
-        ).order_by('start_date')
+        feed = self.get_home_feed(request)
 
-        # Apply type filter if provided
-        offer_type = request.query_params.get('type', None)
-        if offer_type:
-            featured_offers = featured_offers.filter(offer_type=offer_type)
-            other_offers = other_offers.filter(offer_type=offer_type)
-            upcoming_offers = upcoming_offers.filter(offer_type=offer_type)
-
-        featured_serializer = self.get_serializer(featured_offers, many=True)
-        other_serializer = self.get_serializer(other_offers, many=True)
-        upcoming_serializer = self.get_serializer(upcoming_offers, many=True)
+        featured_serializer = self.get_serializer(feed['featured'], many=True)
+        other_serializer = self.get_serializer(feed['active'], many=True)
+        upcoming_serializer = self.get_serializer(feed['upcoming'], many=True)
 
         return Response({
             'featured': featured_serializer.data,
             'active': other_serializer.data,
             'upcoming': upcoming_serializer.data,
             'count': {
-                'featured': featured_offers.count(),
-                'active': other_offers.count(),
-                'upcoming': upcoming_offers.count(),
+                'featured': len(feed['featured']),
+                'active': len(feed['active']),
+                'upcoming': len(feed['upcoming']),
             }
         })
 
+    def get_home_feed(self, request):
+        """The cached home feed, filtered by `?type=`; kept for the rest of the request"""
+        if getattr(self, 'home_feed', None) is None:
+            feed = get_home_feed()
+
+            # Apply type filter if provided
+            offer_type = request.query_params.get('type', None)
+            if offer_type:
+                feed = {
+                    key: [offer for offer in offers if offer.offer_type == offer_type]
+                    for key, offers in feed.items()
+                }
+            self.home_feed = feed
+        return self.home_feed
+
     @extend_schema(
         parameters=[
             OpenApiParameter("type", OpenApiTypes.STR, description="Filter by offer type"),
@@ -233,12 +268,9 @@ class OfferViewSet(viewsets.ModelViewSet):
         Get upcoming offers (not yet started).
         This endpoint is public (AllowAny).
         """
-        now = datetime.now(settings.CAIRO_TZ)
-
         upcoming_offers = Offer.objects.filter(
-            status=Offer.Status.UPCOMING,
-            start_date__gt=now
-        ).order_by('start_date')
+            status=Offer.Status.UPCOMING
+        ).order_by('start_date', 'pk')
 
         # Apply filters from query params
         offer_type = request.query_params.get('type', None)
@@ -250,8 +282,7 @@ class OfferViewSet(viewsets.ModelViewSet):
             is_featured_bool = is_featured.lower() == 'true'
             upcoming_offers = upcoming_offers.filter(is_featured=is_featured_bool)
 
-        serializer = self.get_serializer(upcoming_offers, many=True)
-        return Response(serializer.data)
+        return self.list_response(upcoming_offers)
 
     @extend_schema(
         parameters=[
@@ -263,37 +294,63 @@ class OfferViewSet(viewsets.ModelViewSet):
         """
         Get expired offers (admin only).
         """
-        now = datetime.now(settings.CAIRO_TZ)
-
         expired_offers = Offer.objects.filter(
-            Q(status=Offer.Status.EXPIRED) |
-            Q(end_date__lt=now)
-        ).order_by('-end_date')
+            status=Offer.Status.EXPIRED
+        ).order_by('-end_date', '-pk')
 
         # Apply filters from query params
         offer_type = request.query_params.get('type', None)
         if offer_type:
             expired_offers = expired_offers.filter(offer_type=offer_type)
 
-        serializer = self.get_serializer(expired_offers, many=True)
+        return self.list_response(expired_offers)
+
+    def list_response(self, offers):
+        """
+        A page of `offers` (page-number or `?pagination=cursor`), through the compiled
+        reader when the serializer allows
+        """
+        reader = self.get_reader()
+        if reader is not None:
+            return self.fast_response(reader, offers)
+
+        offers = self.optimize_queryset(offers)
+        page = self.paginate_queryset(offers)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(offers, many=True)
         return Response(serializer.data)
 
+    @extend_schema(request=OfferTrackSerializer, responses={202: None})
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny], throttle_scope='track')
+    def track(self, request):
+        """
+        Record offer impressions and clicks, e.g. {"impressions": [1, 2, 2], "clicks": [2]}.
+        Counts are buffered in memory and written in batches (see offers.engagement).
+        This endpoint is public (AllowAny).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        engagement_buffer.record(**serializer.validated_data)
+        return Response(status=status.HTTP_202_ACCEPTED)
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def activate(self, request, pk=None):
         """
-        Activate an offer (admin only).
+        Activate an offer (admin only), with the same checks as the bulk activate operation.
+        A draft that has not started yet becomes UPCOMING and is activated by the offer scheduler.
         """
         offer = self.get_object()
 
-        if offer.status == Offer.Status.ACTIVE:
+        _, failed = OPERATIONS['activate'].run(Offer.objects.all(), ids=[offer.pk])
+        if failed:
             return Response(
-                {"error": "Offer is already active"},
+                {"error": failed[offer.pk]},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        offer.status = Offer.Status.ACTIVE
-        offer.save()
-
+        offer.refresh_from_db()
         serializer = self.get_serializer(offer)
         return Response(serializer.data)
 
@@ -311,7 +368,7 @@ class OfferViewSet(viewsets.ModelViewSet):
             )
 
         offer.status = Offer.Status.EXPIRED
-        offer.save()
+        offer.save(update_fields=['status', 'updated_at'])
 
         serializer = self.get_serializer(offer)
         return Response(serializer.data)
@@ -323,7 +380,7 @@ class OfferViewSet(viewsets.ModelViewSet):
         """
         offer = self.get_object()
         offer.is_featured = not offer.is_featured
-        offer.save()
+        offer.save(update_fields=['is_featured', 'updated_at'])
 
         serializer = self.get_serializer(offer)
         return Response({
@@ -338,10 +395,51 @@ class OfferViewSet(viewsets.ModelViewSet):
         """
         offer = self.get_object()
         offer.is_exclusive = not offer.is_exclusive
-        offer.save()
+        offer.save(update_fields=['is_exclusive', 'updated_at'])
 
         serializer = self.get_serializer(offer)
+        marked = 'marked as exclusive' if offer.is_exclusive else 'marked as non-exclusive'
         return Response({
-            "message": f"Offer {'marked as exclusive' if offer.is_exclusive else 'marked as non-exclusive'} successfully",
+            "message": f"Offer {marked} successfully",
             "offer": serializer.data
         })
+
+    @extend_schema(
+        request=OfferBulkSerializer,
+        responses={200: OpenApiResponse(description="{updated: count, failed: [{id, error}]}")},
+        parameters=[
+            OpenApiParameter(
+                "operation", OpenApiTypes.STR, OpenApiParameter.PATH, enum=list(OPERATIONS),
+                description="Bulk operation to run",
+            )
+        ]
+    )
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser],
+            url_path=r'bulk/(?P<operation>[a-z_]+)')
+    def bulk(self, request, operation=None):
+        """
+        Run a bulk operation (activate, deactivate, feature, unfeature, mark_exclusive,
+        unmark_exclusive) on `ids` or on every offer matching `filter`, as one UPDATE (admin only).
+        Offers the operation does not apply to are left alone and listed under `failed`.
+        """
+        if operation not in OPERATIONS:
+            return Response(
+                {"error": f"Unknown operation, expected one of: {', '.join(OPERATIONS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+        lookups = serializer.validated_data.get('filter', {})
+        if 'type' in lookups:
+            lookups['offer_type'] = lookups.pop('type')
+
+        updated, failed = OPERATIONS[operation].run(
+            Offer.objects.filter(**lookups),
+            ids=list(dict.fromkeys(ids)) if ids else None,
+        )
+        return Response({
+            "updated": updated,
+            "failed": [{"id": pk, "error": error} for pk, error in sorted(failed.items())],
+        })
@@ -1,4 +1,36 @@
 from django.contrib import admin
-from .models import Player
+from .distribution import refresh_distribution
+from .models import GameResult, Player, ScoreDistribution
 
-admin.site.register(Player)
\ No newline at end of file
+admin.site.register(Player)
+
+
+@admin.register(GameResult)
+class GameResultAdmin(admin.ModelAdmin):
+    list_display = ['player', 'score', 'won', 'played_at', 'submitted_by']
+    list_filter = ['won', 'played_at']
+    list_select_related = ['player', 'submitted_by']
+    date_hierarchy = 'played_at'
+
+    # The game log is append-only; entries are written by score submission
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ScoreDistribution)
+class ScoreDistributionAdmin(admin.ModelAdmin):
+    list_display = ['criterion', 'player_count', 'refreshed_at']
+    readonly_fields = ['criterion', 'quantiles', 'player_count', 'refreshed_at']
+    actions = ['refresh']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Refresh selected distributions')
+    def refresh(self, request, queryset):
+        for distribution in queryset:
+            refresh_distribution(distribution.criterion)
+        self.message_user(request, f"Refreshed {queryset.count()} distributions")
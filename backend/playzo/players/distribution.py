@@ -0,0 +1,107 @@
+"""
+Percentile tiers from a cached score distribution.
+
+The distribution (101 quantile cut points per criterion) is computed by streaming
+the criterion index once, stored in `ScoreDistribution` for the admin and kept in
+the cache, so assigning a tier is a bisection over 101 numbers instead of a
+"players above me" query per serialized row.
+
+Requests never recompute it: `manage.py refresh_score_distribution` (or the admin
+action) does, from cron, well within SCORE_DISTRIBUTION_MAX_AGE. Each process
+re-reads the stored row every SCORE_DISTRIBUTION_CHECK_INTERVAL and keeps serving
+it even when stale, with a warning in the log. Before the first refresh every
+player gets the default tier.
+"""
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Player, ScoreDistribution
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "players:score_distribution:{criterion}"
+
+# (top percent, tier) pairs, best tier first
+RANK_TIERS = [
+    (10, "Expert"),
+    (30, "Advanced"),
+    (60, "Intermediate"),
+    (100, "Beginner"),
+]
+
+
+def refresh_distribution(criterion="total_score"):
+    """Recompute and store the quantiles of `criterion` (two queries, constant memory)"""
+    values = Player.objects.order_by(criterion).values_list(criterion, flat=True)
+    player_count = values.count()
+
+    # Row positions of each percentile's cut point, several percentiles may share one
+    wanted = defaultdict(list)
+    for cut in range(101):
+        wanted[round(cut * (player_count - 1) / 100)].append(cut)
+
+    quantiles = [0] * 101 if player_count else []
+    for position, value in enumerate(values.iterator(chunk_size=5000)):
+        for cut in wanted.get(position, ()):
+            quantiles[cut] = value
+
+    distribution, _ = ScoreDistribution.objects.update_or_create(
+        criterion=criterion,
+        defaults={
+            "quantiles": quantiles,
+            "player_count": player_count,
+            "refreshed_at": datetime.now(settings.CAIRO_TZ),
+        },
+    )
+    cache.set(CACHE_KEY.format(criterion=criterion), distribution, timeout=check_interval())
+    return distribution
+
+
+def check_interval():
+    return getattr(settings, "SCORE_DISTRIBUTION_CHECK_INTERVAL", 60)
+
+
+def is_fresh(distribution):
+    max_age = timedelta(seconds=getattr(settings, "SCORE_DISTRIBUTION_MAX_AGE", 60 * 60))
+    return datetime.now(settings.CAIRO_TZ) - distribution.refreshed_at <= max_age
+
+
+def get_distribution(criterion="total_score"):
+    """
+    The stored distribution, cached for SCORE_DISTRIBUTION_CHECK_INTERVAL seconds. Never
+    recomputed here: a stale one is served as is, and before the first refresh an empty
+    one (every player in the default tier).
+    """
+    key = CACHE_KEY.format(criterion=criterion)
+    distribution = cache.get(key)
+    if distribution is not None:
+        return distribution
+
+    distribution = ScoreDistribution.objects.filter(criterion=criterion).first()
+    if distribution is None:
+        logger.info("No %s score distribution yet, run refresh_score_distribution", criterion)
+        distribution = ScoreDistribution(criterion=criterion)
+    elif not is_fresh(distribution):
+        logger.warning("The %s score distribution is stale, run refresh_score_distribution", criterion)
+    cache.set(key, distribution, timeout=check_interval())
+    return distribution
+
+
+def percentile(value, distribution):
+    """Approximate share (0-100) of players whose value is strictly below `value`"""
+    if not distribution.quantiles:
+        return 0
+    return min(bisect_left(distribution.quantiles, value), 100)
+
+
+def tier(value, distribution):
+    top_percent = 100 - percentile(value, distribution)
+    for threshold, name in RANK_TIERS:
+        if top_percent <= threshold:
+            return name
+    return RANK_TIERS[-1][1]
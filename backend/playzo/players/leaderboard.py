@@ -0,0 +1,275 @@
+"""
+Process-local leaderboard index.
+
+Keeps one sorted array per ranking criterion so top-N, rank-of-player and range
+queries are answered with bisection instead of an ORDER BY over the whole
+`Player` table. The index is loaded at startup, updated incrementally by score
+ingestion and `Player` signals, and periodically compared against the database
+with a cheap fingerprint; callers fall back to SQL whenever it is cold or stale.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, Max, Sum
+
+from .models import Player, RANKING_CRITERIA
+
+
+class SortedScoreIndex:
+    """
+    Players sorted by one criterion (descending), ties broken by name then id,
+    matching `PlayerQuerySet.ranked`.
+    """
+
+    def __init__(self):
+        self.keys = []  # sorted (-value, name, pk)
+        self.values = []  # sorted distinct -value, for dense ranks
+        self.value_counts = {}
+        self.key_by_player = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, pk, value, name):
+        self.remove(pk)
+        key = (-value, name, pk)
+        insort(self.keys, key)
+        self.key_by_player[pk] = key
+        if key[0] not in self.value_counts:
+            insort(self.values, key[0])
+        self.value_counts[key[0]] = self.value_counts.get(key[0], 0) + 1
+
+    def remove(self, pk):
+        key = self.key_by_player.pop(pk, None)
+        if key is None:
+            return
+        del self.keys[bisect_left(self.keys, key)]
+        self.value_counts[key[0]] -= 1
+        if not self.value_counts[key[0]]:
+            del self.value_counts[key[0]]
+            del self.values[bisect_left(self.values, key[0])]
+
+    def position(self, pk):
+        """1-based row position, or None if the player is not indexed"""
+        key = self.key_by_player.get(pk)
+        if key is None:
+            return None
+        return bisect_left(self.keys, key) + 1
+
+    def rank_of_value(self, value, dense=False):
+        if dense:
+            return bisect_left(self.values, -value) + 1
+        return bisect_left(self.keys, (-value,)) + 1
+
+    def rank(self, pk, dense=False):
+        key = self.key_by_player.get(pk)
+        if key is None:
+            return None
+        return self.rank_of_value(-key[0], dense=dense)
+
+    def count_below(self, pk):
+        """Number of players with a strictly lower value, or None if the player is not indexed"""
+        key = self.key_by_player.get(pk)
+        if key is None:
+            return None
+        return len(self.keys) - bisect_left(self.keys, (key[0],)) - self.value_counts[key[0]]
+
+    def range(self, start, stop, dense=False):
+        """(pk, rank_position) pairs for rows [start, stop) in ranking order"""
+        return [(pk, self.rank_of_value(-negated, dense=dense)) for negated, _, pk in self.keys[start:stop]]
+
+
+class LeaderboardIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.indexes = {}
+        self.rows = {}  # pk -> (name, games_played, updated_at)
+        self.loaded = False
+        self.checked_at = 0.0
+
+    @property
+    def enabled(self):
+        return getattr(settings, "LEADERBOARD_INDEX_ENABLED", True)
+
+    @property
+    def check_interval(self):
+        return getattr(settings, "LEADERBOARD_INDEX_CHECK_INTERVAL", 30)
+
+    def load(self):
+        """(Re)build every criterion index from the database"""
+        indexes = {criterion: SortedScoreIndex() for criterion in RANKING_CRITERIA}
+        rows = {}
+        players = Player.objects.order_by().values_list(
+            "pk", "name", "games_played", "updated_at", *RANKING_CRITERIA
+        )
+        for pk, name, games_played, updated_at, *values in players.iterator(chunk_size=5000):
+            rows[pk] = (name, games_played, updated_at)
+            for criterion, value in zip(RANKING_CRITERIA, values):
+                indexes[criterion].add(pk, value, name)
+
+        with self.lock:
+            self.indexes = indexes
+            self.rows = rows
+            self.loaded = True
+            self.checked_at = time.monotonic()
+
+    def warm(self):
+        """Load at startup; stay cold (SQL fallback) if the database is not ready"""
+        if not self.enabled:
+            return
+        try:
+            self.load()
+        except DatabaseError:
+            self.loaded = False
+
+    def clear(self):
+        with self.lock:
+            self.indexes = {}
+            self.rows = {}
+            self.loaded = False
+            self.checked_at = 0.0
+
+    def fingerprint(self):
+        with self.lock:
+            return (
+                len(self.rows),
+                sum(games_played for _, games_played, _ in self.rows.values()),
+                max((updated_at for _, _, updated_at in self.rows.values()), default=None),
+            )
+
+    def db_fingerprint(self):
+        aggregates = Player.objects.order_by().aggregate(
+            count=Count("pk"), games_played=Sum("games_played"), updated_at=Max("updated_at")
+        )
+        return aggregates["count"], aggregates["games_played"] or 0, aggregates["updated_at"]
+
+    def is_consistent(self):
+        """Compare the in-memory fingerprint with the database (one aggregate query)"""
+        return self.loaded and self.fingerprint() == self.db_fingerprint()
+
+    def is_ready(self):
+        """
+        True when the index can serve queries. At most once per check interval the
+        fingerprint is verified and a cold or stale index reloaded; while another
+        thread is doing that, or if it fails, callers should fall back to SQL.
+        """
+        if not self.enabled:
+            return False
+        if self.loaded and time.monotonic() - self.checked_at < self.check_interval:
+            return True
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.checked_at = time.monotonic()
+            if not self.is_consistent():
+                self.load()
+            return True
+        except DatabaseError:
+            self.loaded = False
+            return False
+        finally:
+            self.lock.release()
+
+    def apply_player(self, player):
+        """Index a created or edited player"""
+        with self.lock:
+            if not self.loaded:
+                return
+            self.rows[player.pk] = (player.name, player.games_played, player.updated_at)
+            for criterion in RANKING_CRITERIA:
+                self.indexes[criterion].add(player.pk, getattr(player, criterion), player.name)
+
+    def touch_player(self, pk, updated_at):
+        """Note a save that changed no indexed column, so the fingerprint stays in step"""
+        with self.lock:
+            if not self.loaded or pk not in self.rows:
+                return
+            name, games_played, indexed_at = self.rows[pk]
+            self.rows[pk] = (name, games_played, max(indexed_at, updated_at))
+
+    def apply_stats(self, pk, stats):
+        """Fold the stats returned by score ingestion into the index"""
+        with self.lock:
+            if not self.loaded:
+                return
+            if pk not in self.rows:
+                # Unknown player: let the next check reconcile with the database
+                self.checked_at = 0.0
+                return
+            name = self.rows[pk][0]
+            self.rows[pk] = (name, stats["games_played"], stats["updated_at"])
+            for criterion in RANKING_CRITERIA:
+                self.indexes[criterion].add(pk, stats[criterion], name)
+
+    def remove_player(self, pk):
+        with self.lock:
+            if not self.loaded:
+                return
+            self.rows.pop(pk, None)
+            for index in self.indexes.values():
+                index.remove(pk)
+
+    def count(self):
+        return len(self.rows)
+
+    def top(self, criterion, limit):
+        with self.lock:
+            return self.indexes[criterion].range(0, limit)
+
+    def range(self, criterion, start, stop, dense=False):
+        with self.lock:
+            return self.indexes[criterion].range(start, stop, dense=dense)
+
+    def position(self, criterion, pk):
+        with self.lock:
+            return self.indexes[criterion].position(pk)
+
+    def rank(self, criterion, pk, dense=False):
+        with self.lock:
+            return self.indexes[criterion].rank(pk, dense=dense)
+
+    def count_below(self, criterion, pk):
+        with self.lock:
+            return self.indexes[criterion].count_below(pk)
+
+
+class IndexedRanking:
+    """
+    Sequence view of a ranking backed by the index, for Django's paginator.
+    Slicing loads just that page of players (one query) with `rank_position` set.
+    """
+
+    def __init__(self, index, criterion, queryset, dense=False):
+        self.index = index
+        self.criterion = criterion
+        self.queryset = queryset
+        self.dense = dense
+
+    def __len__(self):
+        return self.index.count()
+
+    def count(self):
+        return len(self)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(len(self))
+        entries = self.index.range(self.criterion, start, stop, dense=self.dense)
+        players = self.queryset.in_bulk([pk for pk, _ in entries])
+        page = []
+        for pk, rank_position in entries:
+            player = players.get(pk)
+            if player is not None:
+                player.rank_position = rank_position
+                page.append(player)
+        return page
+
+
+leaderboard_index = LeaderboardIndex()
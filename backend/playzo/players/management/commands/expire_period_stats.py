@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from players.models import PlayerPeriodStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete period leaderboard buckets older than the retention window of their period. "
+        "Rows are removed in primary-key chunks so the database is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=35, help="Daily buckets to keep (default: 35)")
+        parser.add_argument("--keep-weeks", type=int, default=26, help="Weekly buckets to keep (default: 26)")
+        parser.add_argument("--keep-months", type=int, default=24, help="Monthly buckets to keep (default: 24)")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows deleted per statement (default: 5000)"
+        )
+
+    def handle(self, *args, **options):
+        today = datetime.now(settings.CAIRO_TZ).date()
+        month_start = today.replace(day=1)
+        for _ in range(options["keep_months"] - 1):
+            month_start = (month_start - timedelta(days=1)).replace(day=1)
+
+        cutoffs = {
+            PlayerPeriodStats.Period.DAY: today - timedelta(days=options["keep_days"] - 1),
+            PlayerPeriodStats.Period.WEEK: PlayerPeriodStats.period_start_for(
+                PlayerPeriodStats.Period.WEEK, today - timedelta(weeks=options["keep_weeks"] - 1)
+            ),
+            PlayerPeriodStats.Period.MONTH: month_start,
+        }
+
+        for period, cutoff in cutoffs.items():
+            expired = PlayerPeriodStats.objects.filter(period=period, period_start__lt=cutoff)
+            deleted = 0
+            while True:
+                ids = list(expired.order_by().values_list("pk", flat=True)[:options["batch_size"]])
+                if not ids:
+                    break
+                deleted += PlayerPeriodStats.objects.filter(pk__in=ids).delete()[0]
+
+            self.stdout.write(f"{period}: deleted {deleted} buckets before {cutoff}")
+
+        self.stdout.write(self.style.SUCCESS("Expired old period buckets"))
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, FloatField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast
+
+from players.models import GameResult, Player
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every player's aggregate score columns from the GameResult log. "
+        "Players are processed in keyset-paginated chunks, each aggregated by the database "
+        "and written back in a single transaction, so memory stays bounded regardless of log size. "
+        "Players without logged games are left untouched unless --include-empty is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of players aggregated and updated per transaction (default: 1000)",
+        )
+        parser.add_argument(
+            "--include-empty",
+            action="store_true",
+            help="Reset the stats of players that have no logged games",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        include_empty = options["include_empty"]
+
+        last_game = GameResult.objects.filter(player=OuterRef("player")).order_by("-played_at", "-id")
+        players = Player.objects.order_by("pk")
+        if not include_empty:
+            players = players.filter(Exists(GameResult.objects.filter(player=OuterRef("pk"))))
+
+        now = datetime.now(settings.CAIRO_TZ)
+        last_pk = 0
+        rebuilt = 0
+        while True:
+            player_ids = list(players.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+            if not player_ids:
+                break
+            last_pk = player_ids[-1]
+
+            # Read the log inside the write transaction, so games recorded meanwhile
+            # are not overwritten by a stale aggregate
+            with transaction.atomic():
+                aggregates = {
+                    row["player"]: row
+                    for row in GameResult.objects.filter(player_id__in=player_ids)
+                    .order_by()
+                    .values("player")
+                    .annotate(
+                        total=Sum("score"),
+                        played=Count("id"),
+                        won=Count("id", filter=Q(won=True)),
+                        high=Max("score"),
+                        average=Cast(Sum("score"), FloatField()) / Count("id"),
+                        last_score=Subquery(last_game.values("score")[:1]),
+                        last_date=Max("played_at"),
+                    )
+                }
+
+                batch = []
+                for player_id in player_ids:
+                    row = aggregates.get(player_id)
+                    batch.append(Player(
+                        pk=player_id,
+                        total_score=row["total"] if row else 0,
+                        high_score=row["high"] if row else 0,
+                        games_played=row["played"] if row else 0,
+                        games_won=row["won"] if row else 0,
+                        average_score=row["average"] if row else 0.0,
+                        last_game_score=row["last_score"] if row else None,
+                        last_game_date=row["last_date"] if row else None,
+                        updated_at=now,
+                    ))
+
+                Player.objects.bulk_update(batch, [
+                    "total_score",
+                    "high_score",
+                    "games_played",
+                    "games_won",
+                    "average_score",
+                    "last_game_score",
+                    "last_game_date",
+                    "updated_at",
+                ])
+
+            rebuilt += len(batch)
+            self.stdout.write(f"Rebuilt {rebuilt} players...")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} players"))
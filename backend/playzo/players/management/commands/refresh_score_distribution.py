@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from players.distribution import refresh_distribution
+from players.models import RANKING_CRITERIA
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached score distributions used for player rank tiers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--criterion",
+            choices=RANKING_CRITERIA,
+            action="append",
+            help="Criterion to refresh (repeatable, default: total_score)",
+        )
+
+    def handle(self, *args, **options):
+        for criterion in options["criterion"] or ["total_score"]:
+            distribution = refresh_distribution(criterion)
+            self.stdout.write(f"{criterion}: {distribution.player_count} players")
+
+        self.stdout.write(self.style.SUCCESS("Refreshed score distributions"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 14:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0003_player_average_score_player_games_played_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(verbose_name='Score')),
+                ('won', models.BooleanField(default=False, verbose_name='Won')),
+                ('played_at', models.DateTimeField(verbose_name='Played At')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='game_results', to='players.player', verbose_name='Player')),
+                ('submitted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submitted_game_results', to=settings.AUTH_USER_MODEL, verbose_name='Submitted By')),
+            ],
+            options={
+                'verbose_name': 'Game Result',
+                'verbose_name_plural': 'Game Results',
+                'ordering': ['-played_at', '-id'],
+                'indexes': [models.Index(fields=['player', 'played_at', 'id'], name='gameresult_player_played_idx')],
+            },
+        ),
+    ]
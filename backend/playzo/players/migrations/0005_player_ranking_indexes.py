@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 14:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_gameresult'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-total_score', 'name', 'id'], name='player_total_score_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-high_score', 'name', 'id'], name='player_high_score_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-average_score', 'name', 'id'], name='player_average_score_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-games_won', 'name', 'id'], name='player_games_won_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['name', 'id'], name='player_name_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0005_player_ranking_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerPeriodStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5, verbose_name='Period')),
+                ('period_start', models.DateField(verbose_name='Period Start')),
+                ('total_score', models.IntegerField(default=0, verbose_name='Total Score')),
+                ('high_score', models.IntegerField(default=0, verbose_name='High Score')),
+                ('games_played', models.IntegerField(default=0, verbose_name='Games Played')),
+                ('games_won', models.IntegerField(default=0, verbose_name='Games Won')),
+                ('average_score', models.FloatField(default=0.0, verbose_name='Average Score')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_stats', to='players.player', verbose_name='Player')),
+            ],
+            options={
+                'verbose_name': 'Player Period Stats',
+                'verbose_name_plural': 'Player Period Stats',
+                'indexes': [models.Index(fields=['period', 'period_start', '-total_score', 'player'], name='period_total_score_idx'), models.Index(fields=['period', 'period_start', '-high_score', 'player'], name='period_high_score_idx'), models.Index(fields=['period', 'period_start', '-average_score', 'player'], name='period_average_score_idx'), models.Index(fields=['period', 'period_start', '-games_won', 'player'], name='period_games_won_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'player'), name='unique_player_period')],
+            },
+        ),
+    ]
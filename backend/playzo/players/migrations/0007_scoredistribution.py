@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0006_playerperiodstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreDistribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criterion', models.CharField(choices=[('total_score', 'total_score'), ('high_score', 'high_score'), ('average_score', 'average_score'), ('games_won', 'games_won')], max_length=20, unique=True, verbose_name='Criterion')),
+                ('quantiles', models.JSONField(default=list, verbose_name='Quantiles')),
+                ('player_count', models.IntegerField(default=0, verbose_name='Player Count')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Refreshed At')),
+            ],
+            options={
+                'verbose_name': 'Score Distribution',
+                'verbose_name_plural': 'Score Distributions',
+            },
+        ),
+    ]
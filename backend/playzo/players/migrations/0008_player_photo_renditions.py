@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0007_scoredistribution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the photo, built in the background', verbose_name='Photo Renditions'),
+        ),
+    ]
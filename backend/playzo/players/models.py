@@ -1,8 +1,153 @@
-from django.db import models
+from datetime import datetime, timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import Case, F, FloatField, Func, OuterRef, Q, Subquery, Value, When, Window, sql
+from django.db.models.functions import Cast, DenseRank, Rank
+from django.dispatch import Signal
 from django.utils.translation import gettext_lazy as _
 from users.models import User
 from django.conf import settings
 
+# Columns players can be ranked by (always descending, ties broken by name)
+RANKING_CRITERIA = ["total_score", "high_score", "average_score", "games_won"]
+
+# Aggregate columns returned by the single-statement score updates
+SCORE_STAT_FIELDS = ["total_score", "high_score", "games_played", "games_won", "average_score"]
+
+# Sent once a score update has been committed, with `player_id` and the new `stats`
+player_stats_changed = Signal()
+
+
+class PlayerQuerySet(models.QuerySet):
+    def ranked(self, criterion, dense=False):
+        """
+        Annotate `rank_position` computed by the database with a window function.
+        Tied players share a position; `dense` closes the gaps after ties.
+        """
+        rank_function = DenseRank if dense else Rank
+        return self.annotate(
+            rank_position=Window(rank_function(), order_by=F(criterion).desc())
+        ).order_by(f"-{criterion}", "name", "pk")
+
+    @staticmethod
+    def ranked_before(player, criterion):
+        """Q matching the rows that come before `player` in the `ranked(criterion)` ordering"""
+        value = getattr(player, criterion)
+        return (
+                Q(**{f"{criterion}__gt": value})
+                | Q(**{criterion: value, "name__lt": player.name})
+                | Q(**{criterion: value, "name": player.name, "pk__lt": player.pk})
+        )
+
+    @staticmethod
+    def ranked_after(player, criterion):
+        """Q matching the rows that come after `player` in the `ranked(criterion)` ordering"""
+        value = getattr(player, criterion)
+        return (
+                Q(**{f"{criterion}__lt": value})
+                | Q(**{criterion: value, "name__gt": player.name})
+                | Q(**{criterion: value, "name": player.name, "pk__gt": player.pk})
+        )
+
+    def ranking_position(self, player, criterion):
+        """1-based row position of `player` in the `ranked(criterion)` ordering"""
+        return self.filter(self.ranked_before(player, criterion)).count() + 1
+
+    def with_rank_position(self, criterion):
+        """
+        Annotate each row's RANK() by `criterion` as an indexed count of players above it,
+        for small keyset-fetched slices where a window over the whole table is wasteful.
+        """
+        players_above = (
+            Player.objects.filter(**{f"{criterion}__gt": OuterRef(criterion)})
+            .order_by()
+            .annotate(count=Func(F("pk"), function="COUNT"))
+            .values("count")
+        )
+        return self.annotate(rank_position=Subquery(players_above) + 1)
+
+    def neighbours(self, player, criterion, window):
+        """The `window` players directly above and below `player` in the ranking, nearest last/first"""
+        above = (
+            self.filter(self.ranked_before(player, criterion))
+            .with_rank_position(criterion)
+            .order_by(criterion, "-name", "-pk")[:window]
+        )
+        below = (
+            self.filter(self.ranked_after(player, criterion))
+            .with_rank_position(criterion)
+            .order_by(f"-{criterion}", "name", "pk")[:window]
+        )
+        return list(reversed(above)), list(below)
+
+    def update_returning(self, values, returning):
+        """
+        Run `update(**values)` as a single UPDATE ... RETURNING statement and return
+        the `returning` columns of the first updated row as a dict (None if no row matched).
+        """
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values(values)
+        update_sql, params = query.get_compiler(self.db).as_sql()
+
+        connection = connections[self.db]
+        fields = [self.model._meta.get_field(name) for name in returning]
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{update_sql} RETURNING {columns}", params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        # SQLite hands back integral REAL values as ints; normalise through the fields
+        return {field.name: field.to_python(value) for field, value in zip(fields, row)}
+
+    def record_games(self, scores, wins=0):
+        """
+        Fold several finished games (in play order) into the matched player's aggregates
+        in one atomic UPDATE. Every column is computed from the row's current values, so
+        concurrent submissions never overwrite each other. Returns the new stats, or None
+        if no player matched.
+
+        This does not write the game log; use `Player.ingest_games` for submissions.
+        """
+        now = datetime.now(settings.CAIRO_TZ)
+        best = max(scores)
+        values = {
+            "total_score": F("total_score") + sum(scores),
+            "games_played": F("games_played") + len(scores),
+            "high_score": Case(
+                When(high_score__lt=best, then=Value(best)),
+                default=F("high_score"),
+            ),
+            "average_score": (
+                    Cast(F("total_score") + sum(scores), FloatField()) / (F("games_played") + len(scores))
+            ),
+            "last_game_score": scores[-1],
+            "last_game_date": now,
+            "updated_at": now,
+        }
+        if wins:
+            values["games_won"] = F("games_won") + wins
+
+        stats = self.update_returning(values, SCORE_STAT_FIELDS)
+        if stats is not None:
+            stats.update(last_game_score=scores[-1], last_game_date=now, updated_at=now)
+        return stats
+
+    def increment_games_won(self):
+        """
+        Increment games won in one atomic UPDATE and return the new stats.
+
+        This does not write the game log; use `Player.increment_games_won`.
+        """
+        now = datetime.now(settings.CAIRO_TZ)
+        stats = self.update_returning(
+            {"games_won": F("games_won") + 1, "updated_at": now}, SCORE_STAT_FIELDS
+        )
+        if stats is not None:
+            stats["updated_at"] = now
+        return stats
+
 
 class Player(models.Model):
     class Gender(models.TextChoices):
@@ -23,6 +168,13 @@ class Player(models.Model):
         blank=True,
         verbose_name=_("Photo"),
     )
+    photo_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Photo Renditions"),
+        help_text=_("Resized copies of the photo, built in the background"),
+    )
 
     # Score-related fields
     total_score = models.IntegerField(default=0, verbose_name=_("Total Score"))
@@ -37,27 +189,242 @@ class Player(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = PlayerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Match the (criterion DESC, name, id) orderings used by rankings and keyset pages
+            models.Index(fields=["-total_score", "name", "id"], name="player_total_score_rank_idx"),
+            models.Index(fields=["-high_score", "name", "id"], name="player_high_score_rank_idx"),
+            models.Index(fields=["-average_score", "name", "id"], name="player_average_score_rank_idx"),
+            models.Index(fields=["-games_won", "name", "id"], name="player_games_won_rank_idx"),
+            models.Index(fields=["name", "id"], name="player_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
+    def _apply_stats(self, stats):
+        for field, value in (stats or {}).items():
+            setattr(self, field, value)
+        return stats
+
+    @classmethod
+    def ingest_games(cls, player_id, games, submitted_by=None):
+        """
+        Append `games` ((score, won) pairs in play order) to the game log and fold them
+        into the player's aggregate columns in the same transaction.
+        Returns the new stats, or None if the player does not exist.
+        """
+        with transaction.atomic(savepoint=False):
+            stats = cls.objects.filter(pk=player_id).record_games(
+                [score for score, _ in games],
+                wins=sum(1 for _, won in games if won),
+            )
+            if stats is None:
+                return None
+            PlayerPeriodStats.objects.record_games(
+                player_id, [score for score, _ in games], wins=sum(1 for _, won in games if won),
+                played_at=stats["last_game_date"],
+            )
+            GameResult.objects.bulk_create([
+                GameResult(
+                    player_id=player_id,
+                    score=score,
+                    won=won,
+                    played_at=stats["last_game_date"],
+                    submitted_by=submitted_by,
+                )
+                for score, won in games
+            ])
+            transaction.on_commit(lambda: player_stats_changed.send(
+                sender=cls, player_id=player_id, stats=stats
+            ))
+        return stats
+
+    def record_game(self, score, won=False, submitted_by=None):
+        """Record a finished game and refresh this instance's stats in place"""
+        return self._apply_stats(Player.ingest_games(self.pk, [(score, won)], submitted_by))
+
     def update_score_stats(self, score):
         """Update all score-related statistics when a player finishes a game"""
-        from datetime import datetime
+        return self.record_game(score)
+
+    def increment_games_won(self):
+        """
+        Mark this player's latest logged game that is not a win as won, in the log, the
+        aggregate columns and the period buckets alike, so a rebuild from the log keeps it.
+        Players whose totals predate the game log get the aggregate bumped instead, while it
+        has games that are not wins. Returns the new stats, or None if there is nothing to mark.
+        """
+        with transaction.atomic(savepoint=False):
+            while True:
+                game = self.game_results.filter(won=False).order_by("-played_at", "-id").first()
+                if game is None:
+                    # Every logged game is a win, so any game left to mark is from before the log
+                    stats = Player.objects.filter(pk=self.pk, games_won__lt=F("games_played")).increment_games_won()
+                    break
+                # Another request may have claimed the same game in between
+                if GameResult.objects.filter(pk=game.pk, won=False).update(won=True):
+                    stats = Player.objects.filter(pk=self.pk).increment_games_won()
+                    PlayerPeriodStats.objects.record_win(self.pk, game.played_at)
+                    break
+            if stats is None:
+                return None
+            transaction.on_commit(lambda: player_stats_changed.send(
+                sender=Player, player_id=self.pk, stats=stats
+            ))
+        return self._apply_stats(stats)
+
+
+class GameResult(models.Model):
+    """Append-only log of finished games; the source of truth for a player's aggregates"""
+    player = models.ForeignKey(
+        Player, on_delete=models.CASCADE, related_name="game_results", verbose_name=_("Player")
+    )
+    score = models.IntegerField(verbose_name=_("Score"))
+    won = models.BooleanField(default=False, verbose_name=_("Won"))
+    played_at = models.DateTimeField(verbose_name=_("Played At"))
+    submitted_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="submitted_game_results",
+        verbose_name=_("Submitted By"),
+    )
 
-        self.last_game_score = score
-        self.last_game_date = datetime.now(settings.CAIRO_TZ)
-        self.total_score += score
-        self.games_played += 1
+    class Meta:
+        ordering = ["-played_at", "-id"]
+        indexes = [
+            models.Index(fields=["player", "played_at", "id"], name="gameresult_player_played_idx"),
+        ]
+        verbose_name = _("Game Result")
+        verbose_name_plural = _("Game Results")
 
-        if score > self.high_score:
-            self.high_score = score
+    def __str__(self):
+        return f"{self.player_id}: {self.score}"
 
-        # Calculate average score
-        self.average_score = self.total_score / self.games_played
 
-        self.save()
+class PlayerPeriodStatsManager(models.Manager):
+    def record_games(self, player_id, scores, wins, played_at):
+        """
+        Fold games into the player's day, week and month buckets with one
+        INSERT ... ON CONFLICT DO UPDATE, so buckets are created or incremented atomically.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        day = PlayerPeriodStats.local_day(played_at)
 
-    def increment_games_won(self):
-        """Increment games won count"""
-        self.games_won += 1
-        self.save()
+        rows = []
+        params = []
+        for period in PlayerPeriodStats.Period.values:
+            rows.append("(%s, %s, %s, %s, %s, %s, %s, %s)")
+            params += [
+                player_id,
+                period,
+                connection.ops.adapt_datefield_value(PlayerPeriodStats.period_start_for(period, day)),
+                sum(scores),
+                max(scores),
+                len(scores),
+                wins,
+                sum(scores) / len(scores),
+            ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (player_id, period, period_start, total_score, high_score, "
+                f"games_played, games_won, average_score) VALUES {', '.join(rows)} "
+                f"ON CONFLICT (period, period_start, player_id) DO UPDATE SET "
+                f"total_score = {table}.total_score + excluded.total_score, "
+                f"high_score = CASE WHEN excluded.high_score > {table}.high_score "
+                f"THEN excluded.high_score ELSE {table}.high_score END, "
+                f"games_played = {table}.games_played + excluded.games_played, "
+                f"games_won = {table}.games_won + excluded.games_won, "
+                f"average_score = CAST({table}.total_score + excluded.total_score AS REAL) "
+                f"/ ({table}.games_played + excluded.games_played)",
+                params,
+            )
+
+    def record_win(self, player_id, played_at):
+        """Count a win in the player's buckets containing `played_at`"""
+        day = PlayerPeriodStats.local_day(played_at)
+        buckets = Q()
+        for period in PlayerPeriodStats.Period.values:
+            buckets |= Q(period=period, period_start=PlayerPeriodStats.period_start_for(period, day))
+        self.filter(buckets, player_id=player_id).update(games_won=F("games_won") + 1)
+
+
+class PlayerPeriodStats(models.Model):
+    """Per-player score aggregates for one day, week (starting Monday) or month"""
+
+    class Period(models.TextChoices):
+        DAY = "day", _("Day")
+        WEEK = "week", _("Week")
+        MONTH = "month", _("Month")
+
+    player = models.ForeignKey(
+        Player, on_delete=models.CASCADE, related_name="period_stats", verbose_name=_("Player")
+    )
+    period = models.CharField(max_length=5, choices=Period.choices, verbose_name=_("Period"))
+    period_start = models.DateField(verbose_name=_("Period Start"))
+
+    total_score = models.IntegerField(default=0, verbose_name=_("Total Score"))
+    high_score = models.IntegerField(default=0, verbose_name=_("High Score"))
+    games_played = models.IntegerField(default=0, verbose_name=_("Games Played"))
+    games_won = models.IntegerField(default=0, verbose_name=_("Games Won"))
+    average_score = models.FloatField(default=0.0, verbose_name=_("Average Score"))
+
+    objects = PlayerPeriodStatsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period", "period_start", "player"], name="unique_player_period"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "period_start", "-total_score", "player"], name="period_total_score_idx"),
+            models.Index(fields=["period", "period_start", "-high_score", "player"], name="period_high_score_idx"),
+            models.Index(fields=["period", "period_start", "-average_score", "player"], name="period_average_score_idx"),
+            models.Index(fields=["period", "period_start", "-games_won", "player"], name="period_games_won_idx"),
+        ]
+        verbose_name = _("Player Period Stats")
+        verbose_name_plural = _("Player Period Stats")
+
+    def __str__(self):
+        return f"{self.player_id} {self.period} {self.period_start}"
+
+    @staticmethod
+    def local_day(moment):
+        """The Cairo day of `moment`, which buckets follow whatever time zone it comes in"""
+        return moment.astimezone(settings.CAIRO_TZ).date()
+
+    @classmethod
+    def period_start_for(cls, period, day):
+        """First day of the `period` bucket containing `day`"""
+        if period == cls.Period.WEEK:
+            return day - timedelta(days=day.weekday())
+        if period == cls.Period.MONTH:
+            return day.replace(day=1)
+        return day
+
+
+class ScoreDistribution(models.Model):
+    """Cached quantiles of a ranking criterion across all players, used for percentile tiers"""
+    criterion = models.CharField(
+        max_length=20,
+        unique=True,
+        choices=[(criterion, criterion) for criterion in RANKING_CRITERIA],
+        verbose_name=_("Criterion"),
+    )
+    # 101 ascending cut points: quantiles[p] is the value at the p-th percentile
+    quantiles = models.JSONField(default=list, verbose_name=_("Quantiles"))
+    player_count = models.IntegerField(default=0, verbose_name=_("Player Count"))
+    refreshed_at = models.DateTimeField(verbose_name=_("Refreshed At"))
+
+    class Meta:
+        verbose_name = _("Score Distribution")
+        verbose_name_plural = _("Score Distributions")
+
+    def __str__(self):
+        return self.criterion
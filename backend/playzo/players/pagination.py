@@ -0,0 +1,47 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param
+
+from playzo.rest_framework_utils.custom_pagination import CustomPageNumberPagination
+
+
+class RankingPagination(CustomPageNumberPagination):
+    """
+    Pagination for ranked player lists.
+
+    Rank positions come from a window over the whole table (or the leaderboard index),
+    so cursor tokens here carry a row offset rather than keyset values.
+    `jump_to(position)` makes the response start at the page holding that row.
+    """
+    jump_query_param = 'player'
+
+    position = None
+
+    def jump_to(self, position):
+        self.position = position
+
+    def paginate_cursor(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if self.position is not None:
+            offset = (self.position - 1) // page_size * page_size
+        else:
+            offset = self.decode_cursor(request).get('o', 0)
+            if not isinstance(offset, int) or offset < 0:
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.next_cursor = {'o': offset + page_size} if len(rows) > page_size else None
+        self.previous_cursor = {'o': max(offset - page_size, 0)} if offset > 0 else None
+        return rows[:page_size]
+
+    def get_page_number(self, request, paginator):
+        if self.position is not None:
+            return (self.position - 1) // paginator.per_page + 1
+        return super().get_page_number(request, paginator)
+
+    def get_next_link(self):
+        link = super().get_next_link()
+        return link and remove_query_param(link, self.jump_query_param)
+
+    def get_previous_link(self):
+        link = super().get_previous_link()
+        return link and remove_query_param(link, self.jump_query_param)
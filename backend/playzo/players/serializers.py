@@ -1,16 +1,21 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Player
+from playzo.renditions import rendition_urls
+from playzo.rest_framework_utils.sparse_fields import SparseFieldsetSerializerMixin
+from .distribution import get_distribution, tier
+from .models import Player, PlayerPeriodStats
 from users.serializers import UserSerializer
 from users.models import User
 from django.db import transaction
 
 
-class PlayerReadSerializer(serializers.ModelSerializer):
+class PlayerReadSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     # Add these fields to show score statistics
     win_rate = serializers.SerializerMethodField()
     rank = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Player
@@ -22,6 +27,7 @@ class PlayerReadSerializer(serializers.ModelSerializer):
             "gender",
             "phone",
             "photo",
+            "photo_renditions",
             "total_score",
             "high_score",
             "games_played",
@@ -45,6 +51,23 @@ class PlayerReadSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
+        # `?compact=true`: just what a leaderboard row needs, no user join
+        compact_fields = [
+            "id",
+            "name",
+            "photo",
+            "photo_renditions",
+            "total_score",
+            "high_score",
+            "games_won",
+            "average_score",
+            "rank",
+        ]
+        sparse_field_sources = {
+            "win_rate": ["games_played", "games_won"],
+            "rank": ["total_score"],
+            "photo_renditions": ["photo_renditions"],
+        }
 
     def get_win_rate(self, obj):
         """Calculate win rate percentage"""
@@ -53,16 +76,77 @@ class PlayerReadSerializer(serializers.ModelSerializer):
         return 0.0
 
     def get_rank(self, obj):
-        """Calculate player rank (you can implement your own ranking logic)"""
-        # This is a simple implementation - you might want to query against all players
-        if obj.total_score > 1000:
-            return "Expert"
-        elif obj.total_score > 500:
-            return "Advanced"
-        elif obj.total_score > 100:
-            return "Intermediate"
-        else:
-            return "Beginner"
+        """Percentile tier of the player's total score, from the cached score distribution"""
+        # The child serializer is shared by every row of a list, so the lookup happens once per response
+        if not hasattr(self, "_score_distribution"):
+            self._score_distribution = get_distribution("total_score")
+        return tier(obj.total_score, self._score_distribution)
+
+    def get_photo_renditions(self, obj):
+        """{"thumbnail"|"card"|"full": {"webp": url, "jpeg": url}}, null until built"""
+        return rendition_urls(obj.photo_renditions, self.context.get("request"))
+
+    # Compiled read path (playzo.rest_framework_utils.fast_read): same values from `values()` rows
+
+    def fast_win_rate(self, row, context):
+        if row["games_played"] > 0:
+            return round((row["games_won"] / row["games_played"]) * 100, 2)
+        return 0.0
+
+    def fast_rank(self, row, context):
+        if not hasattr(self, "_score_distribution"):
+            self._score_distribution = get_distribution("total_score")
+        return tier(row["total_score"], self._score_distribution)
+
+    def fast_photo_renditions(self, row, context):
+        return rendition_urls(
+            row["photo_renditions"], context.request,
+            media_url=lambda path: context.media_url(path, default_storage),
+        )
+
+
+class PlayerRankingSerializer(PlayerReadSerializer):
+    rank_position = serializers.IntegerField(read_only=True)
+
+    class Meta(PlayerReadSerializer.Meta):
+        fields = PlayerReadSerializer.Meta.fields + ["rank_position"]
+        compact_fields = PlayerReadSerializer.Meta.compact_fields + ["rank_position"]
+        sparse_field_sources = {**PlayerReadSerializer.Meta.sparse_field_sources, "rank_position": []}
+
+
+class PlayerPeriodStatsSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    player = PlayerReadSerializer(read_only=True)
+
+    class Meta:
+        model = PlayerPeriodStats
+        fields = [
+            "player",
+            "period",
+            "period_start",
+            "total_score",
+            "high_score",
+            "games_played",
+            "games_won",
+            "average_score",
+        ]
+        compact_fields = [
+            "player.id",
+            "player.name",
+            "player.photo",
+            "player.photo_renditions",
+            "total_score",
+            "high_score",
+            "games_played",
+            "games_won",
+            "average_score",
+        ]
+
+
+class ScoreEntrySerializer(serializers.Serializer):
+    """One game result in a batch score submission"""
+    player = serializers.IntegerField()
+    score = serializers.IntegerField(min_value=0)
+    won = serializers.BooleanField(default=False)
 
 
 class PlayerWriteSerializer(serializers.ModelSerializer):
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from playzo import renditions
+from users import directory
+
+from .leaderboard import leaderboard_index
+from .models import RANKING_CRITERIA, Player, player_stats_changed
+
+# Player columns the leaderboard index keeps
+INDEXED_FIELDS = {"name", "games_played", *RANKING_CRITERIA}
+
+
+@receiver(post_save, sender=Player)
+def index_saved_player(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        # E.g. photo renditions saved from a background thread, whose instance may hold
+        # score columns older than the index
+        if "updated_at" in update_fields:
+            pk, updated_at = instance.pk, instance.updated_at
+            transaction.on_commit(lambda: leaderboard_index.touch_player(pk, updated_at))
+        return
+    transaction.on_commit(lambda: leaderboard_index.apply_player(instance))
+
+
+@receiver(post_save, sender=Player)
+def build_player_photo_renditions(sender, instance, **kwargs):
+    renditions.schedule(instance, "photo", "photo_renditions")
+
+
+@receiver(post_delete, sender=Player)
+def unindex_deleted_player(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: leaderboard_index.remove_player(pk))
+
+
+@receiver(post_save, sender=Player)
+def index_saved_player_in_directory(sender, instance, update_fields=None, **kwargs):
+    if not directory.is_available():
+        return
+    if update_fields is not None and not {"user", "name", "phone", "email"} & set(update_fields):
+        return
+    directory.index_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Player)
+def unindex_deleted_player_from_directory(sender, instance, **kwargs):
+    # The user keeps a row of their own, unless this delete cascades from the user
+    if directory.is_available():
+        directory.index_user(instance.user_id)
+
+
+@receiver(player_stats_changed)
+def index_player_stats(sender, player_id, stats, **kwargs):
+    leaderboard_index.apply_stats(player_id, stats)
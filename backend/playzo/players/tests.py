@@ -1,3 +1,494 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+from . import distribution, views
+from .leaderboard import leaderboard_index
+from .models import GameResult, Player, PlayerPeriodStats, ScoreDistribution
+
+
+def create_player(name, **extra):
+    user = User.objects.create(username=name)
+    return Player.objects.create(
+        user=user, name=name, gender=Player.Gender.MALE,
+        email=f"{name}@playzo.test", phone=f"010{user.pk:08d}", **extra
+    )
+
+
+class RecordGameTests(TestCase):
+    def test_record_game_updates_stats_in_one_query(self):
+        player = create_player("ahmed", total_score=10, high_score=10, games_played=1, average_score=10.0)
+
+        with self.assertNumQueries(3):
+            stats = player.record_game(30, won=True)
+
+        self.assertEqual(stats["total_score"], 40)
+        self.assertEqual(stats["high_score"], 30)
+        self.assertEqual(stats["games_played"], 2)
+        self.assertEqual(stats["games_won"], 1)
+        self.assertIsInstance(stats["average_score"], float)
+        self.assertEqual(stats["average_score"], 20.0)
+        self.assertEqual(player.total_score, 40)
+        self.assertEqual(player.last_game_score, 30)
+
+        player.refresh_from_db()
+        self.assertEqual(player.total_score, 40)
+        self.assertEqual(player.average_score, 20.0)
+        self.assertEqual(list(player.game_results.values_list("score", "won")), [(30, True)])
+        self.assertEqual(
+            sorted(player.period_stats.values_list("period", "total_score", "games_won")),
+            [("day", 30, 1), ("month", 30, 1), ("week", 30, 1)],
+        )
+
+    def test_lower_score_keeps_high_score(self):
+        player = create_player("mona", total_score=50, high_score=50, games_played=1, average_score=50.0)
+        player.record_game(5)
+        self.assertEqual(player.high_score, 50)
+        self.assertEqual(player.games_won, 0)
+        self.assertEqual(player.average_score, 27.5)
+
+    def test_rebuild_preserves_recorded_wins(self):
+        player = create_player("salma")
+        player.record_game(10)
+        player.record_game(20, won=True)
+        player.record_game(30)
+        self.assertIsNotNone(player.increment_games_won())
+        self.assertEqual(player.games_won, 2)
+        self.assertEqual(list(player.game_results.values_list("score", "won")), [(30, True), (20, True), (10, False)])
+        self.assertEqual(set(player.period_stats.values_list("games_won", flat=True)), {2})
+
+        fields = ["total_score", "high_score", "games_played", "games_won", "average_score", "last_game_score"]
+        before = Player.objects.filter(pk=player.pk).values(*fields).get()
+        call_command("rebuild_player_stats", stdout=StringIO())
+        self.assertEqual(Player.objects.filter(pk=player.pk).values(*fields).get(), before)
+
+    def test_win_needs_a_game_to_mark(self):
+        player = create_player("omar")
+        self.assertIsNone(player.increment_games_won())
+        client = APIClient()
+        client.force_authenticate(player.user)
+        response = client.post(f"/api/players/players/{player.pk}/increment_wins/")
+        self.assertEqual(response.status_code, 400)
+        player.refresh_from_db()
+        self.assertEqual(player.games_won, 0)
+
+    def test_totals_from_before_the_log_still_take_wins(self):
+        player = create_player("zeina", total_score=50, games_played=2, games_won=1)
+        player.record_game(10, won=True)
+        client = APIClient()
+        client.force_authenticate(player.user)
+        url = f"/api/players/players/{player.pk}/increment_wins/"
+        response = client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["games_won"], 3)
+        # Now every game, logged or not, is a win
+        self.assertEqual(client.post(url).status_code, 400)
+        player.refresh_from_db()
+        self.assertEqual((player.games_played, player.games_won), (3, 3))
+
+
+class ScoreBatchTests(TestCase):
+    url = "/api/players/players/add_scores/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = create_player("nour")
+        cls.other = create_player("karim")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.player.user)
+
+    def submit(self, entries):
+        return self.client.post(self.url, entries, format="json")
+
+    def test_each_entry_gets_its_own_status(self):
+        response = self.submit([
+            {"player": self.player.pk, "score": 10, "won": True},
+            {"player": self.player.pk, "score": -5},
+            {"player": 999999, "score": 10},
+            {"player": self.other.pk, "score": 10},
+            {"player": self.player.pk, "score": 20},
+            "not an entry",
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["applied"], 2)
+        self.assertEqual([(result["player"], result["status"]) for result in data["results"]], [
+            (self.player.pk, 200), (self.player.pk, 400), (999999, 404), (self.other.pk, 403), (self.player.pk, 200),
+            (None, 400),
+        ])
+        self.assertIn("score", data["results"][1]["errors"])
+        self.assertEqual(data["results"][4]["stats"]["games_played"], 2)
+
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.games_played, self.player.games_won), (30, 2, 1))
+        self.assertEqual(self.player.game_results.count(), 2)
+        self.assertFalse(self.other.game_results.exists())
+
+    def test_batch_size_is_limited(self):
+        for entries in [[], {"player": self.player.pk, "score": 1}]:
+            with self.subTest(entries=entries):
+                self.assertEqual(self.submit(entries).status_code, 400)
+
+        entries = [{"player": self.player.pk, "score": 1}] * views.MAX_SCORE_BATCH
+        self.assertEqual(self.submit(entries + entries[:1]).status_code, 400)
+        self.assertFalse(self.player.game_results.exists())
+        response = self.submit(entries)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["applied"], views.MAX_SCORE_BATCH)
+        self.assertEqual({result["status"] for result in response.json()["results"]}, {200})
+
+
+class ConcurrentRecordGameTests(TransactionTestCase):
+    threads = 8
+    games_per_thread = 25
+
+    def test_concurrent_submissions_lose_no_updates(self):
+        player = create_player("stress")
+        errors = []
+
+        def submit():
+            try:
+                for _ in range(self.games_per_thread):
+                    while True:
+                        try:
+                            Player.ingest_games(player.pk, [(3, True)])
+                            break
+                        except OperationalError:
+                            # SQLite refuses concurrent writers; retry until the lock is free
+                            time.sleep(0.001)
+            except Exception as exc:  # pragma: no cover - surfaced below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=submit) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        games = self.threads * self.games_per_thread
+        player.refresh_from_db()
+        self.assertEqual(player.games_played, games)
+        self.assertEqual(player.games_won, games)
+        self.assertEqual(player.total_score, games * 3)
+        self.assertEqual(player.average_score, 3.0)
+        self.assertEqual(GameResult.objects.filter(player=player).count(), games)
+
+
+@override_settings(LEADERBOARD_INDEX_ENABLED=True)
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index, score in enumerate([40, 25, 25, 10, 0]):
+            create_player(f"ranked{index}", total_score=score, high_score=score, games_played=1)
+        cls.user = User.objects.get(username="ranked0")
+
+    def setUp(self):
+        leaderboard_index.clear()
+        self.addCleanup(leaderboard_index.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertIndexMatchesDatabase(self):
+        self.assertTrue(leaderboard_index.is_ready())
+        for criterion in ["total_score", "high_score"]:
+            expected = list(Player.objects.ranked(criterion).values_list("pk", "rank_position"))
+            self.assertEqual(leaderboard_index.range(criterion, 0, len(expected)), expected)
+
+    def test_limit_is_validated(self):
+        for limit in ["-1", "0", "abc", "101"]:
+            with self.subTest(limit=limit):
+                response = self.client.get(f"/api/players/players/leaderboard/?limit={limit}")
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/players/players/leaderboard/?limit=3")
+        self.assertEqual([row["name"] for row in response.json()], ["ranked0", "ranked1", "ranked2"])
+
+    def test_percentile_does_not_count_ties_below(self):
+        user = User.objects.get(username="ranked1")
+        self.client.force_authenticate(user)
+        expected = {"rank_position": 2, "total_players": 5, "percentile": 40.0}
+        for enabled in [False, True]:
+            with self.subTest(index=enabled), override_settings(LEADERBOARD_INDEX_ENABLED=enabled):
+                data = self.client.get("/api/players/players/me/rank/").json()
+                self.assertEqual({key: data[key] for key in expected}, expected)
+
+    def test_index_follows_score_updates(self):
+        leaderboard_index.load()
+        player = Player.objects.get(name="ranked4")
+        with self.captureOnCommitCallbacks(execute=True):
+            player.record_game(30)
+        self.assertIndexMatchesDatabase()
+        self.assertEqual(leaderboard_index.rank("total_score", player.pk), 2)
+
+    def test_index_reloads_after_out_of_band_updates(self):
+        leaderboard_index.load()
+        Player.objects.filter(name="ranked3").update(total_score=100, updated_at=timezone.now())
+        with override_settings(LEADERBOARD_INDEX_CHECK_INTERVAL=0):
+            self.assertIndexMatchesDatabase()
+        indexed = self.client.get("/api/players/players/leaderboard/").json()
+        with override_settings(LEADERBOARD_INDEX_ENABLED=False):
+            self.assertEqual(self.client.get("/api/players/players/leaderboard/").json(), indexed)
+        self.assertEqual(indexed[0]["name"], "ranked3")
+
+
+class PeriodStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = create_player("hana")
+        cls.other = create_player("yara")
+
+    def record(self, player, scores, wins, *moment):
+        PlayerPeriodStats.objects.record_games(
+            player.pk, scores, wins, played_at=datetime(*moment, tzinfo=settings.CAIRO_TZ)
+        )
+
+    def buckets(self, player):
+        return sorted(player.period_stats.values_list(
+            "period", "period_start", "total_score", "high_score", "games_played", "games_won", "average_score"
+        ))
+
+    def test_games_fold_into_their_buckets(self):
+        self.record(self.player, [10, 30], 1, 2026, 3, 4, 12)  # a Wednesday
+        self.record(self.player, [20], 0, 2026, 3, 8, 23, 59)  # Sunday, same week
+        self.assertEqual(self.buckets(self.player), [
+            ("day", date(2026, 3, 4), 40, 30, 2, 1, 20.0),
+            ("day", date(2026, 3, 8), 20, 20, 1, 0, 20.0),
+            ("month", date(2026, 3, 1), 60, 30, 3, 1, 20.0),
+            ("week", date(2026, 3, 2), 60, 30, 3, 1, 20.0),
+        ])
+
+        # Monday opens a new week, April a new month
+        self.record(self.player, [5], 0, 2026, 3, 9, 0, 0)
+        self.record(self.player, [7], 1, 2026, 4, 1)
+        self.assertEqual(
+            [bucket[:2] for bucket in self.buckets(self.player) if bucket[0] != "day"],
+            [("month", date(2026, 3, 1)), ("month", date(2026, 4, 1)),
+             ("week", date(2026, 3, 2)), ("week", date(2026, 3, 9)), ("week", date(2026, 3, 30))],
+        )
+
+    def test_buckets_follow_cairo_midnight(self):
+        # 00:30 in Cairo on Sunday March 1st is still February 28th in UTC
+        played_at = datetime(2026, 2, 28, 22, 30, tzinfo=dt_timezone.utc)
+        PlayerPeriodStats.objects.record_games(self.player.pk, [10], 0, played_at=played_at)
+        PlayerPeriodStats.objects.record_win(self.player.pk, played_at)
+        self.assertEqual([bucket[:2] + bucket[5:6] for bucket in self.buckets(self.player)], [
+            ("day", date(2026, 3, 1), 1), ("month", date(2026, 3, 1), 1), ("week", date(2026, 2, 23), 1),
+        ])
+
+    def test_leaderboard_ranks_one_bucket(self):
+        self.record(self.player, [10], 0, 2026, 3, 4, 12)
+        self.record(self.other, [25], 0, 2026, 3, 5, 12)
+        client = APIClient()
+        client.force_authenticate(self.player.user)
+
+        def names(query):
+            response = client.get(f"/api/players/players/leaderboard/?{query}")
+            self.assertEqual(response.status_code, 200)
+            return [row["player"]["name"] for row in response.json()]
+
+        self.assertEqual(names("period=day&date=2026-03-04"), ["hana"])
+        self.assertEqual(names("period=day&date=2026-03-06"), [])
+        self.assertEqual(names("period=week&date=2026-03-08"), ["yara", "hana"])
+        self.assertEqual(names("period=month&date=2026-03-31&limit=1"), ["yara"])
+        self.assertEqual(names("period=week&date=2026-03-09"), [])
+
+        for query in ["period=year", "period=week&date=03/04/2026", "period=week&limit=0", "period=day&limit=x"]:
+            with self.subTest(query=query):
+                response = client.get(f"/api/players/players/leaderboard/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_expire_deletes_only_old_buckets(self):
+        today = datetime.now(settings.CAIRO_TZ).date()
+        week = PlayerPeriodStats.period_start_for("week", today)
+        month = today.replace(day=1)
+        kept = [("day", today), ("day", today - timedelta(days=1)), ("week", week), ("month", month)]
+        expired = [("day", today - timedelta(days=2)), ("week", week - timedelta(weeks=1)),
+                   ("month", (month - timedelta(days=1)).replace(day=1))]
+        for period, period_start in kept + expired:
+            PlayerPeriodStats.objects.create(player=self.player, period=period, period_start=period_start)
+
+        call_command("expire_period_stats", "--keep-days", "2", "--keep-weeks", "1", "--keep-months", "1",
+                     "--batch-size", "1", stdout=StringIO())
+        self.assertEqual(sorted(self.player.period_stats.values_list("period", "period_start")), sorted(kept))
+
+
+class RankingsTests(TestCase):
+    url = "/api/players/players/rankings/"
+    names = ["ranked0", "ranked1", "ranked2", "ranked3", "ranked4"]
+
+    @classmethod
+    def setUpTestData(cls):
+        for index, score in enumerate([40, 25, 25, 10, 0]):
+            create_player(f"ranked{index}", total_score=score, games_played=1)
+        cls.user = User.objects.get(username="ranked0")
+
+    def setUp(self):
+        cache.clear()
+        leaderboard_index.clear()
+        self.addCleanup(leaderboard_index.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def paths(self):
+        """Runs the enclosed block once per ranking path, SQL first"""
+        for enabled in [False, True]:
+            with self.subTest(index=enabled), override_settings(LEADERBOARD_INDEX_ENABLED=enabled):
+                yield enabled
+
+    def get(self, query=""):
+        response = self.client.get(f"{self.url}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def positions(self, data):
+        return [(row["name"], row["rank_position"]) for row in data["data"]]
+
+    def test_ties_share_a_position(self):
+        expected = {
+            "false": list(zip(self.names, [1, 2, 2, 4, 5])),
+            "true": list(zip(self.names, [1, 2, 2, 3, 4])),
+        }
+        results = {}
+        for enabled in self.paths():
+            for dense, positions in expected.items():
+                results[enabled, dense] = self.positions(self.get(f"dense={dense}"))
+                self.assertEqual(results[enabled, dense], positions)
+        self.assertEqual(results[False, "false"], results[True, "false"])
+        self.assertEqual(results[False, "true"], results[True, "true"])
+
+    def test_player_jumps_to_their_page(self):
+        target = Player.objects.get(name="ranked3")
+        for _ in self.paths():
+            data = self.get(f"player={target.pk}&page_size=2")
+            self.assertEqual(data["page"], 2)
+            self.assertEqual(self.positions(data), [("ranked2", 2), ("ranked3", 4)])
+            self.assertNotIn("player=", data["next"])
+
+            cursor = self.get(f"player={target.pk}&page_size=2&pagination=cursor")
+            self.assertEqual(self.positions(cursor), [("ranked2", 2), ("ranked3", 4)])
+
+            for player in ["999999", "abc"]:
+                response = self.client.get(f"{self.url}?player={player}")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"error": "Player not found"})
+
+    def test_cursor_pages_walk_every_player(self):
+        for _ in self.paths():
+            seen = []
+            url = f"{self.url}?pagination=cursor&page_size=2"
+            while url:
+                data = self.client.get(url).json()
+                self.assertIsNone(data["count"])
+                seen += self.positions(data)
+                url = data["next"]
+            self.assertEqual(seen, list(zip(self.names, [1, 2, 2, 4, 5])))
+
+    def test_query_counts(self):
+        self.get()  # distribution cached, as in any warm process
+        with override_settings(LEADERBOARD_INDEX_ENABLED=False), self.assertNumQueries(2):
+            # COUNT(*) and the ranked page
+            self.get("page_size=3")
+        leaderboard_index.load()
+        with self.assertNumQueries(1):
+            # The page's rows by primary key, count and positions come from the index
+            self.get("page_size=3")
+
+
+class ScoreDistributionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(4):
+            create_player(f"scored{index}", total_score=index * 10)
+
+    def setUp(self):
+        cache.clear()
+
+    def store(self, player_count, age):
+        refreshed_at = datetime.now(settings.CAIRO_TZ) - timedelta(seconds=age)
+        distribution, _ = ScoreDistribution.objects.update_or_create(criterion="total_score", defaults={
+            "quantiles": [0] * 101, "player_count": player_count, "refreshed_at": refreshed_at,
+        })
+        return distribution
+
+    def test_expired_cache_rereads_the_stored_row(self):
+        self.store(0, age=0)
+        self.assertEqual(distribution.get_distribution().player_count, 0)
+        self.store(99, age=0)
+        self.assertEqual(distribution.get_distribution().player_count, 0)
+
+        cache.delete(distribution.CACHE_KEY.format(criterion="total_score"))
+        self.assertEqual(distribution.get_distribution().player_count, 99)
+
+    def test_requests_never_recompute(self):
+        # Before the first refresh everyone is in the default tier
+        with self.assertNumQueries(1), self.assertLogs("players.distribution", "INFO"):
+            empty = distribution.get_distribution()
+        self.assertEqual(distribution.tier(30, empty), "Beginner")
+
+        cache.clear()
+        self.store(0, age=7200)
+        with self.assertNumQueries(1), self.assertLogs("players.distribution", "WARNING"):
+            self.assertEqual(distribution.get_distribution().player_count, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(distribution.get_distribution().player_count, 0)
+
+    def test_refresh_command_stores_quantiles(self):
+        self.store(0, age=7200)
+        call_command("refresh_score_distribution", stdout=StringIO())
+        stored = ScoreDistribution.objects.get(criterion="total_score")
+        self.assertEqual(stored.player_count, 4)
+        self.assertEqual((stored.quantiles[0], stored.quantiles[100]), (0, 30))
+        self.assertEqual(distribution.get_distribution().refreshed_at, stored.refreshed_at)
+
+
+class FastReadTests(TestCase):
+    """The compiled read path renders exactly what PlayerReadSerializer does"""
+    urls = [
+        "/api/players/players/",
+        "/api/players/players/?ordering=total_score&pagination=cursor&page_size=2",
+        "/api/players/players/?fields=id,name,user,rank",
+        "/api/players/players/?compact=true",
+        "/api/users/users/",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(5):
+            player = create_player(
+                f"player{index}", total_score=index * 7, games_played=index, games_won=index // 2,
+                average_score=index * 1.5, photo=f"players/photos/p {index}.jpg" if index % 2 else "",
+            )
+            if index == 3:
+                Player.objects.filter(pk=player.pk).update(photo_renditions={
+                    "source": player.photo.name,
+                    "card": {"webp": "players/photos/renditions/3-card.webp",
+                             "jpeg": "players/photos/renditions/3-card.jpeg"},
+                })
+        cls.user = User.objects.get(username="player0")
+
+    def get(self, url, fast):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with override_settings(FAST_READ_ENABLED=fast):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content
+
+    def test_fast_output_is_byte_identical(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url, fast=True), self.get(url, fast=False))
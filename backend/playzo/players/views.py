@@ -1,16 +1,44 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.conf import settings
+
+from django.db import transaction
+from django.db.models import Count, Sum
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Player
-from .serializers import PlayerReadSerializer, PlayerWriteSerializer
+from authentication.tokens import PLAYER_ID_CLAIM
+from playzo.rest_framework_utils.conditional import conditional_get
+from playzo.rest_framework_utils.fast_read import FastReadViewMixin
+from users import directory
+from .distribution import get_distribution
+from .leaderboard import IndexedRanking, leaderboard_index
+from .models import Player, PlayerPeriodStats, RANKING_CRITERIA
+from .pagination import RankingPagination
+from .serializers import (
+    PlayerPeriodStatsSerializer,
+    PlayerReadSerializer,
+    PlayerRankingSerializer,
+    PlayerWriteSerializer,
+    ScoreEntrySerializer,
+)
+
+# Upper bound on entries accepted by a single add_scores request
+MAX_SCORE_BATCH = 500
 
+# Upper bound on the neighbours returned on each side by my_rank
+MAX_RANK_WINDOW = 50
 
-class PlayerViewSet(viewsets.ModelViewSet):
+
+class PlayerViewSet(FastReadViewMixin, viewsets.ModelViewSet):
     queryset = Player.objects.all()
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return PlayerWriteSerializer
+        if self.action in ["rankings", "my_rank"]:
+            return PlayerRankingSerializer
         return PlayerReadSerializer
 
     def get_permissions(self):
@@ -19,13 +47,25 @@ class PlayerViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticated()]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Joins the nested user, or only the columns a `?fields=` selection renders
+        queryset = self.optimize_queryset(super().get_queryset())
 
         ordering = self.request.query_params.get('ordering', None)
-        if ordering in ['total_score', 'high_score', 'average_score', 'games_won']:
-            queryset = queryset.order_by(f'-{ordering}')
+        # Orderings are unique (name, pk tie-breakers) so `?pagination=cursor` can keyset-paginate them
+        if ordering in RANKING_CRITERIA:
+            queryset = queryset.order_by(f'-{ordering}', 'name', 'pk')
         elif ordering == 'name':
-            queryset = queryset.order_by('name')
+            queryset = queryset.order_by('name', 'pk')
+
+        # Name, username, phone or email, from the directory index; best match first unless ordered
+        search = self.request.query_params.get('search', None)
+        if search:
+            if directory.is_available():
+                queryset = directory.search_queryset(queryset, search, user_field='user')
+                if ordering not in RANKING_CRITERIA and ordering != 'name':
+                    queryset = queryset.order_by('search_rank', 'name', 'pk')
+            else:
+                queryset = queryset.filter(directory.fallback_filter(search, user_path='user__'))
 
         # Filter by minimum score if provided
         min_score = self.request.query_params.get('min_score', None)
@@ -37,15 +77,78 @@ class PlayerViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_own_player(self, request):
+        """
+        The requesting user's player. Looked up by the token's `player_id` claim when
+        there is one, reusing the authenticated user instead of joining it again.
+        """
+        player_id = request.auth.get(PLAYER_ID_CLAIM) if request.auth is not None else None
+        if player_id is None:
+            return Player.objects.select_related('user').get(user=request.user)
+        player = Player.objects.get(pk=player_id, user_id=request.user.pk)
+        player.user = request.user
+        return player
+
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
         try:
-            player = request.user.player
+            player = self.get_own_player(request)
             serializer = self.get_serializer(player)
             return Response(serializer.data)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated], url_path="me/rank")
+    def my_rank(self, request):
+        """
+        Get the current player's rank, percentile and the `window` players above and below.
+        Query params: `by` (ranking criterion), `window` (default 5, max 50).
+        """
+        criteria = request.query_params.get('by', 'total_score')
+        if criteria not in RANKING_CRITERIA:
+            criteria = 'total_score'
+
+        try:
+            window = min(max(int(request.query_params.get('window', 5)), 0), MAX_RANK_WINDOW)
+        except ValueError:
+            window = 5
+
+        try:
+            player = self.get_own_player(request)
+        except Player.DoesNotExist:
+            return Response(
+                {"error": "Player profile not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        queryset = self.optimize_queryset(Player.objects.all())
+        if leaderboard_index.is_ready() and leaderboard_index.position(criteria, player.pk) is not None:
+            position = leaderboard_index.position(criteria, player.pk)
+            player.rank_position = leaderboard_index.rank(criteria, player.pk)
+            total_players = leaderboard_index.count()
+            players_below = leaderboard_index.count_below(criteria, player.pk)
+            ranking = IndexedRanking(leaderboard_index, criteria, queryset)
+            above = ranking[max(position - 1 - window, 0):position - 1]
+            below = ranking[position:position + window]
+        else:
+            position = Player.objects.ranking_position(player, criteria)
+            player.rank_position = Player.objects.filter(**{f"{criteria}__gt": getattr(player, criteria)}).count() + 1
+            total_players = Player.objects.count()
+            players_below = Player.objects.filter(**{f"{criteria}__lt": getattr(player, criteria)}).count()
+            above, below = queryset.neighbours(player, criteria, window)
+
+        return Response({
+            'by': criteria,
+            'position': position,
+            'rank_position': player.rank_position,
+            'total_players': total_players,
+            # Share of players with a strictly lower score; tied players are not counted below
+            'percentile': round(players_below / total_players * 100, 2),
+            'player': self.get_serializer(player).data,
+            'above': self.get_serializer(above, many=True).data,
+            'below': self.get_serializer(below, many=True).data,
+        })
+
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def add_score(self, request, pk=None):
         player = self.get_object()
@@ -77,20 +180,90 @@ class PlayerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Update player's score statistics
-        player.update_score_stats(score)
-
         # Check if player won (you can define your own win condition)
         won = request.data.get('won', False)
-        if won:
-            player.increment_games_won()
+
+        # Update player's score statistics in a single atomic statement
+        player.record_game(score, won=bool(won), submitted_by=request.user)
 
         serializer = self.get_serializer(player)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+    def add_scores(self, request):
+        """
+        Submit several game results at once: `[{"player": <id>, "score": <int>, "won": <bool>}, ...]`.
+        Valid entries are logged and applied in one transaction (one UPDATE per player) and every
+        entry gets its own result status, in request order.
+        """
+        entries = request.data
+        if not isinstance(entries, list) or not entries:
+            return Response(
+                {"error": "Expected a non-empty list of scores"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(entries) > MAX_SCORE_BATCH:
+            return Response(
+                {"error": f"At most {MAX_SCORE_BATCH} scores can be submitted at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(entries)
+        valid_entries = []
+        for index, entry in enumerate(entries):
+            serializer = ScoreEntrySerializer(data=entry)
+            if serializer.is_valid():
+                valid_entries.append((index, serializer.validated_data))
+            else:
+                results[index] = {
+                    "player": entry.get("player") if isinstance(entry, dict) else None,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": serializer.errors,
+                }
+
+        owners = dict(
+            Player.objects.filter(pk__in={entry["player"] for _, entry in valid_entries})
+            .values_list("pk", "user_id")
+        )
+
+        # Group the accepted games per player, keeping submission order
+        games = defaultdict(list)
+        for index, entry in valid_entries:
+            player_id = entry["player"]
+            if player_id not in owners:
+                results[index] = {
+                    "player": player_id,
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "error": "Player not found",
+                }
+            # is_superuser: every user counts as staff here (see User.is_staff)
+            elif not (request.user.pk == owners[player_id] or request.user.is_superuser):
+                results[index] = {
+                    "player": player_id,
+                    "status": status.HTTP_403_FORBIDDEN,
+                    "error": "You can only update your own score",
+                }
+            else:
+                games[player_id].append((index, entry))
+
+        with transaction.atomic():
+            for player_id, player_games in games.items():
+                stats = Player.ingest_games(
+                    player_id,
+                    [(entry["score"], entry["won"]) for _, entry in player_games],
+                    submitted_by=request.user,
+                )
+                for index, entry in player_games:
+                    results[index] = {"player": player_id, "status": status.HTTP_200_OK, "stats": stats}
+
+        return Response({
+            "applied": sum(len(player_games) for player_games in games.values()),
+            "results": results,
+        })
+
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def increment_wins(self, request, pk=None):
-        """Increment win count"""
+        """Mark the player's latest recorded game that is not yet a win as won (see `Player.increment_games_won`)"""
         player = self.get_object()
 
         # Check if user owns this player profile or is admin
@@ -100,43 +273,146 @@ class PlayerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        player.increment_games_won()
+        if player.increment_games_won() is None:
+            return Response(
+                {"error": "No game left to mark as won"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         serializer = self.get_serializer(player)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    @conditional_get(lambda view, request: view.leaderboard_validator(request), private=True, no_cache=True)
     def leaderboard(self, request):
-        """Get top players by different criteria"""
+        """
+        Get top players by different criteria.
+        `?period=day|week|month` ranks by that period's buckets (optionally the one containing `?date=`).
+        `?compact=true` returns the short leaderboard row (see `PlayerReadSerializer.Meta.compact_fields`).
+        """
         criteria = request.query_params.get('by', 'total_score')
-        limit = int(request.query_params.get('limit', 10))
+        max_limit = getattr(settings, 'LEADERBOARD_MAX_LIMIT', 100)
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= max_limit:
+            return Response(
+                {"error": f"Limit must be an integer between 1 and {max_limit}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        valid_criteria = ['total_score', 'high_score', 'average_score', 'games_won']
-        if criteria not in valid_criteria:
+        if criteria not in RANKING_CRITERIA:
             criteria = 'total_score'
 
-        top_players = Player.objects.all().order_by(f'-{criteria}')[:limit]
+        period = request.query_params.get('period', 'all')
+        periods = ['all', *PlayerPeriodStats.Period.values]
+        if period not in periods:
+            return Response(
+                {"error": f"Period must be one of {', '.join(periods)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if period in PlayerPeriodStats.Period.values:
+            try:
+                day = date.fromisoformat(request.query_params['date'])
+            except KeyError:
+                day = datetime.now(settings.CAIRO_TZ).date()
+            except ValueError:
+                return Response(
+                    {"error": "Date must be in YYYY-MM-DD format"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            top_stats = PlayerPeriodStats.objects.filter(
+                period=period,
+                period_start=PlayerPeriodStats.period_start_for(period, day),
+            ).order_by(f'-{criteria}', 'player_id')
+            serializer = PlayerPeriodStatsSerializer(context=self.get_serializer_context())
+            top_stats = self.optimize_queryset(top_stats, serializer)[:limit]
+            serializer = PlayerPeriodStatsSerializer(top_stats, many=True, context=self.get_serializer_context())
+            return Response(serializer.data)
+
+        if leaderboard_index.is_ready():
+            top = leaderboard_index.top(criteria, limit)
+            players = self.optimize_queryset(Player.objects.all()).in_bulk([pk for pk, _ in top])
+            top_players = [players[pk] for pk, _ in top if pk in players]
+        else:
+            top_players = self.optimize_queryset(Player.objects.order_by(f'-{criteria}', 'name', 'pk'))[:limit]
+
         serializer = self.get_serializer(top_players, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def leaderboard_validator(self, request):
+        """
+        Conditional GET validator for the leaderboard: the player fingerprint (from the
+        index when warm, else one aggregate query), the period bucket's size and games
+        played, and when the rank tiers were last recomputed
+        """
+        if leaderboard_index.is_ready():
+            players = leaderboard_index.fingerprint()
+        else:
+            players = leaderboard_index.db_fingerprint()
+
+        period = request.query_params.get('period', 'all')
+        bucket = None
+        if period in PlayerPeriodStats.Period.values:
+            try:
+                day = date.fromisoformat(request.query_params.get('date', ''))
+            except ValueError:
+                day = datetime.now(settings.CAIRO_TZ).date()
+            bucket = PlayerPeriodStats.objects.filter(
+                period=period,
+                period_start=PlayerPeriodStats.period_start_for(period, day),
+            ).aggregate(count=Count('pk'), games_played=Sum('games_played'))
+
+        tiers = get_distribution().refreshed_at
+        return (players, bucket, tiers), players[2]
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated],
+            pagination_class=RankingPagination)
     def rankings(self, request):
-        """Get player rankings with position"""
+        """
+        Get player rankings with position.
+        Supports `?dense=true`, `?pagination=cursor` and `?player=<id>` to jump to that player's page.
+        Served from the in-memory leaderboard index when it is warm, otherwise by the database.
+        """
         criteria = request.query_params.get('by', 'total_score')
-        valid_criteria = ['total_score', 'high_score', 'average_score', 'games_won']
-
-        if criteria not in valid_criteria:
+        if criteria not in RANKING_CRITERIA:
             criteria = 'total_score'
 
-        players = Player.objects.all().order_by(f'-{criteria}', "name")
+        dense = request.query_params.get('dense', 'false').lower() == 'true'
+        use_index = leaderboard_index.is_ready()
+        if use_index:
+            players = IndexedRanking(
+                leaderboard_index, criteria, self.optimize_queryset(Player.objects.all()), dense=dense
+            )
+        else:
+            players = self.optimize_queryset(Player.objects.ranked(criteria, dense=dense))
+
+        player_id = request.query_params.get('player', None)
+        if player_id:
+            try:
+                player_id = int(player_id)
+                if use_index:
+                    position = leaderboard_index.position(criteria, player_id)
+                    if position is None:
+                        raise Player.DoesNotExist
+                else:
+                    target = Player.objects.get(pk=player_id)
+                    position = Player.objects.ranking_position(target, criteria)
+            except (ValueError, Player.DoesNotExist):
+                return Response(
+                    {"error": "Player not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            self.paginator.jump_to(position)
 
-        # Create rankings with position
-        rankings = []
-        for index, player in enumerate(players, start=1):
-            player_data = PlayerReadSerializer(player, context={"request": request}).data
-            player_data['rank_position'] = index
-            rankings.append(player_data)
+        page = self.paginate_queryset(players)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
-        return Response(rankings)
+        serializer = self.get_serializer(players, many=True)
+        return Response(serializer.data)
 
     def _get_player_stats(self, player):
         """Helper method to get player statistics shared between stats and my_stats"""
@@ -166,7 +442,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
     def my_stats(self, request):
         """Get current user's statistics"""
         try:
-            player = request.user.player
+            player = self.get_own_player(request)
             stats = self._get_player_stats(player)
             return Response(stats)
         except Player.DoesNotExist:
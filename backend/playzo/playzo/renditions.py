@@ -0,0 +1,175 @@
+"""
+Image renditions.
+
+Uploaded images (`Offer.image`, `Player.photo`) are resized with Pillow into the
+sizes in `IMAGE_RENDITIONS`, each written as WebP and JPEG next to the upload under
+`renditions/`. File names start with a hash of the source bytes and carry the
+target size, so a URL never changes meaning and can be cached forever.
+
+The work runs after the saving transaction commits, on a small background thread
+pool (`IMAGE_RENDITIONS_ASYNC = False` runs it inline). The result is stored in a
+JSON field on the model:
+
+    {"source": "<upload name>", "thumbnail": {"webp": "<name>", "jpeg": "<name>"}, ...}
+
+`manage.py build_image_renditions` fills in anything missed, e.g. after a restart.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDITIONS = {
+    "thumbnail": (160, 160),
+    "card": (480, 480),
+    "full": (1280, 1280),
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="renditions")
+
+
+def get_renditions():
+    return getattr(settings, "IMAGE_RENDITIONS", DEFAULT_RENDITIONS)
+
+
+def is_current(name, renditions):
+    """True when `renditions` were built from the upload stored as `name`"""
+    if not name:
+        return not renditions
+    return bool(renditions) and renditions.get("source") == name
+
+
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    field_file.open("rb")
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()[:20]
+
+
+def open_image(field_file, size):
+    field_file.open("rb")
+    try:
+        image = Image.open(io.BytesIO(field_file.read()))
+    finally:
+        field_file.close()
+    # Let the JPEG decoder downscale while decoding: a 12MP photo never fully lands in memory
+    image.draft("RGB", size)
+    return ImageOps.exif_transpose(image)
+
+
+def encode(image, format_name):
+    pil_format, options = FORMATS[format_name]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background.paste(image, mask=image.getchannel("A"))
+        else:
+            background.paste(image.convert("RGB"))
+        image = background
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build(field_file):
+    """Write every rendition of `field_file` and return the rendition map"""
+    storage = field_file.storage
+    directory = field_file.field.upload_to
+    digest = content_hash(field_file)
+    largest = max(get_renditions().values())
+    source = open_image(field_file, largest)
+
+    renditions = {"source": field_file.name}
+    for name, size in get_renditions().items():
+        image = source.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        renditions[name] = {}
+        for format_name in FORMATS:
+            path = f"{directory}renditions/{digest}-{name}-{size[0]}x{size[1]}.{format_name}"
+            if not storage.exists(path):
+                path = storage.save(path, ContentFile(encode(image, format_name)))
+            renditions[name][format_name] = path
+    return renditions
+
+
+def refresh(model, pk, field_name, renditions_field):
+    """(Re)build the renditions of one row if its image changed since they were made"""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    if is_current(field_file.name, getattr(instance, renditions_field)):
+        return
+
+    renditions = build(field_file) if field_file else {}
+
+    # Skip the write if the image was replaced meanwhile, that save queued its own build
+    current = model.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+    if (current or "") != (field_file.name or ""):
+        return
+    setattr(instance, renditions_field, renditions)
+    update_fields = [renditions_field]
+    if any(field.name == "updated_at" for field in instance._meta.concrete_fields):
+        update_fields.append("updated_at")
+    instance.save(update_fields=update_fields)
+
+
+def run(model, pk, field_name, renditions_field):
+    try:
+        refresh(model, pk, field_name, renditions_field)
+    except Exception:
+        logger.exception("Building %s renditions of %s #%s failed", field_name, model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(instance, field_name, renditions_field):
+    """Queue a rendition build for `instance` after commit, unless its renditions are current"""
+    if is_current(getattr(instance, field_name).name, getattr(instance, renditions_field)):
+        return
+    args = (type(instance), instance.pk, field_name, renditions_field)
+    if getattr(settings, "IMAGE_RENDITIONS_ASYNC", True):
+        transaction.on_commit(lambda: executor.submit(run, *args))
+    else:
+        transaction.on_commit(lambda: refresh(*args))
+
+
+def rendition_urls(renditions, request=None, media_url=None):
+    """
+    The rendition map with absolute URLs, or None while renditions are not built.
+    `media_url(path)` replaces the default storage URL + `request.build_absolute_uri()`.
+    """
+    if not renditions:
+        return None
+    if media_url is None:
+        def media_url(path):
+            url = default_storage.url(path)
+            return request.build_absolute_uri(url) if request else url
+
+    urls = {}
+    for name, files in renditions.items():
+        if name == "source":
+            continue
+        urls[name] = {format_name: media_url(path) for format_name, path in files.items()}
+    return urls
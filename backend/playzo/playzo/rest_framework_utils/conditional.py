@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_get(validator, **cache_control):
+    """
+    Conditional GET for a viewset action.
+
+    `validator(view, request)` returns `(fingerprint, last_modified)`: any cheap,
+    repr-able value that changes whenever the response would (e.g. row count and
+    MAX(updated_at)), and the datetime of the latest change or None. It runs before
+    the action, so a matching `If-None-Match` / `If-Modified-Since` is answered with
+    304 without loading or serializing anything. The ETag also covers the path, the
+    normalized query parameters and the negotiated media type, so each distinct query
+    gets its own validator.
+
+    Keyword arguments go to `Cache-Control`; the default `no-cache` lets clients keep
+    the body but makes them revalidate on every use.
+    """
+    cache_control = cache_control or {'no_cache': True}
+
+    def decorator(method):
+        @wraps(method)
+        def wrapped(view, request, *args, **kwargs):
+            fingerprint, last_modified = validator(view, request)
+            # Query parameters in a canonical order, so ?a=1&b=2 and ?b=2&a=1 share an ETag
+            params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+            source = repr((fingerprint, request.path, params, request.accepted_media_type))
+            etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, **cache_control)
+            return response
+
+        return wrapped
+
+    return decorator
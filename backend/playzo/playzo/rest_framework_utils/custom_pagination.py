@@ -1,18 +1,145 @@
+import json
+import operator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time
+from functools import reduce
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder cuts off, or keyset pages would repeat or skip rows"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    `?pagination=cursor` (or any `?cursor=` token) switches to keyset pages: the cursor
+    encodes the ordering values of the last row seen, so every page is an indexed
+    range scan without OFFSET or COUNT(*). The response keeps the page-number
+    envelope, with `total_pages`, `page` and `count` set to null.
+    """
     page_size_query_param = 'page_size'
     page_size = 10
 
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    cursor_mode = False
+
     def paginate_queryset(self, queryset, request, view=None):
         no_pagination = request.query_params.get("no_pagination", None)
         if no_pagination and no_pagination.lower() == 'true':
             return None
+
+        self.request = request
+        self.cursor_mode = (
+                request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_query_param in request.query_params
+        )
+        if self.cursor_mode:
+            return self.paginate_cursor(queryset, request, view)
         return super().paginate_queryset(queryset, request, view)
 
+    def get_keyset_ordering(self, queryset):
+        """Queryset ordering made unique by a trailing primary key, or None if not keyset-able"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) and field != '?' for field in ordering):
+            return None
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering.append('pk')
+        return ordering
+
+    @staticmethod
+    def keyset_filter(ordering, values, reverse=False):
+        """Q selecting rows strictly after `values` in `ordering` (before, if `reverse`)"""
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            condition = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[index]})
+            for previous, value in zip(ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+        return reduce(operator.or_, conditions)
+
+    def paginate_cursor(self, queryset, request, view=None):
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        values = cursor.get('v')
+        reverse = bool(cursor.get('r'))
+        if values is not None and (not isinstance(values, list) or len(values) != len(ordering)):
+            raise NotFound(self.invalid_cursor_message)
+
+        if reverse:
+            ordering_used = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        else:
+            ordering_used = ordering
+
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, values, reverse=reverse))
+        rows = list(queryset.order_by(*ordering_used)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        def row_values(row):
+            # Model instances, or `values()` rows from the compiled read path
+            if isinstance(row, dict):
+                return [row[field.lstrip('-')] for field in ordering]
+            return [getattr(row, field.lstrip('-')) for field in ordering]
+
+        has_next = (not reverse and has_more) or (reverse and values is not None)
+        has_previous = (reverse and has_more) or (not reverse and values is not None)
+        self.next_cursor = {'v': row_values(rows[-1])} if has_next and rows else None
+        self.previous_cursor = {'v': row_values(rows[0]), 'r': 1} if has_previous and rows else None
+        return rows
+
+    def encode_cursor(self, payload):
+        token = urlsafe_b64encode(json.dumps(payload, cls=CursorEncoder).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return {}
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(payload, dict):
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
     def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response({
+                'total_pages': None,
+                'page': None,
+                'count': None,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'data': data,
+            })
+
         total_pages = self.page.paginator.num_pages
         return Response({
             'total_pages': total_pages,
@@ -22,3 +149,13 @@ class CustomPageNumberPagination(PageNumberPagination):
             'previous': self.get_previous_link(),
             'data': data,
         })
+
+    def get_next_link(self):
+        if self.cursor_mode:
+            return self.next_cursor and self.encode_cursor(self.next_cursor)
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.cursor_mode:
+            return self.previous_cursor and self.encode_cursor(self.previous_cursor)
+        return super().get_previous_link()
@@ -0,0 +1,260 @@
+"""
+Precompiled read path for hot list endpoints.
+
+`CompiledReader.compile(serializer)` walks a bound read serializer's fields once
+and builds one small converter per field. Rows are then fetched with `values()`
+and turned into dicts without instantiating models or going through DRF's
+per-field `get_attribute()` / `to_representation()` machinery. Output is
+byte-identical to `serializer.data`. A `ReadContext` holds what would otherwise
+be recomputed per row: one clock reading per request, the absolute media URL
+prefix and URL templates for hyperlinked identity fields.
+
+Fields that are not plain model columns need a `fast_<field name>(row, context)`
+method on the serializer and their columns in `Meta.sparse_field_sources`. If a
+serializer has a field the reader cannot reproduce, `compile()` returns None and
+callers use the serializer as before.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import ForeignKey
+from django.utils.encoding import filepath_to_uri
+from rest_framework import fields as drf_fields
+from rest_framework import serializers
+from rest_framework.relations import HyperlinkedIdentityField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .sparse_fields import SparseFieldsetViewMixin
+
+# Stands in for the lookup value while reversing a URL template
+URL_PLACEHOLDER = "0fastread0"
+
+
+class ReadContext:
+    """Per-request values shared by every row"""
+
+    def __init__(self, request):
+        self.request = request
+        self.now = datetime.now(settings.CAIRO_TZ)
+        self.media_prefixes = {}
+
+    def media_url(self, name, storage):
+        """What `FileField.to_representation` returns for a stored file name"""
+        if not isinstance(storage, FileSystemStorage):
+            url = storage.url(name)
+            return self.request.build_absolute_uri(url) if self.request is not None else url
+
+        prefix = self.media_prefixes.get(storage)
+        if prefix is None:
+            prefix = storage.url("")
+            if self.request is not None:
+                prefix = self.request.build_absolute_uri(prefix)
+            self.media_prefixes[storage] = prefix
+        return prefix + filepath_to_uri(name).lstrip("/")
+
+
+def plain(value):
+    return value
+
+
+def iso_datetime(field):
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+
+    def convert(value):
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    if field_timezone is None or getattr(field, "format", api_settings.DATETIME_FORMAT).lower() != "iso-8601":
+        return field.to_representation
+    return convert
+
+
+def iso_date(field):
+    if getattr(field, "format", api_settings.DATE_FORMAT).lower() != "iso-8601":
+        return field.to_representation
+    return lambda value: value.isoformat()
+
+
+def file_url(storage, context):
+    return lambda name: context.media_url(name, storage) if name else None
+
+
+def choice(field):
+    choices = field.choice_strings_to_values
+    return lambda value: value if value == "" else choices.get(str(value), value)
+
+
+# Field class -> factory of a converter for non-null column values
+CONVERTERS = {
+    drf_fields.IntegerField: lambda field: int,
+    drf_fields.FloatField: lambda field: float,
+    drf_fields.CharField: lambda field: str,
+    drf_fields.EmailField: lambda field: str,
+    drf_fields.URLField: lambda field: str,
+    drf_fields.SlugField: lambda field: str,
+    drf_fields.BooleanField: lambda field: bool,
+    drf_fields.JSONField: lambda field: plain if not field.binary else field.to_representation,
+    drf_fields.DecimalField: lambda field: field.to_representation,
+    drf_fields.ChoiceField: choice,
+    drf_fields.DateTimeField: iso_datetime,
+    drf_fields.DateField: iso_date,
+    PrimaryKeyRelatedField: lambda field: plain,
+}
+
+
+class CompiledReader:
+    """
+    Row -> dict function for one read serializer. `columns` are the `values()` keys
+    it reads; nested serializers read their columns through the relation prefix.
+    """
+
+    def __init__(self, fields, columns):
+        self.fields = fields  # [(name, column or None, convert(row) or convert(value))]
+        self.columns = columns
+
+    @classmethod
+    def compile(cls, serializer, context=None, prefix=""):
+        """Reader reproducing `serializer` (a bound, non-list serializer), or None"""
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        if not isinstance(serializer, serializers.ModelSerializer) or serializer.context.get("format"):
+            return None
+
+        context = context or ReadContext(serializer.context.get("request"))
+        model = serializer.Meta.model
+        concrete = {field.name: field for field in model._meta.concrete_fields}
+        sources = getattr(serializer.Meta, "sparse_field_sources", {})
+        compiled = []
+        columns = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            fast = getattr(serializer, f"fast_{name}", None)
+            if fast is not None:
+                if name not in sources:
+                    return None
+                keys = {source: f"{prefix}{source}" for source in sources[name]}
+                columns += keys.values()
+                compiled.append((name, None, cls.method_converter(fast, keys, context)))
+                continue
+
+            if isinstance(field, serializers.BaseSerializer):
+                model_field = concrete.get(field.source)
+                if not isinstance(model_field, ForeignKey) or isinstance(field, serializers.ListSerializer):
+                    return None
+                nested = cls.compile(field, context, prefix=f"{prefix}{field.source}__")
+                if nested is None:
+                    return None
+                key = f"{prefix}{field.source}"
+                columns += [key, *nested.columns]
+                compiled.append((name, None, cls.nested_converter(nested, key)))
+                continue
+
+            if isinstance(field, HyperlinkedIdentityField):
+                convert = cls.identity_url_converter(field, context)
+                if convert is None:
+                    return None
+                key = f"{prefix}{field.lookup_field}"
+                columns.append(key)
+                compiled.append((name, key, convert))
+                continue
+
+            model_field = concrete.get(field.source)
+            if model_field is None and field.source == "pk":
+                model_field = model._meta.pk
+            if model_field is None:
+                return None
+
+            if isinstance(field, serializers.FileField):
+                if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+                    return None
+                convert = file_url(model_field.storage, context)
+            else:
+                factory = CONVERTERS.get(type(field))
+                if factory is None:
+                    return None
+                convert = factory(field)
+
+            key = f"{prefix}{model_field.name if field.source != 'pk' else 'pk'}"
+            columns.append(key)
+            compiled.append((name, key, convert))
+
+        return cls(compiled, list(dict.fromkeys(columns)))
+
+    @staticmethod
+    def method_converter(fast, keys, context):
+        """Call `fast_<name>(row, context)` with the serializer's own (unprefixed) columns"""
+        if all(source == key for source, key in keys.items()):
+            return lambda row: fast(row, context)
+        pairs = list(keys.items())
+        return lambda row: fast({source: row[key] for source, key in pairs}, context)
+
+    @staticmethod
+    def nested_converter(nested, key):
+        """Nested serializer over the same row, None when the foreign key is null"""
+        return lambda row: None if row[key] is None else nested.render(row)
+
+    @staticmethod
+    def identity_url_converter(field, context):
+        request = context.request
+        if request is None:
+            return None
+        template = field.reverse(
+            field.view_name, kwargs={field.lookup_url_kwarg: URL_PLACEHOLDER}, request=request, format=None
+        )
+        if template.count(URL_PLACEHOLDER) != 1:
+            return None
+        head, tail = template.split(URL_PLACEHOLDER)
+        return lambda value: f"{head}{value}{tail}"
+
+    def render(self, row):
+        data = {}
+        for name, key, convert in self.fields:
+            if key is None:
+                data[name] = convert(row)
+            else:
+                value = row[key]
+                data[name] = None if value is None else convert(value)
+        return data
+
+    def fetch(self, queryset):
+        """
+        `queryset` as `values()` rows carrying the reader's columns, its ordering keys
+        and `pk` (what keyset pagination reads from the last row)
+        """
+        ordering = [
+            field.lstrip("-") for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str) and field != "?"
+        ]
+        return queryset.values(*dict.fromkeys([*self.columns, *ordering, "pk"]))
+
+
+class FastReadViewMixin(SparseFieldsetViewMixin):
+    """
+    Serves `list` (and any action that calls `fast_response`) through a
+    `CompiledReader` whenever the read serializer compiles.
+    """
+
+    def get_reader(self, serializer=None):
+        if not getattr(settings, "FAST_READ_ENABLED", True):
+            return None
+        return CompiledReader.compile(serializer or self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+        return self.fast_response(reader, self.filter_queryset(self.get_queryset()))
+
+    def fast_response(self, reader, queryset, paginate=True):
+        rows = reader.fetch(queryset)
+        page = self.paginate_queryset(rows) if paginate else None
+        if page is not None:
+            return self.get_paginated_response([reader.render(row) for row in page])
+        return Response([reader.render(row) for row in rows])
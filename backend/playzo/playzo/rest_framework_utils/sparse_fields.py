@@ -0,0 +1,141 @@
+from rest_framework import serializers
+from rest_framework.relations import HyperlinkedIdentityField
+
+
+def parse_field_selection(value):
+    """
+    Turn "id,name,user.username" into {"id": None, "name": None, "user": {"username": None}}.
+    None means "the whole field".
+    """
+    selection = {}
+    for path in (part.strip() for part in value.split(',')):
+        if not path:
+            continue
+        node = selection
+        *parents, leaf = path.split('.')
+        for parent in parents:
+            if node.get(parent, {}) is None:
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[leaf] = None
+    return selection
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Sparse fieldsets for read serializers.
+
+    Clients trim the payload with `?fields=id,name,user.username` or
+    `?exclude=created_at,user.url` (dotted paths reach nested serializers that use
+    this mixin too). `?compact=true` selects `Meta.compact_fields`, a small documented
+    field set meant for leaderboard-style lists.
+
+    `optimize_queryset()` turns the selected fields into `only()` / `select_related()`
+    so columns and joins that will not be rendered are never loaded. Fields that are
+    not plain model columns declare the columns they read in `Meta.sparse_field_sources`.
+    """
+
+    def __init__(self, *args, sparse_fields=None, sparse_exclude=None, **kwargs):
+        self.sparse_fields = sparse_fields
+        self.sparse_exclude = sparse_exclude
+        super().__init__(*args, **kwargs)
+
+    def is_sparse_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_sparse_selection(self):
+        """(include, exclude) selections; read from the request for the top-level serializer"""
+        include, exclude = self.sparse_fields, self.sparse_exclude
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD') or not self.is_sparse_root():
+            return include, exclude
+
+        params = request.query_params
+        if include is None and params.get('fields'):
+            include = parse_field_selection(params['fields'])
+        elif include is None and params.get('compact', '').lower() == 'true':
+            include = parse_field_selection(','.join(getattr(self.Meta, 'compact_fields', [])))
+        if exclude is None and params.get('exclude'):
+            exclude = parse_field_selection(params['exclude'])
+        return include or None, exclude or None
+
+    def is_sparse(self):
+        include, exclude = self.get_sparse_selection()
+        return include is not None or exclude is not None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        include, exclude = self.get_sparse_selection()
+
+        selected = {}
+        for name, field in fields.items():
+            if include is not None and name not in include:
+                continue
+            if exclude is not None and name in exclude and exclude[name] is None:
+                continue
+
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsetSerializerMixin):
+                nested.sparse_fields = include.get(name) if include else None
+                nested.sparse_exclude = exclude.get(name) if exclude else None
+            selected[name] = field
+        return selected
+
+    def get_queryset_fields(self, prefix=''):
+        """
+        (only, select_related) lookups needed to render the selected fields.
+        `only` is None when some field's columns are unknown and everything must load.
+        """
+        model = self.Meta.model
+        sources = getattr(self.Meta, 'sparse_field_sources', {})
+        concrete = {field.name for field in model._meta.concrete_fields}
+        only = []
+        related = []
+        complete = True
+
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            nested = getattr(field, 'child', field)
+            if name in sources:
+                only += [f"{prefix}{source}" for source in sources[name]]
+            elif isinstance(nested, SparseFieldsetSerializerMixin) and field.source in concrete:
+                related.append(f"{prefix}{field.source}")
+                only.append(f"{prefix}{field.source}")
+                nested_only, nested_related = nested.get_queryset_fields(prefix=f"{prefix}{field.source}__")
+                related += nested_related
+                if nested_only is None:
+                    complete = False
+                else:
+                    only += nested_only
+            elif isinstance(field, HyperlinkedIdentityField):
+                continue
+            elif field.source in concrete or field.source == 'pk':
+                only.append(f"{prefix}{field.source}")
+            else:
+                complete = False
+
+        return (only if complete else None), related
+
+    def optimize_queryset(self, queryset):
+        """Apply the joins the selected fields need, and `only()` when a sparse fieldset is requested"""
+        only, related = self.get_queryset_fields()
+        if related:
+            queryset = queryset.select_related(*related)
+        if only is not None and self.is_sparse():
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class SparseFieldsetViewMixin:
+    """View helper applying the current serializer's sparse fieldset to a queryset"""
+
+    def optimize_queryset(self, queryset, serializer=None):
+        serializer = serializer or self.get_serializer()
+        if isinstance(serializer, SparseFieldsetSerializerMixin):
+            return serializer.optimize_queryset(queryset)
+        return queryset
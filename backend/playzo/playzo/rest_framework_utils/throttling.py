@@ -0,0 +1,159 @@
+"""
+Token-bucket rate limiting.
+
+Every caller gets one bucket per throttle scope. A bucket holds up to N tokens,
+refills at N per period and each request takes one, so a rate of "100/hour" allows
+a burst of 100 and then 100 requests spread over the hour. Callers fall in one of
+three tiers: "public" (anonymous, by client IP; see DRF's `NUM_PROXIES`),
+"authenticated" (by user id) and "admin" (superusers). `API_THROTTLE_POLICIES` maps
+each scope to a rate per tier; views pick a scope with `throttle_scope`, e.g.
+`@action(..., throttle_scope="track")`.
+
+Buckets live in a small SQLite file (`API_THROTTLE_STORE`, swapped for an in-memory
+store by `playzo.test_runner`) separate from the main database, so workers share
+them without an external service and without taking the main database's write
+lock. A check is one UPSERT ... RETURNING statement, atomic across processes. If
+the store fails, requests are let through.
+
+`RateLimitHeadersMiddleware` adds `X-RateLimit-Limit`, `X-RateLimit-Remaining` and
+`X-RateLimit-Reset` (seconds until the bucket is full again) to API responses;
+throttled responses also carry `Retry-After`.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+DEFAULT_POLICIES = {
+    "default": {"public": "100/hour", "authenticated": "1000/hour", "admin": "5000/hour"},
+}
+
+# Buckets idle this long are full again under any rate, their rows can go
+PRUNE_AFTER = PERIODS["d"]
+PRUNE_INTERVAL = 10 * 60
+
+TAKE_SQL = """
+INSERT INTO buckets (key, tokens, updated_at, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + (:now - updated_at) * :rate)
+        - (MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1),
+    allowed = MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1,
+    updated_at = :now
+RETURNING tokens, allowed
+"""
+
+
+def parse_rate(rate):
+    """"100/hour" -> (100, 3600)"""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+class BucketStore:
+    """Token buckets in a SQLite database shared by every worker process"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.pruned_at = time.monotonic()
+
+    @property
+    def path(self):
+        """`API_THROTTLE_STORE`: a file path, or a "file:" URI (e.g. the in-memory store of test runs)"""
+        return str(settings.API_THROTTLE_STORE)
+
+    def connect(self):
+        path = self.path
+        connection = getattr(self.local, "connection", None)
+        # A connection must not cross a fork (e.g. workers forked from a preloaded app)
+        if connection is None or self.local.key != (path, os.getpid()):
+            connection = sqlite3.connect(path, timeout=1, isolation_level=None, uri=path.startswith("file:"))
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Losing the last buckets on a power cut is fine, an fsync per request is not
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, allowed INTEGER NOT NULL)"
+            )
+            self.local.connection, self.local.key = connection, (path, os.getpid())
+        return connection
+
+    def take(self, key, capacity, rate, now):
+        """Take a token from bucket `key`; returns (allowed, tokens left)"""
+        connection = self.connect()
+        tokens, allowed = connection.execute(
+            TAKE_SQL, {"key": key, "capacity": capacity, "rate": rate, "now": now}
+        ).fetchone()
+        if time.monotonic() - self.pruned_at > PRUNE_INTERVAL:
+            self.pruned_at = time.monotonic()
+            connection.execute("DELETE FROM buckets WHERE updated_at < ?", [now - PRUNE_AFTER])
+        return bool(allowed), tokens
+
+    def clear(self):
+        self.connect().execute("DELETE FROM buckets")
+
+
+bucket_store = BucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    timer = time.time
+
+    def get_tier(self, request):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return "public"
+        return "admin" if user.is_superuser else "authenticated"
+
+    def get_rate(self, scope, tier):
+        """Rate of `tier` in `scope`; tiers (and scopes) a policy leaves out use the "default" one"""
+        policies = getattr(settings, "API_THROTTLE_POLICIES", DEFAULT_POLICIES)
+        return policies.get(scope, {}).get(tier, policies["default"].get(tier))
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None) or "default"
+        tier = self.get_tier(request)
+        rate = self.get_rate(scope, tier)
+        if rate is None:
+            return True
+
+        self.capacity, duration = parse_rate(rate)
+        self.rate = self.capacity / duration
+        ident = request.user.pk if tier != "public" else self.get_ident(request)
+        self.now = self.timer()
+        try:
+            allowed, self.tokens = bucket_store.take(f"{scope}:{tier}:{ident}", self.capacity, self.rate, self.now)
+        except sqlite3.Error:
+            logger.warning("Throttle store unavailable, letting the request through", exc_info=True)
+            return True
+
+        # Picked up by RateLimitHeadersMiddleware
+        request._request.rate_limit = {
+            "X-RateLimit-Limit": str(self.capacity),
+            "X-RateLimit-Remaining": str(max(int(self.tokens), 0)),
+            "X-RateLimit-Reset": str(math.ceil((self.capacity - self.tokens) / self.rate)),
+        }
+        return allowed
+
+    def wait(self):
+        """Seconds until the bucket holds a whole token again"""
+        return max(1 - self.tokens, 0) / self.rate
+
+
+class RateLimitHeadersMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        for header, value in getattr(request, "rate_limit", {}).items():
+            response[header] = value
+        return response
@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'playzo.rest_framework_utils.throttling.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'playzo.urls'
@@ -106,6 +107,18 @@ AUTH_PASSWORD_VALIDATORS = []
 # ]
 
 
+# Cache
+# "default" is process-local; "shared" is seen by every worker process (run `manage.py createcachetable`)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'playzo_cache',
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -149,10 +162,44 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'playzo.rest_framework_utils.custom_pagination.CustomPageNumberPagination',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'playzo.rest_framework_utils.throttling.TokenBucketThrottle',
+    ],
+    # Reverse proxies in front of the app, whose X-Forwarded-For entries are trusted for the client IP;
+    # 0 keys public throttle buckets on REMOTE_ADDR, so a spoofed header cannot open a fresh bucket
+    'NUM_PROXIES': 0,
 
     # openapi
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
+API_THROTTLE_POLICIES = {  # scope: {caller tier: token bucket rate}; missing tiers use "default"
+    'default': {'public': '100/hour', 'authenticated': '1000/hour', 'admin': '5000/hour'},
+    'auth': {'public': '60/hour'},  # login / token refresh, own bucket
+    'track': {'public': '600/hour'},  # batched offer impressions / clicks, own bucket
+}
+API_THROTTLE_STORE = BASE_DIR / 'throttle.sqlite3'  # token buckets shared by all worker processes
+TEST_RUNNER = 'playzo.test_runner.TestRunner'  # test-only setting overrides, e.g. an in-memory API_THROTTLE_STORE
+FAST_READ_ENABLED = True  # list endpoints render values() rows through compiled serializers
+
+# images
+IMAGE_RENDITIONS = {  # name: (max width, max height); each is written as WebP and JPEG
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+IMAGE_RENDITIONS_ASYNC = True  # build renditions on a background thread after commit
+
+# players
+LEADERBOARD_INDEX_ENABLED = True
+LEADERBOARD_INDEX_CHECK_INTERVAL = 30  # seconds between in-memory index / database consistency checks
+LEADERBOARD_MAX_LIMIT = 100  # largest `?limit=` the leaderboard accepts
+SCORE_DISTRIBUTION_MAX_AGE = 60 * 60  # seconds after which the rank tier distribution is logged as stale
+SCORE_DISTRIBUTION_CHECK_INTERVAL = 60  # seconds a process serves its copy before re-reading the stored one
+
+# offers
+OFFERS_HOME_CACHE_MAX_AGE = 60 * 60  # seconds; the home feed also expires at the next offer start/end
+OFFERS_ENGAGEMENT_FLUSH_INTERVAL = 10  # seconds impression / click counts stay buffered in memory
+OFFERS_ENGAGEMENT_MAX_PENDING = 1000  # buffered events that force an early flush (bounds what a crash loses)
 
 # simple jwt:
 SIMPLE_JWT = {
@@ -161,6 +208,13 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
 }
+AUTH_REFRESH_TOKEN_MODE = "blacklist"  # or "family": per-login generation counter, no per-token rows
+AUTH_FAST_PATH = True  # identity claims in tokens + process user cache (see authentication.tokens)
+AUTH_USER_CACHE_SIZE = 1024  # users kept per process
+AUTH_USER_CACHE_TTL = 60  # seconds before a cached user is re-read (bounds staleness across processes)
+# Seconds a user's resolved permission set is shared across requests. 0 resolves it once per request;
+# above that, other processes may keep honouring a revoked permission for up to this long
+AUTH_PERMISSION_CACHE_TTL = 0
 
 # corsheaders
 CORS_ALLOW_ALL_ORIGINS = True
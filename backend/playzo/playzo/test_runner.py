@@ -0,0 +1,24 @@
+"""
+Test runner applying the settings that differ under test.
+
+Test runs use an in-memory main database; anything else that would write next to
+the real data is pointed at a throwaway location here.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+    # Buckets shared by every connection of the test process, gone when it exits
+    "API_THROTTLE_STORE": "file:playzo-throttle?mode=memory&cache=shared",
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
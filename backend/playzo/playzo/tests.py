@@ -0,0 +1,181 @@
+import io
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from offers.models import Offer
+from players.leaderboard import leaderboard_index
+from players.models import Player
+from playzo import renditions
+from playzo.rest_framework_utils.throttling import BucketStore, bucket_store
+from users.models import User
+
+
+class BucketStoreTests(SimpleTestCase):
+    def setUp(self):
+        bucket_store.clear()
+
+    def take(self, now, store=bucket_store, key="bucket"):
+        # 3 tokens, refilled at one per second
+        return store.take(key, 3, 1.0, now)
+
+    def test_burst_then_refill(self):
+        self.assertEqual([self.take(100.0)[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(self.take(100.5), (False, 0.5))
+        self.assertEqual(self.take(101.0), (True, 0.0))
+        # Refills stop at the capacity
+        self.assertEqual(self.take(200.0), (True, 2.0))
+
+    def test_buckets_are_separate(self):
+        for _ in range(3):
+            self.take(100.0)
+        self.assertFalse(self.take(100.0)[0])
+        self.assertTrue(self.take(100.0, key="other")[0])
+
+    def test_stores_share_one_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "throttle.sqlite3"
+        results = []
+
+        def take():
+            # Another store instance per thread, as in another worker process
+            results.append(self.take(100.0, store=BucketStore())[0])
+
+        with override_settings(API_THROTTLE_STORE=path):
+            workers = [threading.Thread(target=take) for _ in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertEqual(results.count(True), 3)
+            self.assertFalse(self.take(100.0, store=BucketStore())[0])
+
+
+@override_settings(API_THROTTLE_POLICIES={
+    "default": {"public": "2/minute", "authenticated": "1000/hour", "admin": "5000/hour"},
+})
+class ThrottleResponseTests(TestCase):
+    url = "/api/offers/offers/active/"
+
+    def setUp(self):
+        bucket_store.clear()
+
+    def test_throttled_response_says_when_to_retry(self):
+        client = APIClient()
+        first = client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((first["X-RateLimit-Limit"], first["X-RateLimit-Remaining"]), ("2", "1"))
+        self.assertEqual(first["X-RateLimit-Reset"], "30")
+
+        self.assertEqual(client.get(self.url).status_code, 200)
+        throttled = client.get(self.url)
+        self.assertEqual(throttled.status_code, 429)
+        self.assertEqual(throttled["X-RateLimit-Remaining"], "0")
+        self.assertIn(int(throttled["Retry-After"]), range(29, 31))
+
+    def test_forwarded_for_does_not_open_a_new_bucket(self):
+        client = APIClient()
+        statuses = [
+            client.get(self.url, HTTP_X_FORWARDED_FOR=f"203.0.113.{index}").status_code for index in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+def image_file(name, size=(1600, 900), color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, IMAGE_RENDITIONS_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_offer(self, image):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Offer.objects.create(title="Offer", image=image, status=Offer.Status.ACTIVE,
+                                        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+
+    def assertRenditionsOf(self, instance, field_name, renditions_field):
+        instance.refresh_from_db()
+        built = getattr(instance, renditions_field)
+        self.assertEqual(built["source"], getattr(instance, field_name).name)
+        sizes = renditions.get_renditions()
+        self.assertEqual({name: set(files) for name, files in built.items() if name != "source"},
+                         {name: {"webp", "jpeg"} for name in sizes})
+        for name, files in built.items():
+            if name == "source":
+                continue
+            for path in files.values():
+                with default_storage.open(path) as stored, Image.open(stored) as image:
+                    self.assertLessEqual(image.width, sizes[name][0])
+                    self.assertLessEqual(image.height, sizes[name][1])
+        return built
+
+    def test_upload_gets_every_rendition(self):
+        offer = self.create_offer(image_file("banner.jpg"))
+        built = self.assertRenditionsOf(offer, "image", "image_renditions")
+        self.assertEqual(sum(len(files) for name, files in built.items() if name != "source"), 6)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", is_superuser=True))
+        data = client.get(f"/api/offers/offers/{offer.pk}/").json()
+        self.assertTrue(data["display_image"].endswith(built["full"]["jpeg"]))
+        self.assertEqual(data["display_image"], data["image_renditions"]["full"]["jpeg"])
+
+    def test_replaced_or_missing_renditions_are_rebuilt(self):
+        offer = self.create_offer(image_file("first.jpg"))
+        first = self.assertRenditionsOf(offer, "image", "image_renditions")
+
+        offer.image = image_file("second.jpg", color="blue")
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.save()
+        second = self.assertRenditionsOf(offer, "image", "image_renditions")
+        self.assertNotEqual(second["full"], first["full"])
+
+        Offer.objects.filter(pk=offer.pk).update(image_renditions={})
+        renditions.refresh(Offer, offer.pk, "image", "image_renditions")
+        self.assertEqual(self.assertRenditionsOf(offer, "image", "image_renditions"), second)
+
+        Offer.objects.filter(pk=offer.pk).update(image_renditions={})
+        call_command("build_image_renditions", stdout=StringIO())
+        self.assertEqual(self.assertRenditionsOf(offer, "image", "image_renditions"), second)
+
+    def test_photo_renditions_leave_the_leaderboard_alone(self):
+        user = User.objects.create(username="laila")
+        player = Player.objects.create(user=user, name="laila", gender=Player.Gender.FEMALE,
+                                       email="laila@playzo.test", phone="01000000001")
+        leaderboard_index.load()
+        self.addCleanup(leaderboard_index.clear)
+
+        # What a rendition build that loaded the player before a game was recorded saves
+        stale = Player.objects.get(pk=player.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            player.record_game(50)
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.save(update_fields=["photo_renditions", "updated_at"])
+        self.assertEqual(leaderboard_index.indexes["total_score"].keys[0], (-50, "laila", player.pk))
+        self.assertTrue(leaderboard_index.is_consistent())
+
+        player.photo = image_file("photo.jpg", size=(400, 400))
+        with self.captureOnCommitCallbacks(execute=True):
+            player.save(update_fields=["photo", "updated_at"])
+        self.assertRenditionsOf(player, "photo", "photo_renditions")
+        self.assertEqual(leaderboard_index.indexes["total_score"].keys[0], (-50, "laila", player.pk))
+        self.assertTrue(leaderboard_index.is_consistent())
@@ -0,0 +1,31 @@
+"""
+Text helpers shared by the search indexes (offers.search, users.directory).
+"""
+import re
+import unicodedata
+
+# Marks NFKD does not split off as combining characters: Quranic annotations and tatweel
+ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+# Letters NFKD leaves alone (hamza forms such as أ إ آ ؤ ئ decompose on their own)
+ARABIC_LETTERS = str.maketrans({
+    "\u0671": "\u0627",  # alef wasla -> alef
+    "\u0649": "\u064a",  # alef maqsura -> yaa
+    "\u0629": "\u0647",  # taa marbuta -> haa
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},  # Eastern Arabic-Indic digits
+})
+# Definite article, optionally after a conjunction or preposition (wa-, fa-, bi-, ka-)
+ARABIC_ARTICLE = re.compile("^[\u0648\u0641\u0628\u0643]?\u0627\u0644(?=\\w{2})")
+WORD = re.compile(r"\w+")
+
+
+def normalize_word(word):
+    return ARABIC_ARTICLE.sub("", word)
+
+
+def normalize_text(text):
+    """Searchable form of `text`: the words of the normalized text joined by spaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = ARABIC_MARKS.sub("", text).translate(ARABIC_LETTERS).casefold()
+    return " ".join(normalize_word(word) for word in WORD.findall(text))
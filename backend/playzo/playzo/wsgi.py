@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'playzo.settings')
 
 application = get_wsgi_application()
+
+# Warm process-local caches once Django is set up
+from players.leaderboard import leaderboard_index  # noqa: E402
+
+leaderboard_index.warm()
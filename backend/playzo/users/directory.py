@@ -0,0 +1,289 @@
+"""
+Directory search over users and their player profiles.
+
+Every user except superusers (who are left out of the user list too) has one row in
+`users_directory`, keyed by user id: the names of the user and the player, the
+username, the phone digits and the email, normalized like the offer index (see
+`playzo.utils.normalize_text`), plus what a typeahead row displays. Two FTS5
+indexes over that table are kept current by triggers:
+
+- `users_directory_prefix` (unicode61 with 1-3 character prefix indexes) matches
+  every search word at the start of a word, e.g. "ah ha" finds "Ahmed Hatem";
+- `users_directory_trigram` (trigram tokenizer) matches words of 3+ characters
+  anywhere, e.g. the middle digits of a phone number or part of an email.
+
+Results are ranked in tiers: a field starting with the search (a range scan of that
+column's B-tree index, name matches before username, phone and email ones, then
+alphabetically), then every word starting a word, then every word appearing
+anywhere (both newest account first, the order the FTS5 index returns rowids in).
+A typeahead page reads the tiers in order and each tier stops once the page is
+full, so its cost does not grow with the number of accounts matching.
+`users.signals` and `players.signals` rewrite a user's row when the user or their
+player is saved or deleted. On databases other than SQLite the views fall back to
+`icontains`.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from playzo.utils import normalize_text
+
+DIRECTORY_TABLE = "users_directory"
+PREFIX_TABLE = "users_directory_prefix"
+TRIGRAM_TABLE = "users_directory_trigram"
+
+# In the order their matches rank
+SEARCH_COLUMNS = ["name", "username", "phone", "email"]
+# The trigram tokenizer cannot match anything shorter
+TRIGRAM_MIN_LENGTH = 3
+# Greater than any character, closes "starts with" ranges
+MAX_CHAR = "\U0010ffff"
+
+
+def index_triggers(table):
+    """Triggers keeping the external-content FTS5 `table` in step; a 'delete' needs the old values"""
+    columns = ", ".join(SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    delete = f"INSERT INTO {table} ({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {table} (rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {DIRECTORY_TABLE} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {DIRECTORY_TABLE} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE ON {DIRECTORY_TABLE} BEGIN {delete} {insert} END",
+    ]
+
+
+SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {DIRECTORY_TABLE} (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER,
+        display_name TEXT NOT NULL,
+        display_username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        username TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        email TEXT NOT NULL
+    )
+    """,
+    *[
+        f"CREATE INDEX IF NOT EXISTS {DIRECTORY_TABLE}_{column}_idx ON {DIRECTORY_TABLE} ({column})"
+        for column in SEARCH_COLUMNS
+    ],
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {PREFIX_TABLE} USING fts5(
+        {", ".join(SEARCH_COLUMNS)}, content = '{DIRECTORY_TABLE}', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        {", ".join(SEARCH_COLUMNS)}, content = '{DIRECTORY_TABLE}', content_rowid = 'id', tokenize = 'trigram'
+    )
+    """,
+] + index_triggers(PREFIX_TABLE) + index_triggers(TRIGRAM_TABLE)
+
+DROP_SCHEMA = [
+    f"DROP TABLE IF EXISTS {PREFIX_TABLE}",
+    f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}",
+    f"DROP TABLE IF EXISTS {DIRECTORY_TABLE}",  # drops its triggers
+]
+
+UPSERT_SQL = f"""
+INSERT INTO {DIRECTORY_TABLE} (id, player_id, display_name, display_username, {", ".join(SEARCH_COLUMNS)})
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (id) DO UPDATE SET
+    player_id = excluded.player_id,
+    display_name = excluded.display_name,
+    display_username = excluded.display_username,
+    {", ".join(f"{column} = excluded.{column}" for column in SEARCH_COLUMNS)}
+"""
+
+# Columns of the user and player read to build a row, see directory_row
+SOURCE_FIELDS = ["pk", "name", "username", "player__pk", "player__name", "player__phone", "player__email"]
+
+
+def is_available():
+    return connection.vendor == "sqlite"
+
+
+def fallback_filter(search, user_path=""):
+    """`icontains` Q over the directory's fields, for databases without the index"""
+    lookups = ["name", "username", "player__name", "player__phone", "player__email"]
+    return Q(*[Q(**{f"{user_path}{lookup}__icontains": search}) for lookup in lookups], _connector=Q.OR)
+
+
+def normalize_phone(phone):
+    return "".join(normalize_text(phone).split())
+
+
+def directory_row(pk, name, username, player_id, player_name, phone, email):
+    """UPSERT_SQL parameters for a user, from SOURCE_FIELDS values"""
+    names = [value for value in dict.fromkeys([player_name, name]) if value]
+    return [
+        pk, player_id, names[0] if names else "", username,
+        normalize_text(" ".join(names)), normalize_text(username), normalize_phone(phone), normalize_text(email),
+    ]
+
+
+def index_user(pk):
+    """Rewrite the directory row of user `pk`, or drop it if the user is gone or not listed"""
+    from .models import User
+
+    values = User.objects.filter(pk=pk, is_superuser=False).values_list(*SOURCE_FIELDS).first()
+    if values is None:
+        remove_user(pk)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL, directory_row(*values))
+
+
+def remove_user(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {DIRECTORY_TABLE} WHERE id = %s", [pk])
+
+
+def search_words(search):
+    words = normalize_text(search).split()
+    # "0100 123 4567": a phone number typed in groups
+    if len(words) > 1 and all(word.isdigit() for word in words):
+        words = ["".join(words)]
+    return words
+
+
+def match_expressions(words):
+    """(prefix, trigram) FTS5 MATCH expressions requiring every word; trigram is None if a word is too short"""
+    prefix = " ".join(f'"{word}"*' for word in words)
+    if min(len(word) for word in words) < TRIGRAM_MIN_LENGTH:
+        return prefix, None
+    return prefix, " ".join(f'"{word}"' for word in words)
+
+
+def starts_with(alias, text, columns=SEARCH_COLUMNS):
+    """SQL and parameters: one of `columns` of the directory row `alias` starts with `text`"""
+    sql = " OR ".join(f"({alias}.{column} >= %s AND {alias}.{column} < %s)" for column in columns)
+    return f"({sql})", [text, text + MAX_CHAR] * len(columns)
+
+
+def search_tiers(words):
+    """
+    SQL and parameters of each tier of matches for `words`, best first, each
+    selecting (id, display_username, display_name, player_id) in rank order
+    """
+    text = " ".join(words)
+    display = "d.id, d.display_username, d.display_name, d.player_id"
+    prefix, trigram = match_expressions(words)
+
+    # A whole field starts with the search, alphabetically: a range scan of that column's index
+    tiers = []
+    for position, column in enumerate(SEARCH_COLUMNS):
+        condition, params = starts_with("d", text, [column])
+        if position:
+            earlier, earlier_params = starts_with("d", text, SEARCH_COLUMNS[:position])
+            condition, params = f"{condition} AND NOT {earlier}", params + earlier_params
+        tiers.append((
+            f"SELECT {display} FROM {DIRECTORY_TABLE} AS d WHERE {condition} ORDER BY d.{column}, d.id", params
+        ))
+
+    # Every word starts a word somewhere; the index walks its rowids backwards and stops at the LIMIT
+    condition, params = starts_with("d", text)
+    tiers.append((
+        f"SELECT {display} FROM {PREFIX_TABLE} JOIN {DIRECTORY_TABLE} AS d ON d.id = {PREFIX_TABLE}.rowid "
+        f"WHERE {PREFIX_TABLE} MATCH %s AND NOT {condition} ORDER BY {PREFIX_TABLE}.rowid DESC",
+        [prefix, *params],
+    ))
+
+    # Every word appears somewhere
+    if trigram is not None:
+        tiers.append((
+            f"SELECT {display} FROM {TRIGRAM_TABLE} JOIN {DIRECTORY_TABLE} AS d ON d.id = {TRIGRAM_TABLE}.rowid "
+            f"WHERE {TRIGRAM_TABLE} MATCH %s "
+            f"AND d.id NOT IN (SELECT rowid FROM {PREFIX_TABLE} WHERE {PREFIX_TABLE} MATCH %s) "
+            f"ORDER BY {TRIGRAM_TABLE}.rowid DESC",
+            [trigram, prefix],
+        ))
+    return tiers
+
+
+class DirectorySearch:
+    """
+    Typeahead rows for `search`, best match first, read from the directory table
+    alone; slice it to run the query for one page. Tiers are read in order until the
+    page is full, so a page costs a few index range scans rather than ranking every match.
+    """
+
+    def __init__(self, search):
+        self.search = search
+
+    def __getitem__(self, page):
+        if not is_available():
+            return self.fallback(page)
+        words = search_words(self.search)
+        if not words:
+            return []
+
+        rows = []
+        offset, limit = page.start, page.stop - page.start
+        with connection.cursor() as cursor:
+            for sql, params in search_tiers(words):
+                if len(rows) == limit:
+                    break
+                cursor.execute(f"{sql} LIMIT %s OFFSET %s", [*params, limit - len(rows), offset])
+                found = cursor.fetchall()
+                if not found and offset:
+                    # The page starts past this tier
+                    cursor.execute(f"SELECT count(*) FROM ({sql})", params)
+                    offset -= cursor.fetchone()[0]
+                else:
+                    offset = 0
+                rows += found
+        return [
+            {"id": pk, "username": username, "name": name, "player": player_id}
+            for pk, username, name, player_id in rows
+        ]
+
+    def fallback(self, page):
+        from .models import User
+
+        if not self.search.strip():
+            return []
+        users = (
+            User.objects.filter(fallback_filter(self.search), is_superuser=False)
+            .order_by("name", "pk")
+            .values_list("pk", "username", "name", "player__pk", "player__name")[page]
+        )
+        return [
+            {"id": pk, "username": username, "name": player_name or name, "player": player_id}
+            for pk, username, name, player_id, player_name in users
+        ]
+
+
+def search_queryset(queryset, search, user_field="pk"):
+    """
+    `queryset` narrowed to rows whose user (the `user_field` foreign key, or the
+    primary key of a User queryset) matches `search`, annotated with the `search_rank`
+    tier of the match (0 field start, 1 word start, 2 anywhere)
+    """
+    words = search_words(search)
+    if not words:
+        return queryset
+    prefix, trigram = match_expressions(words)
+    meta = queryset.model._meta
+    user_column = meta.pk.column if user_field == "pk" else meta.get_field(user_field).column
+    column = f'"{meta.db_table}"."{user_column}"'
+
+    matches = f"SELECT rowid FROM {PREFIX_TABLE} WHERE {PREFIX_TABLE} MATCH %s"
+    params = [prefix]
+    if trigram is not None:
+        matches += f" UNION SELECT rowid FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH %s"
+        params.append(trigram)
+    condition, condition_params = starts_with("d", " ".join(words))
+    # A primary key lookup per row, and one pass over the word-start matches for the whole query
+    rank = (
+        f"CASE WHEN EXISTS (SELECT 1 FROM {DIRECTORY_TABLE} AS d WHERE d.id = {column} AND {condition}) THEN 0 "
+        f"WHEN {column} IN (SELECT rowid FROM {PREFIX_TABLE} WHERE {PREFIX_TABLE} MATCH %s) THEN 1 ELSE 2 END"
+    )
+    return queryset.filter(
+        **{f"{user_field}__in": RawSQL(matches, params)}
+    ).annotate(search_rank=RawSQL(rank, [*condition_params, prefix]))
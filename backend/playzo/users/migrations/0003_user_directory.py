@@ -0,0 +1,128 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Frozen copy of the directory schema, row builder and normalizer as of this migration
+# (users.directory, playzo.utils.normalize_text), so the migration does not change if they do
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users_directory (
+        id INTEGER PRIMARY KEY,
+        player_id INTEGER,
+        display_name TEXT NOT NULL,
+        display_username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        username TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        email TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS users_directory_name_idx ON users_directory (name)",
+    "CREATE INDEX IF NOT EXISTS users_directory_username_idx ON users_directory (username)",
+    "CREATE INDEX IF NOT EXISTS users_directory_phone_idx ON users_directory (phone)",
+    "CREATE INDEX IF NOT EXISTS users_directory_email_idx ON users_directory (email)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_directory_prefix USING fts5(
+        name, username, phone, email, content = 'users_directory', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_directory_trigram USING fts5(
+        name, username, phone, email, content = 'users_directory', content_rowid = 'id', tokenize = 'trigram'
+    )
+    """,
+]
+for table in ["users_directory_prefix", "users_directory_trigram"]:
+    delete = (
+        f"INSERT INTO {table} ({table}, rowid, name, username, phone, email) "
+        f"VALUES ('delete', old.id, old.name, old.username, old.phone, old.email);"
+    )
+    insert = (
+        f"INSERT INTO {table} (rowid, name, username, phone, email) "
+        f"VALUES (new.id, new.name, new.username, new.phone, new.email);"
+    )
+    SCHEMA += [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON users_directory BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON users_directory BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE ON users_directory BEGIN {delete} {insert} END",
+    ]
+
+DROP_SCHEMA = [
+    "DROP TABLE IF EXISTS users_directory_prefix",
+    "DROP TABLE IF EXISTS users_directory_trigram",
+    "DROP TABLE IF EXISTS users_directory",
+]
+
+UPSERT_SQL = """
+INSERT INTO users_directory (id, player_id, display_name, display_username, name, username, phone, email)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (id) DO UPDATE SET
+    player_id = excluded.player_id,
+    display_name = excluded.display_name,
+    display_username = excluded.display_username,
+    name = excluded.name,
+    username = excluded.username,
+    phone = excluded.phone,
+    email = excluded.email
+"""
+
+ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+ARABIC_LETTERS = str.maketrans({
+    "\u0671": "\u0627",
+    "\u0649": "\u064a",
+    "\u0629": "\u0647",
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+ARABIC_ARTICLE = re.compile("^[\u0648\u0641\u0628\u0643]?\u0627\u0644(?=\\w{2})")
+WORD = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = ARABIC_MARKS.sub("", text).translate(ARABIC_LETTERS).casefold()
+    return " ".join(ARABIC_ARTICLE.sub("", word) for word in WORD.findall(text))
+
+
+def directory_row(pk, name, username, player_id, player_name, phone, email):
+    names = [value for value in dict.fromkeys([player_name, name]) if value]
+    return [
+        pk, player_id, names[0] if names else "", username,
+        normalize_text(" ".join(names)), normalize_text(username),
+        "".join(normalize_text(phone).split()), normalize_text(email),
+    ]
+
+
+def create_directory(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    User = apps.get_model('users', 'User')
+    for statement in SCHEMA:
+        schema_editor.execute(statement)
+    users = User.objects.filter(is_superuser=False).values_list(
+        'pk', 'name', 'username', 'player__pk', 'player__name', 'player__phone', 'player__email'
+    )
+    for values in users.iterator():
+        schema_editor.execute(UPSERT_SQL, directory_row(*values))
+
+
+def drop_directory(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_SCHEMA:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_token_version'),
+        ('players', '0008_player_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_directory, drop_directory),
+    ]
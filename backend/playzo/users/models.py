@@ -34,6 +34,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_superuser = models.BooleanField(default=False)
     is_moderator = models.BooleanField(default=False)
 
+    # Bumped on password change; carried by access tokens (see authentication.tokens)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
     objects = UserManager()
 
     USERNAME_FIELD = 'username'
@@ -42,6 +45,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     groups = models.ManyToManyField(Group, blank=True, related_name='custom_users')
     user_permissions = models.ManyToManyField(CorePermission, blank=True, related_name='custom_user_permissions')
 
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        self.token_version += 1
+
     def has_perm(self, perm, obj=None):
         if self.is_superuser:
             return True
@@ -52,11 +59,33 @@ class User(AbstractBaseUser, PermissionsMixin):
         if obj is not None:
             return _user_has_perm(self, perm, obj)
 
-        for backend in auth.get_backends():
-            if backend.has_perm(self, perm):
-                return True
+        return perm in self.get_permission_set()
 
-        return False
+    def get_all_permissions(self, obj=None):
+        if obj is not None:
+            return super().get_all_permissions(obj)
+        return set(self.get_permission_set())
+
+    def get_permission_set(self):
+        """
+        Every "app_label.codename" the backends grant this user, resolved once per
+        instance (i.e. per request) and shared across requests through users.permission_cache
+        """
+        from .permission_cache import permission_cache
+
+        permissions = self.__dict__.get("_permission_set")
+        if permissions is None:
+            permissions = permission_cache.get(self.pk, self.token_version)
+        if permissions is None:
+            generation = permission_cache.generation
+            permissions = frozenset().union(*(
+                backend.get_all_permissions(self)
+                for backend in auth.get_backends()
+                if hasattr(backend, "get_all_permissions")
+            ))
+            permission_cache.set(self.pk, self.token_version, permissions, generation)
+        self._permission_set = permissions
+        return permissions
 
     def has_module_perms(self, app_label):
         return True
@@ -0,0 +1,54 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from playzo.rest_framework_utils.custom_pagination import CustomPageNumberPagination
+
+
+class DirectoryPagination(CustomPageNumberPagination):
+    """
+    Numbered typeahead pages without a COUNT(*): a page reads one row more than it
+    returns to know whether there is a next one. The envelope is the usual one, with
+    `total_pages` and `count` null as in cursor mode.
+    """
+    page_size = 10
+    max_page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = False
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        page_size = self.get_page_size(request)
+        start = (self.page_number - 1) * page_size
+        rows = list(queryset[start:start + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'total_pages': None,
+            'page': self.page_number,
+            'count': None,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'data': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
@@ -0,0 +1,66 @@
+"""
+Process-local cache of resolved permission sets.
+
+`User.get_permission_set()` asks the auth backends for a user's permissions once,
+keeps the set on the user instance for the rest of the request, and shares it
+across requests here, keyed by (user id, `User.token_version`) with a TTL
+(`AUTH_PERMISSION_CACHE_TTL`). Entries are dropped when the user is saved or its
+groups or permissions change, and all of them when a group's permissions change
+or a group or permission is deleted (`users.signals`); other processes only pick
+the change up once the TTL runs out, so a revoked permission keeps working there
+until then. The TTL defaults to 0, which keeps the set for one request only.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+class PermissionCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # (pk, version) -> (expires at, frozenset of "app_label.codename")
+        # Bumped on every invalidation, so a set resolved before one is not stored after it
+        self.generation = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, "AUTH_PERMISSION_CACHE_TTL", 0)
+
+    def get(self, pk, version):
+        key = (pk, version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, permissions = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+        return permissions
+
+    def set(self, pk, version, permissions, generation):
+        if self.ttl <= 0 or pk is None:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            now = time.monotonic()
+            # Users are few and sets small; dropping expired entries on write keeps it bounded
+            for key in [key for key, (expires_at, _) in self.entries.items() if expires_at <= now]:
+                del self.entries[key]
+            self.entries[(pk, version)] = (now + self.ttl, permissions)
+
+    def invalidate(self, pk):
+        with self.lock:
+            self.generation += 1
+            for key in [key for key in self.entries if key[0] == pk]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+permission_cache = PermissionCache()
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from rest_framework.relations import HyperlinkedIdentityField
+from playzo.rest_framework_utils.sparse_fields import SparseFieldsetSerializerMixin
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     password2 = serializers.CharField(write_only=True)
     url = HyperlinkedIdentityField(view_name='user-detail', lookup_field='pk')
@@ -11,6 +12,7 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'name', 'is_superuser', 'password', 'password2', 'url']
+        compact_fields = ['id', 'username', 'name']
 
     def validate(self, data):
         if 'password' in data and 'password2' in data:
@@ -41,3 +43,11 @@ class UserSerializer(serializers.ModelSerializer):
             user.set_password(password)
         user.save()
         return user
+
+
+class DirectoryEntrySerializer(serializers.Serializer):
+    """A typeahead row of users.directory; `name` is the player's name when the user has one"""
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    name = serializers.CharField()
+    player = serializers.IntegerField(allow_null=True)
@@ -0,0 +1,62 @@
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.user_cache import user_cache
+
+from . import directory
+from .models import User
+from .permission_cache import permission_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    pk = instance.pk
+    user_cache.invalidate(pk)
+    permission_cache.invalidate(pk)
+    # Again after commit, in case a request cached the old row in between
+    transaction.on_commit(lambda: user_cache.invalidate(pk))
+    transaction.on_commit(lambda: permission_cache.invalidate(pk))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_permissions(sender, instance, action, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, User):
+        # The user's own groups or permissions changed; ModelBackend keeps its own per-instance copies
+        for attribute in ("_permission_set", "_perm_cache", "_user_perm_cache", "_group_perm_cache"):
+            instance.__dict__.pop(attribute, None)
+        invalidate = lambda: permission_cache.invalidate(instance.pk)  # noqa: E731
+    else:
+        # From the group / permission side, any number of users may be affected
+        invalidate = permission_cache.clear
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def clear_cached_permissions(sender, **kwargs):
+    permission_cache.clear()
+    transaction.on_commit(permission_cache.clear)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, update_fields=None, **kwargs):
+    if not directory.is_available():
+        return
+    # e.g. the last_login update on every login
+    if update_fields is not None and not {"name", "username", "is_superuser"} & set(update_fields):
+        return
+    directory.index_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    if directory.is_available():
+        directory.remove_user(instance.pk)
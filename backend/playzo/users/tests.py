@@ -1,3 +1,122 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, Permission
+from django.db import connection
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from players.models import Player
+
+from .directory import UPSERT_SQL, DirectorySearch, directory_row
+from .models import User
+from .permission_cache import permission_cache
+
+
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        permission_cache.clear()
+        self.group = Group.objects.create(name="offers")
+        self.group.permissions.set(Permission.objects.filter(codename__in=["view_offer", "change_offer"]))
+        self.user = User.objects.create_user("staff", "password123")
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_resolved_once_per_request_by_default(self):
+        user = self.fresh_user()
+        self.assertTrue(user.has_perm("offers.change_offer"))
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("offers.view_offer"))
+        # A revoke made by another process (no signal reaches this one) applies to the next request
+        Group.permissions.through.objects.filter(group=self.group, permission__codename="view_offer").delete()
+        self.assertFalse(self.fresh_user().has_perm("offers.view_offer"))
+
+    @override_settings(AUTH_PERMISSION_CACHE_TTL=60)
+    def test_permissions_resolved_once_across_requests(self):
+        self.assertTrue(self.fresh_user().has_perm("offers.change_offer"))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("offers.view_offer"))
+            self.assertFalse(user.has_perm("users.change_user"))
+
+    @override_settings(AUTH_PERMISSION_CACHE_TTL=60)
+    def test_relation_changes_invalidate(self):
+        self.assertFalse(self.fresh_user().has_perm("users.change_user"))
+        self.user.user_permissions.add(Permission.objects.get(codename="change_user"))
+        self.assertTrue(self.fresh_user().has_perm("users.change_user"))
+
+        self.group.permissions.remove(Permission.objects.get(codename="change_offer"))
+        self.assertFalse(self.fresh_user().has_perm("offers.change_offer"))
+
+        self.group.custom_users.remove(self.user)
+        self.assertFalse(self.fresh_user().has_perm("offers.view_offer"))
+
+
+class DirectorySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for username, name, phone, email in [
+            ("ahmed_h", "Ahmed Hatem", "+20 100 123 4567", "ahmed.hatem@mail.test"),
+            ("zed", "Zed Ahmed", "0111", "zed@mail.test"),
+            ("sam", "Samahmed", "0122", "sam@mail.test"),
+            ("mona", "منى الشريف", "0133", "mona@mail.test"),
+        ]:
+            user = User.objects.create(username=username)
+            Player.objects.create(user=user, name=name, gender=Player.Gender.MALE, phone=phone, email=email)
+        cls.user = User.objects.create(username="plain", name="Plain Person")
+        User.objects.create_superuser("root", "password123")
+
+    def search(self, text):
+        return [row["username"] for row in DirectorySearch(text)[0:10]]
+
+    def test_ranks_field_start_then_word_start_then_substring(self):
+        self.assertEqual(self.search("ahmed"), ["ahmed_h", "zed", "sam"])
+        self.assertEqual(self.search("hat ah"), ["ahmed_h"])
+
+    def test_matches_phones_emails_and_normalized_names(self):
+        self.assertEqual(self.search("0100 123"), ["ahmed_h"])
+        self.assertEqual(self.search("1234567"), ["ahmed_h"])
+        self.assertEqual(self.search("zed@mail"), ["zed"])
+        self.assertEqual(self.search("الشريف"), ["mona"])
+        self.assertEqual(self.search("plain"), ["plain"])
+        self.assertEqual(self.search("root"), [])
+
+    def test_signals_keep_the_directory_current(self):
+        player = Player.objects.get(user__username="zed")
+        player.name = "Zaki"
+        player.save()
+        self.assertEqual(self.search("zaki"), ["zed"])
+        player.delete()
+        self.assertEqual(DirectorySearch("zed")[0:10], [
+            {"id": player.user_id, "username": "zed", "name": "", "player": None},
+        ])
+        User.objects.filter(username="zed").delete()
+        self.assertEqual(self.search("zed"), [])
+
+    def test_pages_reach_every_match(self):
+        with connection.cursor() as cursor:
+            for pk in range(10000, 10600):
+                cursor.execute(UPSERT_SQL, directory_row(pk, f"Omar Ahmed {pk}", f"omar{pk}", None, "", "", ""))
+
+        seen = []
+        for start in range(0, 700, 50):
+            seen += [row["id"] for row in DirectorySearch("ahmed")[start:start + 50]]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 603)
+        # The word-start tier comes newest account first
+        self.assertEqual(seen[1:4], [10599, 10598, 10597])
+
+    def test_typeahead_pages(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/api/users/users/directory/", {"search": "ahmed", "page_size": 2})
+        self.assertEqual([row["username"] for row in response.data["data"]], ["ahmed_h", "zed"])
+        self.assertIsNone(response.data["count"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([row["username"] for row in response.data["data"]], ["sam"])
+        self.assertIsNone(response.data["next"])
+
+    def test_list_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/api/users/users/", {"search": "ahmed"})
+        self.assertEqual([row["username"] for row in response.data["data"]], ["ahmed_h", "zed", "sam"])
+        response = self.client.get("/api/players/players/", {"search": "ahmed", "ordering": "name"})
+        self.assertEqual([row["name"] for row in response.data["data"]], ["Ahmed Hatem", "Samahmed", "Zed Ahmed"])
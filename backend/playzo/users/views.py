@@ -3,28 +3,29 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.viewsets import ModelViewSet
-from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
-from .serializers import UserSerializer
+from playzo.rest_framework_utils.fast_read import FastReadViewMixin
+from . import directory
+from .pagination import DirectoryPagination
+from .serializers import DirectoryEntrySerializer, UserSerializer
 from .models import User
 
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(FastReadViewMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
     def get_queryset(self):
-        queryset = User.objects.filter(is_superuser=False)
+        queryset = self.optimize_queryset(User.objects.filter(is_superuser=False))
 
         search_query = self.request.query_params.get('search', None)
 
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(username__icontains=search_query) |
-                Q(national_id__icontains=search_query) |
-                Q(phone__icontains=search_query)
-            )
+            # Best match first, from the directory index (names, username, player phone and email)
+            if directory.is_available():
+                queryset = directory.search_queryset(queryset, search_query).order_by('search_rank', 'name', 'pk')
+            else:
+                queryset = queryset.filter(directory.fallback_filter(search_query))
 
         is_superuser_param = self.request.query_params.get('is_superuser', None)
         if is_superuser_param:
@@ -33,11 +34,21 @@ class UserViewSet(ModelViewSet):
 
         return queryset
 
+    @action(detail=False, methods=['GET'], url_path='directory', pagination_class=DirectoryPagination)
+    def directory_search(self, request):
+        """
+        Typeahead over users and players: `?search=` matched against names, usernames,
+        phone numbers and emails, best match first, in pages of `?page_size=` (max 50)
+        """
+        results = directory.DirectorySearch(request.query_params.get('search', ''))
+        page = self.paginate_queryset(results)
+        return self.get_paginated_response(DirectoryEntrySerializer(page, many=True).data)
+
     @action(detail=True, methods=['GET'])
     def permissions_list(self, request, pk=None):
         try:
             user = User.objects.get(pk=pk)
-            permissions = [str(perm) for perm in user.permissions.all()]
+            permissions = sorted(user.get_permission_set())
             return Response(permissions)
         except Exception:
             return Response({'detail': _('عميل غير موجود')}, status=status.HTTP_404_NOT_FOUND)